@@ -0,0 +1,10 @@
+# Advanced Remote Sensing Spring 2023
+# Runs the whole pipeline for many SHARAD orbits in parallel. See ice_craters/batch.py.
+
+# Example: plot every orbit listed in orbits.txt plus orbits 1308401 and 1308501, using 4 worker processes.
+#	python3 batch_process.py -o 1308401 1308501 --orbit-file orbits.txt -j 4
+
+from ice_craters.batch import main
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,10 @@
+# Advanced Remote Sensing Spring 2023
+# Times each stage of the pipeline on synthetic data, fully offline. See ice_craters/benchmark.py.
+
+# Example: benchmark radargrams of 2000 and 20000 columns, 5 times each, and save the timings to benchmark.json.
+#	python3 benchmark.py --frames 2000 20000 --repeat 5 --output benchmark.json
+
+from ice_craters.benchmark import main
+
+if __name__ == '__main__':
+	main()
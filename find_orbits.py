@@ -0,0 +1,10 @@
+# Advanced Remote Sensing Spring 2023
+# Finds the downloaded SHARAD orbits (and frames) that pass over a region of Mars. See ice_craters/track_index.py.
+
+# Example: find the orbits that pass within 20 km of a crater at 130.3 W, 18.6 N.
+#	python3 find_orbits.py --point -130.3 18.6 --radius 20
+
+from ice_craters.track_index import main
+
+if __name__ == '__main__':
+	main()
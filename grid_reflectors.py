@@ -0,0 +1,10 @@
+# Advanced Remote Sensing Spring 2023
+# Maps the ice thickness above the stored reflectors of many SHARAD orbits on a grid aligned with the MOLA DEM. See ice_craters/gridding.py.
+
+# Example: map the ice thickness above red reflectors (er = 3.1) of every processed orbit around a crater.
+#	python3 grid_reflectors.py --bbox -131 18 -129 20 -e 3.1 --color red --output-file crater_thickness.tif
+
+from ice_craters.gridding import main
+
+if __name__ == '__main__':
+	main()
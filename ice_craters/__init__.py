@@ -0,0 +1,12 @@
+# Advanced Remote Sensing Spring 2023
+# Library for plotting SHARAD reflector geometry on MOLA elevation profiles.
+# The command line scripts in the repository root are thin wrappers around the main() functions of these modules:
+#	coordinates:		converting between Mars coordinates and MOLA DEM pixel indices, and rasterizing ground tracks.
+#	mola_dem:			tiled / memory-mapped access to the MOLA DEM and batched elevation sampling.
+#	annotations:		decoding the surface and reflector traces painted on annotated radargrams.
+#	depth_conversion:	converting radargram pixel delays to depths for one or many dielectric constants.
+#	plotting:			MOLA elevation profile and reflector geometry plots.
+#	download:			downloading the MOLA DEM and SHARAD data products.
+#	pipeline:			the whole process for one orbit.
+#	batch:				the whole process for many orbits in parallel.
+# Heavy dependencies (cv2, rasterio, matplotlib, requests) are only imported by the functions that need them.
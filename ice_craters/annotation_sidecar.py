@@ -0,0 +1,190 @@
+# Advanced Remote Sensing Spring 2023
+# Sparse annotation files. Instead of reading a painted full-colour copy of the radargram on every run, the traced pixels are
+# stored once in ./downloads/SHARAD/annotations/s_<orbit>_annotations.npz: the colour, row and column of every traced pixel,
+# sorted by column then row, plus the radargram's size. A sidecar is a few hundred kB where the painted TIFF is
+# 3 bytes per pixel, and the downloaded radargram itself stays single-channel and untouched.
+# Traces are still drawn in a paint program (on a colour copy made by write_paint_copy) and imported with import_painted_radargram.
+
+# Example: import the traces painted on orbit 1308401's radargram, or on every painted radargram in ./downloads/.
+#	python3 import_annotations.py -o 1308401
+#	python3 import_annotations.py --all
+
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from . import annotations
+from .download import DOWNLOADS_DIR
+
+ANNOTATIONS_DIR = DOWNLOADS_DIR + '/SHARAD/annotations'
+RADARGRAMS_DIR = DOWNLOADS_DIR + '/SHARAD/images/radargrams'
+SIDECAR_VERSION = 1
+
+# Returns the path of an orbit's annotation sidecar.
+def get_annotation_file_name(orbit_str):
+	return ANNOTATIONS_DIR + '/s_' + str(orbit_str).zfill(8) + '_annotations.npz'
+
+# Returns the path of an orbit's downloaded radargram.
+def get_radargram_file_name(orbit_str):
+	return RADARGRAMS_DIR + '/s_' + str(orbit_str).zfill(8) + '.tif'
+
+# Returns the path of the colour copy of an orbit's radargram that traces are painted on (see write_paint_copy).
+def get_paint_copy_file_name(orbit_str):
+	return RADARGRAMS_DIR + '/s_' + str(orbit_str).zfill(8) + '_annotated.tif'
+
+# Saves traced pixels (see annotations.get_traced_pixels) to an annotation sidecar.
+#	file_name:		path of the sidecar (.npz).
+#	pixels:			(color_indices, rows, columns) of every traced pixel.
+#	shape:			(height, width) of the radargram.
+def save_annotations(file_name, pixels, shape):
+	(color_indices, rows, columns) = pixels
+	order = np.lexsort((rows, columns)) # by column, then row
+
+	os.makedirs(os.path.dirname(file_name), exist_ok=True)
+	temp_file_name = file_name[:-len('.npz')] + '.' + str(os.getpid()) + '.tmp.npz'
+	np.savez_compressed(temp_file_name,
+						version=SIDECAR_VERSION,
+						color_names=np.array(annotations.COLOR_NAMES),
+						shape=np.array(shape, dtype=np.int64),
+						colors=np.asarray(color_indices, dtype=np.uint8)[order],
+						rows=np.asarray(rows, dtype=np.int32)[order],
+						columns=np.asarray(columns, dtype=np.int32)[order])
+	os.replace(temp_file_name, file_name)
+
+# Returns the traced pixels saved in an annotation sidecar as ((color_indices, rows, columns), (height, width)).
+# Colour indices refer to annotations.ANNOTATION_COLORS, even if the sidecar was saved with the colours in another order.
+def load_annotations(file_name):
+	with np.load(file_name) as sidecar:
+		if int(sidecar['version']) != SIDECAR_VERSION:
+			raise ValueError("unsupported annotation file version " + str(int(sidecar['version'])) + " in " + file_name)
+
+		saved_names = sidecar['color_names'].tolist()
+		unknown_names = [name for name in saved_names if name not in annotations.COLOR_NAMES]
+		if unknown_names:
+			raise ValueError("unknown annotation colours " + ", ".join(unknown_names) + " in " + file_name)
+
+		color_map = np.array([annotations.COLOR_NAMES.index(name) for name in saved_names], dtype=np.uint8)
+		pixels = (color_map[sidecar['colors']], sidecar['rows'], sidecar['columns'])
+		shape = tuple(int(n) for n in sidecar['shape'])
+
+	return (pixels, shape)
+
+# Reads the traces painted on a radargram TIFF and saves them to an annotation sidecar. Returns (pixels, shape) like load_annotations.
+# Raises ValueError if nothing is traced on the image, so an unpainted radargram does not produce an empty sidecar.
+#	image_file_name:		painted radargram TIFF.
+#	annotation_file_name:	path of the sidecar to write.
+def import_painted_radargram(image_file_name, annotation_file_name):
+	img = annotations.read_annotated_radargram(image_file_name)
+	pixels = annotations.get_traced_pixels(img)
+	if len(pixels[0]) == 0:
+		raise ValueError("no traces in any annotation colour found on " + image_file_name)
+
+	shape = img.shape[:2]
+	save_annotations(annotation_file_name, pixels, shape)
+
+	return (pixels, shape)
+
+# Returns True if a radargram TIFF has colour (3 or more bands, or a palette), i.e. it was painted in place before sidecars
+# existed. Only the TIFF's header is read; a downloaded radargram is single-channel.
+def is_painted_in_place(file_name):
+	import warnings
+	import rasterio
+	from rasterio.enums import ColorInterp
+	from rasterio.errors import NotGeoreferencedWarning
+
+	with warnings.catch_warnings():
+		warnings.simplefilter('ignore', NotGeoreferencedWarning)
+		with rasterio.open(file_name) as dataset:
+			return dataset.count >= 3 or dataset.colorinterp[0] == ColorInterp.palette
+
+# Returns the painted image of an orbit whose traces are newer than its sidecar, or None if the sidecar is up to date or
+# nothing has been painted. The colour copy made by write_paint_copy is used if it exists, otherwise the radargram itself if it
+# was painted in place (radargrams downloaded before sidecars existed were converted to colour and painted directly).
+def get_newer_painted_image(orbit_str):
+	annotation_file_name = get_annotation_file_name(orbit_str)
+	sidecar_mtime = os.path.getmtime(annotation_file_name) if os.path.exists(annotation_file_name) else None
+
+	image_file_name = get_paint_copy_file_name(orbit_str)
+	if not os.path.exists(image_file_name):
+		image_file_name = get_radargram_file_name(orbit_str)
+		if not os.path.exists(image_file_name) or not is_painted_in_place(image_file_name):
+			return None
+
+	if sidecar_mtime is None or os.path.getmtime(image_file_name) > sidecar_mtime:
+		return image_file_name
+	return None
+
+# Returns an orbit's traced pixels and radargram shape, like load_annotations. If the painted image is newer than the sidecar
+# (or there is no sidecar yet), its traces are imported first, so the image is only decoded once after each edit.
+def read_orbit_annotations(orbit_str):
+	annotation_file_name = get_annotation_file_name(orbit_str)
+
+	image_file_name = get_newer_painted_image(orbit_str)
+	if image_file_name is not None:
+		return import_painted_radargram(image_file_name, annotation_file_name)
+
+	if not os.path.exists(annotation_file_name):
+		raise FileNotFoundError("no annotations for orbit " + str(orbit_str) + ": expected " + annotation_file_name + " or a painted " + get_paint_copy_file_name(orbit_str))
+
+	return load_annotations(annotation_file_name)
+
+# Writes a 3-channel colour copy of an orbit's radargram to paint traces on, unless it already exists. Returns its path.
+def write_paint_copy(orbit_str):
+	import cv2
+
+	copy_file_name = get_paint_copy_file_name(orbit_str)
+	if not os.path.exists(copy_file_name):
+		img = annotations.read_annotated_radargram(get_radargram_file_name(orbit_str)) # cv2 reads a greyscale TIFF as 3 equal channels
+		cv2.imwrite(copy_file_name, img)
+
+	return copy_file_name
+
+# Returns the orbit numbers of every radargram (painted or not) in RADARGRAMS_DIR.
+def find_radargram_orbits():
+	orbits = []
+	for file_name in sorted(glob.glob(RADARGRAMS_DIR + '/s_*.tif')):
+		orbit_str = os.path.basename(file_name)[len('s_'):-len('.tif')].replace('_annotated', '')
+		orbits.append(orbit_str)
+
+	return list(dict.fromkeys(orbits))
+
+# Command line interface (see import_annotations.py).
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+						prog='import_annotations',
+						description='Imports the traces painted on SHARAD radargrams into sparse annotation files, or makes a colour copy of a radargram to paint on.')
+	parser.add_argument('-o', '--orbit', nargs='+', default=[], help='orbit number(s) to import')
+	parser.add_argument('--all', action='store_true', help='import every painted radargram in ' + RADARGRAMS_DIR)
+	parser.add_argument('--image', help='painted TIFF to import (default: s_<orbit>_annotated.tif, or the radargram itself, in ' + RADARGRAMS_DIR + ')')
+	parser.add_argument('--paint-copy', action='store_true', help='write a colour copy of the radargram (s_<orbit>_annotated.tif) to paint on instead of importing')
+	args = parser.parse_args(argv)
+
+	orbits = [str(orbit).zfill(8) for orbit in args.orbit]
+	if args.all:
+		orbits += find_radargram_orbits()
+	if not orbits:
+		parser.error("no orbits given (use -o or --all)")
+	if args.image and len(orbits) != 1:
+		parser.error("--image can only be used with a single orbit")
+
+	for orbit_str in dict.fromkeys(orbits):
+		if args.paint_copy:
+			print("paint traces on", write_paint_copy(orbit_str))
+			continue
+
+		image_file_name = args.image or get_newer_painted_image(orbit_str)
+		if image_file_name is None:
+			if os.path.exists(get_annotation_file_name(orbit_str)):
+				print("orbit", orbit_str, "annotations are up to date")
+			else:
+				print("orbit", orbit_str, "skipped: nothing painted (use --paint-copy to make a copy to paint on)")
+			continue
+
+		try:
+			(pixels, shape) = import_painted_radargram(image_file_name, get_annotation_file_name(orbit_str))
+		except ValueError as error:
+			print("orbit", orbit_str, "skipped:", error)
+			continue
+		print("imported", len(pixels[0]), "traced pixels from", image_file_name, "to", get_annotation_file_name(orbit_str))
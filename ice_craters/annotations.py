@@ -0,0 +1,165 @@
+# Advanced Remote Sensing Spring 2023
+# Decodes the surface and reflector traces painted on an annotated SHARAD radargram.
+# Every pixel is classified against the whole colour palette in one pass by packing its (B, G, R) value into a single
+# 24-bit integer and looking it up in a table, instead of running one cv2.inRange pass per colour.
+
+# NOTES FOR USE:
+# Estimated surface of Mars must be traced on the radargram in yellow (B:0, G:255, R:255).
+# Reflectors can be traced on the radargram in any of the other colors in ANNOTATION_COLORS.
+
+# References:
+#  NumPy documentation - https://numpy.org/doc/stable/index.html
+
+from functools import lru_cache
+
+import numpy as np
+
+SURFACE_COLOR = "yellow"
+
+# Colours that can be traced on a radargram, with the range of (B, G, R) values (inclusive) accepted for each.
+# The surface colour must come first.
+ANNOTATION_COLORS = [
+	("yellow", (0, 250, 250), (0, 255, 255)),
+	("red", (0, 0, 250), (0, 0, 255)),
+	("blue", (250, 0, 0), (255, 0, 0)),
+	("green", (0, 250, 0), (0, 255, 0)),
+	("magenta", (250, 0, 250), (255, 0, 255)),
+	("cyan", (250, 250, 0), (255, 255, 0)),
+	("mediumslateblue", (255, 129, 122), (255, 129, 122)),
+	("steelblue", (180, 130, 70), (180, 130, 70)),
+	("moccasin", (181, 228, 255), (181, 228, 255)),
+]
+
+COLOR_NAMES = [name for (name, lower, upper) in ANNOTATION_COLORS]
+REFLECTOR_COLOR_NAMES = COLOR_NAMES[1:]
+
+COLUMN_REDUCTIONS = ("top", "bottom", "median", "centroid") # ways to reduce a thick trace to one depth per column (see reduce_columns).
+LAYER_GAP = 3 # pixels of one colour more than this many rows apart in a column are separate layers.
+
+# Reads an annotated radargram TIFF as a (height x width x 3) BGR array.
+def read_annotated_radargram(file_name):
+	import cv2
+
+	img = cv2.imread(file_name)
+	if img is None:
+		raise FileNotFoundError("could not read radargram " + file_name)
+
+	return img
+
+# Returns a lookup table with one entry per packed 24-bit (B, G, R) value:
+# 0 if the colour is not in the palette, otherwise 1 + the colour's index in ANNOTATION_COLORS.
+@lru_cache(maxsize=1)
+def get_palette_lookup_table():
+	lookup_table = np.zeros(1 << 24, dtype=np.uint8)
+
+	for i, (name, lower, upper) in enumerate(ANNOTATION_COLORS):
+		(b, g, r) = np.meshgrid(np.arange(lower[0], upper[0] + 1), np.arange(lower[1], upper[1] + 1), np.arange(lower[2], upper[2] + 1), indexing='ij')
+		lookup_table[pack_bgr(b, g, r).ravel()] = i + 1
+
+	return lookup_table
+
+# Packs (B, G, R) channel values into one integer key: B << 16 | G << 8 | R.
+def pack_bgr(b, g, r):
+	return (np.asarray(b, dtype=np.uint32) << 16) | (np.asarray(g, dtype=np.uint32) << 8) | np.asarray(r, dtype=np.uint32)
+
+# Returns an array the size of the image with the palette label of each pixel (0 for untraced pixels, otherwise 1 + colour index).
+#	img:	annotated radargram as loaded by cv2.imread (height x width x 3, BGR order).
+def classify_pixels(img):
+	return get_palette_lookup_table()[pack_bgr(img[:, :, 0], img[:, :, 1], img[:, :, 2])]
+
+# Returns every traced pixel of an annotated radargram as three arrays of equal length: the index of its colour in
+# ANNOTATION_COLORS (uint8), its row and its column. Pixels are in row-major order.
+#	img:	annotated radargram as loaded by cv2.imread (height x width x 3, BGR order).
+def get_traced_pixels(img):
+	labels = classify_pixels(img)
+	(rows, columns) = np.nonzero(labels)
+
+	return (labels[rows, columns] - np.uint8(1), rows, columns)
+
+# Decodes every traced colour of an annotated radargram.
+# Returns a (number of colours x image width) float array with the pixel depth (row) of each colour's trace in each radargram column,
+# in ANNOTATION_COLORS order (row 0 is the surface), and NaN where a column has no trace of that colour.
+# Where a trace is more than one pixel thick, the deepest pixel of the column is used (see reduce_columns for other choices).
+#	img:	annotated radargram as loaded by cv2.imread (height x width x 3, BGR order).
+def decode_annotations(img):
+	return decode_pixels(*get_traced_pixels(img), img.shape[1])
+
+# Decodes traced pixels (see get_traced_pixels) into pixel depths per colour and column, like decode_annotations.
+#	color_indices:	index in ANNOTATION_COLORS of each traced pixel.
+#	rows:			row of each traced pixel.
+#	columns:		column of each traced pixel.
+#	width:			number of columns of the result.
+#	method, max_layers (optional):	see reduce_columns.
+def decode_pixels(color_indices, rows, columns, width, method="bottom", max_layers=None):
+	return reduce_columns(color_indices, rows, columns, width, method, max_layers)
+
+# Reduces the traced pixels of each colour in each column to one pixel depth (row), or to one depth per separate layer.
+# The pixels are sorted by colour, column and row once, so that every column's pixels are consecutive and each column
+# (or layer) is reduced with a single slice of the sorted rows, however thick the traces are.
+# Returns a (number of colours x width) float array, NaN where a column has no trace of a colour, or, with max_layers,
+# a (max_layers x number of colours x width) array with each column's layers from the top down.
+#	color_indices:			index in ANNOTATION_COLORS of each traced pixel.
+#	rows:					row of each traced pixel.
+#	columns:				column of each traced pixel.
+#	width:					number of columns of the result.
+#	method (optional):		depth of a trace that is more than one pixel thick: "top", "bottom" (default), "median" or "centroid" (mean row).
+#	max_layers (optional):	number of layers to keep per colour and column: pixels of the same colour more than layer_gap rows
+#							apart in a column are separate layers (e.g. two stacked reflectors). None to reduce all of them together.
+#	layer_gap (optional):	largest gap (rows) within one layer.
+def reduce_columns(color_indices, rows, columns, width, method="bottom", max_layers=None, layer_gap=LAYER_GAP):
+	if method not in COLUMN_REDUCTIONS:
+		raise ValueError("unknown column reduction '" + str(method) + "' (expected one of " + ", ".join(COLUMN_REDUCTIONS) + ")")
+
+	n_colors = len(ANNOTATION_COLORS)
+	depths = np.full((max_layers or 1, n_colors * width), np.nan)
+
+	keys = np.asarray(color_indices, dtype=np.int64) * width + np.asarray(columns, dtype=np.int64)
+	rows = np.asarray(rows, dtype=np.int64)
+	if len(keys) > 0:
+		# sort by colour, column and row at once, as a single integer
+		height = int(rows.max()) + 1
+		sorted_pixels = np.sort(keys * height + rows)
+		(keys, rows) = np.divmod(sorted_pixels, height)
+
+		# a new segment starts at each colour and column, and with layers, at each gap in the rows.
+		is_new_key = np.r_[True, keys[1:] != keys[:-1]]
+		is_new_segment = is_new_key
+		if max_layers is not None:
+			is_new_segment = is_new_key | np.r_[False, np.diff(rows) > layer_gap]
+
+		starts = np.flatnonzero(is_new_segment)
+		counts = np.diff(np.r_[starts, len(rows)])
+
+		if method == "top":
+			values = rows[starts].astype(np.float64)
+		elif method == "bottom":
+			values = rows[starts + counts - 1].astype(np.float64)
+		elif method == "median":
+			values = (rows[starts + (counts - 1) // 2] + rows[starts + counts // 2]) / 2
+		else:
+			values = np.add.reduceat(rows, starts) / counts
+
+		# layer number of each segment: its position among the segments of its colour and column.
+		key_first_segments = np.flatnonzero(is_new_key[starts])
+		layers = np.arange(len(starts)) - key_first_segments[np.cumsum(is_new_key[starts]) - 1]
+		keep = layers < (max_layers or 1)
+
+		depths[layers[keep], keys[starts][keep]] = values[keep]
+
+	depths = depths.reshape(max_layers or 1, n_colors, width)
+	return depths if max_layers is not None else depths[0]
+
+# Returns a 64-bit hash of every column of an annotated radargram from its traced pixels (see get_traced_pixels),
+# used to find the columns whose traces changed. Each column's hash is the sum over its traced pixels of (1 + colour index)
+# times a fixed random 64-bit number for the pixel's row (wrapping around at 2**64).
+#	color_indices:	index in ANNOTATION_COLORS of each traced pixel.
+#	rows:			row of each traced pixel.
+#	columns:		column of each traced pixel.
+#	shape:			(height, width) of the radargram.
+def hash_columns(color_indices, rows, columns, shape):
+	row_weights = np.random.default_rng(0).integers(1, 2**63, size=shape[0], dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+	hashes = np.zeros(shape[1], dtype=np.uint64)
+	np.add.at(hashes, np.asarray(columns, dtype=np.intp), row_weights[rows] * (np.asarray(color_indices, dtype=np.uint64) + np.uint64(1)))
+
+	return hashes
@@ -0,0 +1,145 @@
+# Advanced Remote Sensing Spring 2023
+# Runs the whole pipeline (download, annotation decoding, depth conversion, MOLA sampling and plotting) for many SHARAD orbits,
+# spread across a pool of worker processes. A failure in one orbit is reported without stopping the others.
+
+# Example: plot every orbit listed in orbits.txt plus orbits 1308401 and 1308501, using 4 worker processes.
+#	python3 batch_process.py -o 1308401 1308501 --orbit-file orbits.txt -j 4
+# Example: plot only the part of each downloaded orbit that passes within 20 km of a crater at 130.3 W, 18.6 N.
+#	python3 batch_process.py --point -130.3 18.6 --radius 20
+
+import argparse
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from . import annotations
+from . import download as download_data
+from . import mola_dem
+from . import pipeline
+from . import profiling
+from . import track_index
+
+# Returns the orbit numbers given on the command line, in order and without duplicates.
+#	orbits:			list of orbit numbers.
+#	orbit_range:	(first, last) orbit numbers (inclusive), or None.
+#	orbit_file:		path to a file with one orbit number per line (blank lines and lines starting with # are ignored), or None.
+def collect_orbits(orbits=None, orbit_range=None, orbit_file=None):
+	collected = list(orbits or [])
+
+	if orbit_range:
+		collected += [str(orbit) for orbit in range(int(orbit_range[0]), int(orbit_range[1]) + 1)]
+
+	if orbit_file:
+		with open(orbit_file) as f:
+			collected += [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+	return list(dict.fromkeys(str(orbit).zfill(8) for orbit in collected))
+
+# Returns the (orbit_str, frame_range) jobs for the frames of the downloaded orbits that pass over a region (see track_index.py),
+# one job per window of consecutive frames. If orbits are given, only their frames are kept.
+#	bbox:		(min_lon, min_lat, max_lon, max_lat), or None.
+#	point:		(lon, lat) center of a circle of radius_km, or None.
+#	orbits:		list of orbit numbers (zero-padded strings), or an empty list for every indexed orbit.
+def collect_region_jobs(bbox=None, point=None, radius_km=None, orbits=()):
+	index = track_index.get_index()
+	if bbox is not None:
+		windows = index.query_bbox(*bbox)
+	else:
+		windows = index.query_radius(point[0], point[1], radius_km)
+
+	return [(orbit_str, (first_frame, last_frame)) for (orbit_str, first_frame, last_frame) in windows if not orbits or orbit_str in orbits]
+
+# Runs the pipeline for one orbit in a worker process. Returns (orbit_str, error, events): error is None on success or the
+# error message on failure, and events are the profiling events recorded for the orbit (empty unless profile is True).
+# frame_range is (first, last) to only plot a window of the orbit's frames, or None.
+def process_orbit(orbit_str, download, pds_url, dielectric_constants, sweep, output_dir, output_format, surface_method=None, clutter_tolerance=None, profile=False, trace_memory=False, frame_range=None, store_results=True, screen_clutter=False, trace_depth="bottom", layers=None):
+	if profile:
+		profiling.clear() # worker processes are reused, so only return this orbit's events
+		profiling.enable(trace_memory)
+
+	error = None
+	try:
+		with profiling.stage('orbit', orbit=orbit_str):
+			if download:
+				download_data.download_orbit(orbit_str, download_data.Manifest(), pds_url=pds_url)
+
+			pipeline.process_orbit(orbit_str, dielectric_constants, sweep, output_dir, output_format, surface_method=surface_method, clutter_tolerance=clutter_tolerance, frame_range=frame_range, store_results=store_results, screen_clutter=screen_clutter, trace_depth=trace_depth, layers=layers)
+
+	except Exception as exception:
+		error = str(exception) + "\n" + traceback.format_exc()
+
+	return (orbit_str, error, profiling.get_events())
+
+# Command line interface (see batch_process.py).
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+						prog='batch_process',
+						description='Plots reflector geometry on MOLA elevation profiles for many SHARAD orbits in parallel.')
+	parser.add_argument('-o', '--orbit', nargs='+', default=[], help='orbit number(s) to process')
+	parser.add_argument('--range', nargs=2, metavar=('FIRST', 'LAST'), help='process every orbit number from FIRST to LAST (inclusive)')
+	parser.add_argument('--orbit-file', help='file with one orbit number per line')
+	parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes (default: number of CPUs)')
+	parser.add_argument('-d', '--download', action='store_true', help='download the MOLA DEM and any missing orbit data first')
+	parser.add_argument('--pds-url', default=download_data.PDS_GEOSCIENCES_URL, help='base URL of the PDS Geosciences Node')
+	parser.add_argument('--memmap-dem', action='store_true', help='build an uncompressed copy of the MOLA DEM (about 2 GB) that all workers memory-map')
+	parser.add_argument('-e', '--dielectric', type=float, nargs='+', default=[1.0, 3.1], help='dielectric constant(s) of the subsurface to plot reflector geometry for (default: 1 and 3.1)')
+	parser.add_argument('--sweep', type=float, nargs=3, metavar=('START', 'STOP', 'STEP'), help='also save reflector depths for every dielectric constant from START to STOP (inclusive)')
+	parser.add_argument('--output-dir', default='./plots', help='directory to save plots to (default: ./plots)')
+	parser.add_argument('--format', default='png', choices=['png', 'svg', 'pdf'], help='file format of saved plots (default: png)')
+	parser.add_argument('--auto-surface', nargs='?', const='threshold', choices=['threshold', 'gradient'], help='pick the surface automatically where it is not traced in yellow (default method: threshold)')
+	parser.add_argument('--clutter-tolerance', type=float, metavar='PIXELS', help='with --auto-surface, drop picks that differ from the cluttergram\'s surface by more than PIXELS')
+	parser.add_argument('--bbox', type=float, nargs=4, metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'), help='only plot the frames inside this bounding box, of the given orbits or else of every downloaded orbit')
+	parser.add_argument('--point', type=float, nargs=2, metavar=('LON', 'LAT'), help='only plot the frames within --radius km of this point, of the given orbits or else of every downloaded orbit')
+	parser.add_argument('--radius', type=float, default=10.0, help='radius around --point in km (default: 10)')
+	parser.add_argument('--no-store', action='store_true', help='do not save the reflector points to ./downloads/SHARAD/reflectors/ (see query_reflectors.py)')
+	parser.add_argument('--screen-clutter', action='store_true', help='score each traced reflector by how strongly the cluttergram predicts an echo there (see screen_clutter.py)')
+	parser.add_argument('--trace-depth', default='bottom', choices=annotations.COLUMN_REDUCTIONS, help='depth of a trace more than one pixel thick in a radargram column (default: bottom)')
+	parser.add_argument('--layers', type=int, help='keep up to this many separate layers of each reflector colour per column, instead of reducing them to one depth')
+	profiling.add_arguments(parser)
+	args = parser.parse_args(argv)
+
+	orbits = collect_orbits(args.orbit, args.range, args.orbit_file)
+	if args.bbox is not None and args.point is not None:
+		parser.error("give either --bbox or --point, not both")
+	if not orbits and args.bbox is None and args.point is None:
+		parser.error("no orbits given (use -o, --range, --orbit-file, --bbox or --point)")
+
+	# The DEM is shared by every orbit, so it is downloaded (and optionally uncompressed) once before the workers start.
+	if args.download:
+		download_data.download_mola_dem(download_data.Manifest())
+	if args.memmap_dem:
+		mola_dem.build_memmap_cache()
+
+	# The region is looked up in the geometry tables, so those of the given orbits are downloaded first.
+	jobs = [(orbit_str, None) for orbit_str in orbits]
+	if args.bbox is not None or args.point is not None:
+		if args.download:
+			for orbit_str in orbits:
+				download_data.download_orbit(orbit_str, download_data.Manifest(), pds_url=args.pds_url)
+		jobs = collect_region_jobs(args.bbox, args.point, args.radius, orbits)
+		print(len(jobs), "frame windows in", len(set(orbit_str for (orbit_str, frame_range) in jobs)), "orbits cross the region")
+
+	failures = []
+	with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+		futures = [executor.submit(process_orbit, orbit_str, args.download, args.pds_url, args.dielectric, args.sweep, args.output_dir, args.format, args.auto_surface, args.clutter_tolerance, bool(args.profile), args.trace_memory, frame_range, not args.no_store, args.screen_clutter, args.trace_depth, args.layers) for (orbit_str, frame_range) in jobs]
+
+		for (future, (orbit_str, frame_range)) in zip(futures, jobs):
+			(orbit_str, error, events) = future.result()
+			profiling.add_events(events)
+			job_name = orbit_str + pipeline.get_window_suffix(frame_range)
+			if error is None:
+				print("orbit", job_name, "done")
+			else:
+				print("orbit", job_name, "FAILED:", error)
+				failures.append(job_name)
+
+	# index the ground tracks of the orbits that were just downloaded
+	if args.download:
+		track_index.get_index()
+
+	print(len(jobs) - len(failures), "of", len(jobs), "orbits processed")
+	if args.profile:
+		profiling.report(args.profile) # stage statistics across every orbit
+	if failures:
+		print("failed orbits:", " ".join(failures))
+		raise SystemExit(1)
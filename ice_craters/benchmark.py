@@ -0,0 +1,393 @@
+# Advanced Remote Sensing Spring 2023
+# Offline benchmarks of each stage of the pipeline on synthetic data, so throughput can be measured (and regressions caught)
+# without the real MOLA mosaic or any PDS products. For each radargram size it generates:
+#	- a MOLA-sized GeoTIFF DEM (46080 x 23040, int16) with synthetic terrain inside DEM_EXTENT and zeros elsewhere,
+#	- a geometry table whose ground track crosses that terrain,
+#	- a greyscale radargram, a painted copy of it with a yellow surface and reflectors in the other README colours, and a cluttergram,
+# in the same ./downloads/ layout that download_data.py creates (inside the benchmark's work directory).
+# Every stage is timed repeat times, and the timings are written to a JSON file.
+# With --survey, a survey of synthetic orbits is also run through survey.py, downloading them from a local HTTP server that
+# stands in for the PDS (with an added delay per request), to compare the survey's time with the time of each of its stages.
+
+# Example: benchmark radargrams of 2000 and 20000 columns, 5 times each.
+#	python3 benchmark.py --frames 2000 20000 --repeat 5 --output benchmark.json
+# Example: run a survey of 50 synthetic orbits of 2000 columns, with 0.2 s per request to the local PDS stand-in.
+#	python3 benchmark.py --frames 2000 --stages --survey 50 --latency 0.2
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import functools
+import http.server
+import io
+import json
+import os
+import platform
+import threading
+import time
+
+import numpy as np
+
+from . import annotation_sidecar, annotations, depth_conversion, geom_table, mola_dem, pipeline, plotting, surface_picker, survey
+from . import download as download_data
+from .coordinates import MOLA_HEIGHT, MOLA_SCALE, MOLA_WIDTH, convert_map_coordinates_to_pixel_index, scale_pixel_index_for_mola, get_line_from_point_pair
+
+WORK_DIR = './benchmark'
+DEM_EXTENT = (-140.0, 10.0, -120.0, 30.0) # (min lon, min lat, max lon, max lat) of the synthetic terrain, in degrees.
+FIRST_ORBIT = 90000001 # synthetic orbits are numbered from here, one per radargram size.
+FIRST_SURVEY_ORBIT = 91000001 # synthetic survey orbits are numbered from here.
+SWEEP = (1.0, 9.0, 0.1) # dielectric constants converted by the depth conversion stage.
+
+STAGES = ['geom_table', 'dem_line_profile', 'dem_track_sampling', 'annotation_decoding', 'annotation_sidecar', 'surface_picking', 'depth_conversion', 'rendering', 'end_to_end']
+
+# Writes a synthetic MOLA DEM GeoTIFF (same size, tiling and georeferencing as the real mosaic), unless it already exists.
+# Elevations inside extent are a sum of long-wavelength waves plus craters; the rest of the DEM is left at 0 (empty tiles).
+#	path:		file to write.
+#	extent:		(min lon, min lat, max lon, max lat) of the synthetic terrain, in degrees.
+#	seed:		random seed of the crater positions.
+def write_synthetic_dem(path, extent=DEM_EXTENT, seed=0):
+	if os.path.exists(path):
+		return path
+
+	import rasterio
+	from rasterio.transform import from_origin
+	from rasterio.windows import Window
+
+	(min_lon, min_lat, max_lon, max_lat) = extent
+	col_start = int((min_lon + 180) * MOLA_SCALE)
+	col_stop = int((max_lon + 180) * MOLA_SCALE)
+	row_start = int((90 - max_lat) * MOLA_SCALE)
+	row_stop = int((90 - min_lat) * MOLA_SCALE)
+
+	rng = np.random.default_rng(seed)
+	n_craters = 50
+	crater_rows = rng.uniform(row_start, row_stop, n_craters)
+	crater_cols = rng.uniform(col_start, col_stop, n_craters)
+	crater_radii = rng.uniform(20, 200, n_craters) # pixels
+	crater_depths = crater_radii * 4 # meters
+
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	partial_path = path + '.part'
+	with rasterio.open(partial_path, 'w', driver='GTiff', height=MOLA_HEIGHT, width=MOLA_WIDTH, count=1, dtype='int16',
+					tiled=True, blockxsize=512, blockysize=512, compress='deflate', transform=from_origin(-180, 90, 1 / MOLA_SCALE, 1 / MOLA_SCALE)) as dataset:
+		cols = np.arange(col_start, col_stop)
+		for block_start in range(row_start, row_stop, 512):
+			rows = np.arange(block_start, min(block_start + 512, row_stop))[:, None]
+			block = 2000 * np.sin(cols / 700.0) + 1500 * np.cos(rows / 500.0)
+
+			for (crater_row, crater_col, radius, depth) in zip(crater_rows, crater_cols, crater_radii, crater_depths):
+				if crater_row + radius < rows[0, 0] or crater_row - radius > rows[-1, 0]:
+					continue
+				distance = np.hypot(rows - crater_row, cols - crater_col) / radius
+				block -= np.where(distance < 1, depth * (1 - distance ** 2), 0)
+
+			dataset.write(block.astype(np.int16), 1, window=Window(col_start, block_start, len(cols), len(rows)))
+
+	os.replace(partial_path, path)
+	return path
+
+# Writes a synthetic geometry table (see geom_table.GEOM_COLUMNS) of n_frames frames whose ground track runs south to north
+# across extent, with longitudes in 0..360 like the PDS tables.
+def write_synthetic_geom_table(path, n_frames, extent=DEM_EXTENT):
+	(min_lon, min_lat, max_lon, max_lat) = extent
+	margin = 0.1 * (max_lat - min_lat)
+
+	frames = np.arange(1, n_frames + 1)
+	times = np.datetime64('2008-01-01T00:00:00') + (frames * 37.5).astype('timedelta64[ms]')
+	lats = np.linspace(min_lat + margin, max_lat - margin, n_frames)
+	lons = np.linspace(min_lon + 0.4 * (max_lon - min_lon), min_lon + 0.6 * (max_lon - min_lon), n_frames) % 360
+
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path, 'w') as geom:
+		geom.writelines(str(frame).rjust(6) + ',' + str(t) + 'Z,' + format(lat, '11.6f') + ',' + format(lon, '11.6f') + ',   3390.123,   3650.000,   0.100,   3.400,  45.000\n'
+						for (frame, t, lat, lon) in zip(frames, times, lats, lons))
+
+	return path
+
+# Writes a synthetic radargram (greyscale TIFF), a painted copy of it (BGR TIFF) and a cluttergram (greyscale TIFF) of n_rows x n_frames pixels.
+# The surface is traced in yellow in every column, and n_reflectors reflectors are traced in the other annotation colours over
+# random spans of columns, some of them several pixels thick. The echo is weak noise above the surface and a strong return at the
+# surface that fades with depth, so the surface can also be picked automatically.
+def write_synthetic_radargram(radargram_file_name, painted_file_name, cluttergram_file_name, n_frames, n_rows=800, n_reflectors=4, seed=0):
+	import cv2
+
+	rng = np.random.default_rng(seed)
+	columns = np.arange(n_frames)
+
+	surface = (n_rows // 4 + (n_rows // 20) * np.sin(columns / 300.0)).astype(np.int64)
+	below_surface = np.arange(n_rows)[:, None] - surface
+	echo = rng.integers(0, 40, (n_rows, n_frames)) + np.where(below_surface >= 0, 200 * np.exp(-np.maximum(below_surface, 0) / 40.0), 0)
+	echo = np.clip(echo, 0, 255).astype(np.uint8)
+
+	img = np.repeat(echo[:, :, None], 3, axis=2)
+	colors = {name: upper for (name, lower, upper) in annotations.ANNOTATION_COLORS}
+	img[surface, columns] = colors[annotations.SURFACE_COLOR]
+
+	for i in range(n_reflectors):
+		color = colors[annotations.REFLECTOR_COLOR_NAMES[i % len(annotations.REFLECTOR_COLOR_NAMES)]]
+		(start, stop) = np.sort(rng.integers(0, n_frames, 2))
+		span = columns[start:stop + 1]
+		depth = rng.integers(20, n_rows // 2)
+		for thickness in range(rng.integers(1, 4)):
+			img[np.minimum(surface[span] + depth + thickness, n_rows - 1), span] = color
+
+	os.makedirs(os.path.dirname(radargram_file_name), exist_ok=True)
+	os.makedirs(os.path.dirname(cluttergram_file_name), exist_ok=True)
+	cv2.imwrite(radargram_file_name, echo)
+	cv2.imwrite(painted_file_name, img)
+
+	clutter = echo // 2
+	clutter[surface, columns] = 255
+	cv2.imwrite(cluttergram_file_name, clutter)
+
+	return (radargram_file_name, painted_file_name, cluttergram_file_name)
+
+# Generates the synthetic geometry table, radargram, painted radargram and cluttergram of an orbit in ./downloads/
+# (relative to the current directory).
+def write_synthetic_orbit(orbit_str, n_frames, n_rows=800, n_reflectors=4, seed=0):
+	orbit_str = str(orbit_str).zfill(8)
+	write_synthetic_geom_table(geom_table.get_geom_file_name(orbit_str), n_frames)
+	write_synthetic_radargram(annotation_sidecar.get_radargram_file_name(orbit_str), annotation_sidecar.get_paint_copy_file_name(orbit_str),
+							'./downloads/SHARAD/images/cluttergrams/s_' + orbit_str + '.tif', n_frames, n_rows, n_reflectors, seed)
+
+# Calls function() warmup times untimed, then repeat times. Returns the wall-clock time of each timed call, in seconds.
+def time_stage(function, repeat=5, warmup=1):
+	for _ in range(warmup):
+		function()
+
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function()
+		times.append(time.perf_counter() - start)
+
+	return times
+
+# Returns the function timed by a stage, for a synthetic orbit generated by write_synthetic_orbit. Inputs of the stage
+# (e.g. the decoded annotations for depth conversion) are computed here, outside the timed function.
+def get_stage_function(stage, orbit_str, output_dir):
+	geom_file_name = geom_table.get_geom_file_name(orbit_str)
+	table = geom_table.read_geom_table(geom_file_name, use_sidecar=False)
+	(track_lons, track_lats) = (np.array(table['lon']), np.array(table['lat']))
+
+	if stage == 'geom_table':
+		return lambda: geom_table.read_geom_table(geom_file_name, use_sidecar=False)
+
+	# The DEM stages open a new MolaDEM each time, so no tiles are cached from the previous call.
+	if stage == 'dem_line_profile':
+		points = [scale_pixel_index_for_mola(*convert_map_coordinates_to_pixel_index(lon, lat)) for (lon, lat) in ((track_lons[0], track_lats[0]), (track_lons[-1], track_lats[-1]))]
+		def dem_line_profile():
+			(line_xs, line_ys) = get_line_from_point_pair(*points)
+			return mola_dem.MolaDEM().read_pixels(line_ys, line_xs)
+		return dem_line_profile
+
+	if stage == 'dem_track_sampling':
+		return lambda: mola_dem.MolaDEM().sample(track_lons, track_lats, "bilinear")
+
+	if stage == 'surface_picking':
+		echo = surface_picker.read_echo_image(annotation_sidecar.get_radargram_file_name(orbit_str))
+		return lambda: surface_picker.pick_surface(echo)
+
+	img = annotations.read_annotated_radargram(annotation_sidecar.get_paint_copy_file_name(orbit_str))
+	if stage == 'annotation_decoding':
+		return lambda: annotations.decode_annotations(img)
+
+	if stage == 'annotation_sidecar':
+		annotation_file_name = annotation_sidecar.get_annotation_file_name(orbit_str)
+		annotation_sidecar.save_annotations(annotation_file_name, annotations.get_traced_pixels(img), img.shape[:2])
+		def read_sidecar():
+			(pixels, shape) = annotation_sidecar.load_annotations(annotation_file_name)
+			return annotations.decode_pixels(*pixels, shape[1])
+		return read_sidecar
+
+	frames = np.arange(1, len(track_lons) + 1)
+	frame_depths = depth_conversion.get_frame_pixel_depths(annotations.decode_annotations(img), frames)
+	if stage == 'depth_conversion':
+		dielectric_constants = depth_conversion.get_dielectric_sweep(*SWEEP)
+		return lambda: depth_conversion.convert_pixel_depths(frame_depths[1:], frame_depths[0], dielectric_constants)
+
+	if stage == 'rendering':
+		altitude_profile = mola_dem.sample_dem(track_lons, track_lats, "bilinear")
+		(track_coords, x_axis_title) = plotting.get_profile_axis(track_lons, track_lats)
+		dielectric_constants = (1.0, 3.1)
+		plot_depths = depth_conversion.convert_pixel_depths(frame_depths[1:], frame_depths[0], dielectric_constants)
+		panels = pipeline.get_reflector_panels(orbit_str, dielectric_constants, plot_depths, track_coords, altitude_profile)
+		os.makedirs(output_dir, exist_ok=True)
+		output_file = os.path.join(output_dir, 's_' + orbit_str + '.png')
+		return lambda: plotting.get_renderer().render(output_file, track_coords, altitude_profile, x_axis_title, panels)
+
+	if stage == 'end_to_end':
+		def end_to_end():
+			with contextlib.redirect_stdout(io.StringIO()):
+				pipeline.process_orbit(orbit_str, output_dir=output_dir, use_cache=False)
+		return end_to_end
+
+	raise ValueError("unknown stage '" + str(stage) + "' (expected one of " + ", ".join(STAGES) + ")")
+
+# Generates synthetic data in work_dir and times each stage for each radargram size. Returns the results as a dict (see main).
+#	frame_counts:	number of radargram columns (geometry table frames) of each synthetic orbit.
+#	n_rows:			number of radargram rows.
+#	n_reflectors:	number of reflectors traced on each radargram.
+#	stages:			names of the stages to time (see STAGES).
+#	repeat:			number of timed runs of each stage.
+#	warmup:			number of untimed runs of each stage before the timed ones.
+#	work_dir:		directory to generate the synthetic data and plots in.
+def run_benchmarks(frame_counts, n_rows=800, n_reflectors=4, stages=STAGES, repeat=5, warmup=1, work_dir=WORK_DIR):
+	os.makedirs(work_dir, exist_ok=True)
+	previous_dir = os.getcwd()
+	os.chdir(work_dir) # the pipeline reads everything relative to ./downloads/
+
+	try:
+		start = time.perf_counter()
+		write_synthetic_dem(mola_dem.MOLA_DEM_PATH)
+		print("synthetic MOLA DEM ready in", format(time.perf_counter() - start, '.2f'), "s")
+
+		results = []
+		for i, n_frames in enumerate(frame_counts):
+			orbit_str = str(FIRST_ORBIT + i).zfill(8)
+			write_synthetic_orbit(orbit_str, n_frames, n_rows, n_reflectors, seed=i)
+
+			for stage in stages:
+				times = time_stage(get_stage_function(stage, orbit_str, './plots'), repeat, warmup)
+				result = {
+					'stage': stage,
+					'frames': n_frames,
+					'rows': n_rows,
+					'times_s': times,
+					'min_s': min(times),
+					'median_s': float(np.median(times)),
+					'mean_s': float(np.mean(times)),
+					'frames_per_s': n_frames / float(np.median(times)),
+				}
+				results.append(result)
+				print(stage.ljust(20), str(n_frames).rjust(8), "frames", format(result['median_s'] * 1000, '10.2f'), "ms", format(result['frames_per_s'], '14.0f'), "frames/s")
+	finally:
+		os.chdir(previous_dir)
+
+	return {
+		'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+		'platform': {
+			'python': platform.python_version(),
+			'numpy': np.__version__,
+			'system': platform.system(),
+			'machine': platform.machine(),
+			'cpu_count': os.cpu_count(),
+		},
+		'config': {
+			'frame_counts': list(frame_counts),
+			'rows': n_rows,
+			'reflectors': n_reflectors,
+			'repeat': repeat,
+			'warmup': warmup,
+			'dem_extent': list(DEM_EXTENT),
+		},
+		'results': results,
+	}
+
+# Serves the files of a directory over HTTP, waiting latency seconds before answering each request (a stand-in for the PDS).
+class DelayedFileHandler(http.server.SimpleHTTPRequestHandler):
+	latency = 0.0
+
+	def do_GET(self):
+		time.sleep(self.latency)
+		super().do_GET()
+
+	def log_message(self, *args):
+		pass
+
+# Starts a local HTTP server for directory in a background thread. Returns the server (stop it with shutdown()) and its base URL.
+def start_file_server(directory, latency=0.0):
+	handler = type('Handler', (DelayedFileHandler,), {'latency': latency})
+	server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(handler, directory=directory))
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+
+	return (server, 'http://127.0.0.1:' + str(server.server_address[1]))
+
+# Generates synthetic orbits and moves their radargrams, cluttergrams and geometry tables from ./downloads/ to pds_dir, at the
+# same paths as on the PDS (see download.get_orbit_files), so they can be served by a local stand-in for the PDS (see
+# start_file_server). Only the painted copies stay in ./downloads/. Local files derived from earlier downloads are removed.
+#	orbits:		orbit numbers (zero-padded strings) to generate, with seeds 0, 1, 2...
+#	pds_dir:	directory the stand-in serves.
+def write_synthetic_pds_orbits(orbits, pds_dir, n_frames, n_rows=800, n_reflectors=4):
+	for (i, orbit_str) in enumerate(orbits):
+		write_synthetic_orbit(orbit_str, n_frames, n_rows, n_reflectors, seed=i)
+		for (url, file_name) in download_data.get_orbit_files(orbit_str, pds_dir).values():
+			os.makedirs(os.path.dirname(url), exist_ok=True)
+			os.replace(file_name, url)
+		for file_name in (geom_table.get_sidecar_file_name(geom_table.get_geom_file_name(orbit_str)), annotation_sidecar.get_annotation_file_name(orbit_str)):
+			if os.path.exists(file_name):
+				os.remove(file_name)
+
+# Generates n_orbits synthetic orbits, puts their radargrams, cluttergrams and geometry tables on a local HTTP server laid out
+# like the PDS (only the painted copies stay in ./downloads/), and runs a survey that downloads, processes and plots them.
+# Returns the survey's results as a dict: its total time, and each stage's number of workers, busy time and time on its own.
+#	n_orbits:		number of synthetic orbits.
+#	n_frames:		number of radargram columns of each orbit.
+#	latency:		seconds the server waits before answering each request.
+#	download_jobs, process_jobs, render_jobs:	number of workers of each stage (see survey.run_survey).
+#	work_dir:		directory to generate the synthetic data and plots in.
+def run_survey_benchmark(n_orbits, n_frames=2000, n_rows=800, n_reflectors=4, latency=0.1, download_jobs=4, process_jobs=None, render_jobs=2, work_dir=WORK_DIR):
+	os.makedirs(work_dir, exist_ok=True)
+	previous_dir = os.getcwd()
+	os.chdir(work_dir)
+
+	try:
+		write_synthetic_dem(mola_dem.MOLA_DEM_PATH)
+
+		# every product is downloaded again, even if an earlier run downloaded it.
+		pds_dir = os.path.abspath('./pds')
+		orbits = [str(FIRST_SURVEY_ORBIT + i).zfill(8) for i in range(n_orbits)]
+		write_synthetic_pds_orbits(orbits, pds_dir, n_frames, n_rows, n_reflectors)
+		if os.path.exists(download_data.MANIFEST_FILE_NAME):
+			os.remove(download_data.MANIFEST_FILE_NAME)
+
+		(server, pds_url) = start_file_server(pds_dir, latency)
+		try:
+			with contextlib.redirect_stdout(io.StringIO()):
+				(statistics, failures, wall_time) = asyncio.run(survey.run_survey([(orbit_str, None) for orbit_str in orbits], {}, './plots', download=True, pds_url=pds_url,
+																				download_jobs=download_jobs, process_jobs=process_jobs, render_jobs=render_jobs))
+		finally:
+			server.shutdown()
+	finally:
+		os.chdir(previous_dir)
+
+	survey.print_survey_statistics(statistics, wall_time)
+	if failures:
+		raise RuntimeError(str(len(failures)) + " survey orbits failed, the first with: " + failures[0][1])
+
+	return {
+		'orbits': n_orbits,
+		'frames': n_frames,
+		'latency_s': latency,
+		'wall_s': wall_time,
+		'stages': {stage.name: {'workers': stage.n_workers, 'busy_s': stage.busy, 'stage_s': stage.get_stage_time()} for stage in statistics.values()},
+	}
+
+# Command line interface (see benchmark.py).
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+						prog='benchmark',
+						description='Times each stage of the pipeline on synthetic DEMs, radargrams and geometry tables, without downloading anything.')
+	parser.add_argument('--frames', type=int, nargs='+', default=[2000, 20000], help='number of radargram columns of each synthetic orbit (default: 2000 20000)')
+	parser.add_argument('--rows', type=int, default=800, help='number of radargram rows (default: 800)')
+	parser.add_argument('--reflectors', type=int, default=4, help='number of reflectors traced on each radargram (default: 4)')
+	parser.add_argument('--stages', nargs='*', default=STAGES, choices=STAGES, help='stages to time (default: all; give no stages to only run --survey)')
+	parser.add_argument('--repeat', type=int, default=5, help='number of timed runs of each stage (default: 5)')
+	parser.add_argument('--warmup', type=int, default=1, help='number of untimed runs of each stage before the timed ones (default: 1)')
+	parser.add_argument('--work-dir', default=WORK_DIR, help='directory to generate the synthetic data in (default: ' + WORK_DIR + ')')
+	parser.add_argument('--output', default='benchmark.json', help='JSON file to write the timings to (default: benchmark.json)')
+	parser.add_argument('--survey', type=int, metavar='ORBITS', help='also run a survey of this many synthetic orbits (of the first --frames size) downloaded from a local PDS stand-in')
+	parser.add_argument('--latency', type=float, default=0.1, help='seconds the PDS stand-in waits before answering each request (default: 0.1)')
+	parser.add_argument('--download-jobs', type=int, default=4, help='survey download threads (default: 4)')
+	parser.add_argument('--process-jobs', type=int, default=os.cpu_count(), help='survey processing workers (default: number of CPUs)')
+	parser.add_argument('--render-jobs', type=int, default=2, help='survey rendering workers (default: 2)')
+	args = parser.parse_args(argv)
+
+	report = run_benchmarks(args.frames, args.rows, args.reflectors, args.stages, args.repeat, args.warmup, args.work_dir)
+	if args.survey:
+		report['survey'] = run_survey_benchmark(args.survey, args.frames[0], args.rows, args.reflectors, args.latency, args.download_jobs, args.process_jobs, args.render_jobs, args.work_dir)
+
+	with open(args.output, 'w') as f:
+		json.dump(report, f, indent='\t')
+	print("saved timings to", args.output)
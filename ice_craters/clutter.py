@@ -0,0 +1,182 @@
+# Advanced Remote Sensing Spring 2023
+# Clutter screening of the reflectors traced on a SHARAD radargram. Off-nadir surface echoes (clutter) can look like subsurface
+# reflectors, and the cluttergram simulates them from the MOLA surface: a traced reflector where the cluttergram also has a
+# strong echo is probably clutter.
+# The cluttergram is first co-registered to the radargram: the delay between them in every column is the peak of their
+# cross-correlation, computed for a block of columns at once with FFTs and smoothed across columns. Each traced pixel is then
+# scored by the (aligned) cluttergram's echo strength around it, from 0 (no echo above the noise) to 1 (a clear echo), and
+# each reflector's clutter probability is the mean score of its pixels.
+
+# Example: screen the reflectors traced on orbit 1308401's radargram.
+#	python3 screen_clutter.py -o 1308401
+
+import argparse
+import os
+
+import numpy as np
+
+from . import annotation_sidecar, annotations, profiling, surface_picker
+
+CLUTTER_DIR = './downloads/SHARAD/clutter'
+MAX_LAG = 32 # largest delay (rows) searched between the radargram and the cluttergram.
+BLOCK_COLUMNS = 4096 # columns cross-correlated at once (bounds the memory used by the FFTs).
+SMOOTHING_COLUMNS = 51 # width (columns) of the running median the delays are smoothed with.
+TOLERANCE = 2 # a pixel is scored by the strongest cluttergram echo within this many rows of it.
+
+# Returns the path of the cluttergram downloaded for an orbit.
+def get_cluttergram_file_name(orbit_str):
+	return './downloads/SHARAD/images/cluttergrams/s_' + str(orbit_str).zfill(8) + '.tif'
+
+# Returns the path of an orbit's saved clutter scores.
+def get_clutter_file_name(orbit_str):
+	return CLUTTER_DIR + '/s_' + str(orbit_str).zfill(8) + '_clutter.npz'
+
+# Returns an image resampled (nearest pixel) to a given (height, width), e.g. a cluttergram to the size of its radargram.
+def resample_to_shape(echo, shape):
+	if echo.shape == tuple(shape):
+		return echo
+
+	rows = (np.arange(shape[0]) * echo.shape[0]) // shape[0]
+	columns = (np.arange(shape[1]) * echo.shape[1]) // shape[1]
+	return echo[rows[:, None], columns[None, :]]
+
+# Returns the echo strength of every pixel as a float32 image, from 0 at the noise level to 1 at the surface picker's
+# detection threshold (see surface_picker.pick_surface) and above.
+def get_echo_strength(echo, noise_rows=surface_picker.NOISE_ROWS, noise_sigmas=surface_picker.NOISE_SIGMAS):
+	(noise_median, noise_sigma) = surface_picker.get_noise_level(echo, noise_rows)
+	strength = (np.asarray(echo, dtype=np.float32) - noise_median) / (noise_sigmas * noise_sigma)
+
+	return np.clip(strength, 0, 1)
+
+# Returns the delay (rows) of the radargram behind the cluttergram in every column: radargram row = cluttergram row + delay.
+# Each column's delay is the peak of the columns' cross-correlation within max_lag rows, computed for block_columns columns
+# at a time with FFTs. Delays are then smoothed with a running median, which also fills columns without a clear peak.
+#	radargram_strength:		(height x width) echo strength of the radargram, see get_echo_strength.
+#	clutter_strength:		echo strength of the cluttergram, the same size.
+def get_column_lags(radargram_strength, clutter_strength, max_lag=MAX_LAG, block_columns=BLOCK_COLUMNS, smoothing=SMOOTHING_COLUMNS):
+	(height, width) = radargram_strength.shape
+	n = 2 * height # zero padding so that the correlation does not wrap around
+	lag_indices = np.r_[n - max_lag:n, 0:max_lag + 1] # circular correlation indices of lags -max_lag..max_lag
+
+	lags = np.full(width, np.nan)
+	for start in range(0, width, block_columns):
+		radargram_block = radargram_strength[:, start:start + block_columns]
+		clutter_block = clutter_strength[:, start:start + block_columns]
+		radargram_block = radargram_block - radargram_block.mean(axis=0)
+		clutter_block = clutter_block - clutter_block.mean(axis=0)
+
+		spectrum = np.fft.rfft(radargram_block, n, axis=0) * np.conj(np.fft.rfft(clutter_block, n, axis=0))
+		correlation = np.fft.irfft(spectrum, n, axis=0)[lag_indices]
+
+		peaks = np.argmax(correlation, axis=0)
+		block_lags = (peaks - max_lag).astype(np.float64)
+		block_lags[correlation.max(axis=0) <= 0] = np.nan
+		lags[start:start + block_columns] = block_lags
+
+	if smoothing > 1:
+		lags = surface_picker.smooth_picks(lags, smoothing, max_lag)
+
+	return np.rint(np.nan_to_num(lags)).astype(np.int64)
+
+# Returns the cluttergram shifted down by lags[column] rows in every column, so that it lines up with the radargram.
+def align_cluttergram(clutter, lags):
+	rows = np.arange(clutter.shape[0])[:, None] - lags[None, :]
+	in_image = (rows >= 0) & (rows < clutter.shape[0])
+	aligned = clutter[np.clip(rows, 0, clutter.shape[0] - 1), np.arange(clutter.shape[1])[None, :]]
+
+	return np.where(in_image, aligned, 0)
+
+# Returns the clutter score of every traced pixel: the strongest aligned cluttergram echo within tolerance rows of it.
+#	clutter_strength:	echo strength of the aligned cluttergram (see align_cluttergram).
+#	rows, columns:		positions of the traced pixels.
+def score_pixels(clutter_strength, rows, columns, tolerance=TOLERANCE):
+	scores = np.zeros(len(rows), dtype=np.float32)
+	for offset in range(-tolerance, tolerance + 1):
+		scores = np.maximum(scores, clutter_strength[np.clip(rows + offset, 0, clutter_strength.shape[0] - 1), columns])
+
+	return scores
+
+# Returns the clutter probability of each annotation colour (see annotations.COLOR_NAMES): the mean score of its traced pixels,
+# NaN for colours that are not traced.
+def get_clutter_probabilities(color_indices, scores):
+	n_colors = len(annotations.COLOR_NAMES)
+	counts = np.bincount(color_indices, minlength=n_colors)
+	totals = np.bincount(color_indices, weights=scores, minlength=n_colors)
+
+	with np.errstate(invalid='ignore', divide='ignore'):
+		return np.where(counts > 0, totals / counts, np.nan)
+
+# Screens the reflectors traced on an orbit's radargram against its cluttergram.
+# Returns (pixels, scores, probabilities, lags): the (color_indices, rows, columns) of every traced pixel, the clutter score
+# of each pixel, the clutter probability of each annotation colour (the surface's, colour 0, should be close to 1 if the
+# images were co-registered) and the delay of the radargram behind the cluttergram in every column.
+#	orbit_str:				SHARAD orbit number.
+#	max_lag (optional):		largest delay (rows) searched between the radargram and the cluttergram.
+#	tolerance (optional):	rows around each traced pixel searched for a cluttergram echo.
+def screen_orbit(orbit_str, max_lag=MAX_LAG, tolerance=TOLERANCE):
+	orbit_str = str(orbit_str).zfill(8)
+
+	with profiling.stage('read_echo_images'):
+		(pixels, shape) = annotation_sidecar.read_orbit_annotations(orbit_str)
+		radargram = surface_picker.read_echo_image(annotation_sidecar.get_radargram_file_name(orbit_str))
+		clutter = resample_to_shape(surface_picker.read_echo_image(get_cluttergram_file_name(orbit_str)), radargram.shape)
+
+	with profiling.stage('co_register', columns=radargram.shape[1]):
+		clutter_strength = get_echo_strength(clutter)
+		lags = get_column_lags(get_echo_strength(radargram), clutter_strength, max_lag)
+		aligned_strength = align_cluttergram(clutter_strength, lags)
+
+	(color_indices, rows, columns) = pixels
+	in_radargram = (rows < radargram.shape[0]) & (columns < radargram.shape[1])
+	pixels = (color_indices[in_radargram], rows[in_radargram], columns[in_radargram])
+
+	with profiling.stage('score_pixels', pixels=len(pixels[0])):
+		scores = score_pixels(aligned_strength, pixels[1], pixels[2], tolerance)
+		probabilities = get_clutter_probabilities(pixels[0], scores)
+
+	return (pixels, scores, probabilities, lags)
+
+# Saves an orbit's clutter scores (see screen_orbit) to ./downloads/SHARAD/clutter/. Returns the path of the file.
+def save_clutter_scores(orbit_str, pixels, scores, probabilities, lags):
+	file_name = get_clutter_file_name(orbit_str)
+	os.makedirs(CLUTTER_DIR, exist_ok=True)
+
+	(color_indices, rows, columns) = pixels
+	np.savez_compressed(file_name, color_names=np.array(annotations.COLOR_NAMES), probabilities=probabilities, lags=lags.astype(np.int16),
+						colors=color_indices, rows=rows, columns=columns, scores=scores)
+
+	return file_name
+
+# Prints the clutter probability of every traced reflector colour of an orbit.
+def print_clutter_probabilities(orbit_str, pixels, probabilities, lags):
+	counts = np.bincount(pixels[0], minlength=len(annotations.COLOR_NAMES))
+
+	print("orbit", orbit_str + ": radargram", format(np.median(lags), 'g'), "rows behind the cluttergram (median),",
+			"surface clutter score", format(probabilities[0], '.2f') if counts[0] else "n/a", "(should be close to 1)")
+	for color_index, color_name in enumerate(annotations.COLOR_NAMES[1:], 1):
+		if counts[color_index]:
+			print("\t" + color_name + ":", counts[color_index], "pixels, clutter probability", format(probabilities[color_index], '.2f'))
+
+# Command line interface (see screen_clutter.py).
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+						prog='screen_clutter',
+						description='Scores the reflectors traced on SHARAD radargrams by how strongly their cluttergrams predict an echo there.')
+	parser.add_argument('-o', '--orbit', nargs='+', required=True, help='orbit number(s) to screen')
+	parser.add_argument('--max-lag', type=int, default=MAX_LAG, help='largest delay in rows searched between the radargram and the cluttergram (default: ' + str(MAX_LAG) + ')')
+	parser.add_argument('--tolerance', type=int, default=TOLERANCE, help='rows around each traced pixel searched for a cluttergram echo (default: ' + str(TOLERANCE) + ')')
+	profiling.add_arguments(parser)
+	args = parser.parse_args(argv)
+
+	if args.profile:
+		profiling.enable(args.trace_memory)
+
+	for orbit in args.orbit:
+		orbit_str = str(orbit).zfill(8)
+		with profiling.stage('orbit', orbit=orbit_str):
+			(pixels, scores, probabilities, lags) = screen_orbit(orbit_str, args.max_lag, args.tolerance)
+			print_clutter_probabilities(orbit_str, pixels, probabilities, lags)
+			print("saved pixel scores to", save_clutter_scores(orbit_str, pixels, scores, probabilities, lags))
+
+	if args.profile:
+		profiling.report(args.profile)
@@ -0,0 +1,87 @@
+# Advanced Remote Sensing Spring 2023
+# Coordinate helpers shared by the MOLA plotting scripts: converting between Mars coordinates and MOLA DEM pixel indices,
+# and rasterizing a ground track into the DEM pixels it crosses. Every function accepts scalars or NumPy arrays.
+
+# References:
+#  MOLA DEM - https://astrogeology.usgs.gov/search/map/Mars/GlobalSurveyor/MOLA/Mars_MGS_MOLA_DEM_mosaic_global_463m
+#  NumPy documentation - https://numpy.org/doc/stable/index.html
+#  Martian Coordinate Systems - https://ode.rsl.wustl.edu/mars/pagehelp/Content/Frequently_Asked_Questions/Coordinate_System.htm
+
+import numpy as np
+
+MOLA_SCALE = 128 # MOLA DEM pixels per degree.
+MOLA_WIDTH = 360 * MOLA_SCALE # MOLA DEM width in pixels (one full turn of longitude).
+MOLA_HEIGHT = 180 * MOLA_SCALE # MOLA DEM height in pixels.
+
+# Converts coordinate pair to an image pixel on a hypothetical map of mars, where each pixel is 1 degree.
+# Returns (p_x, p_y) pixel index from the top left corner. Images are a 2D array of pixels in row-major order, so p_x must start from the left side of the map and p_y must go from the top down.
+#	x:					x coordinate(s).
+#	y:					y coordinate(s).
+#	x_ew (optional):	"w" for West of Mars' prime meridian. Alternatively, pass in a negative x-coordinate.
+#	y_ns (optional):	"s" for South of Mars' equator. Alternatively, pass in a negative y-coordinate.
+def convert_map_coordinates_to_pixel_index(x, y, x_ew="", y_ns=""):
+
+	p_x = np.where((x_ew == "w") | (np.asarray(x) < 0), 180 - np.abs(x), 180 + np.asarray(x))
+	p_y = np.where((y_ns == "s") | (np.asarray(y) < 0), 90 + np.abs(y), 90 - np.abs(y))
+
+	return (p_x[()], p_y[()])
+
+# Converts pixel index (p_x, p_y) to an image pixel on MOLA DEM by multiplying by MOLA scaling factor.
+def scale_pixel_index_for_mola(p_x, p_y):
+	scaled_x = np.trunc(np.asarray(p_x) * MOLA_SCALE).astype(np.int64)
+	scaled_y = np.trunc(np.asarray(p_y) * MOLA_SCALE).astype(np.int64)
+
+	return (scaled_x[()], scaled_y[()])
+
+# Returns longitude on Mars given a scaled pixel's x index. Used for labeling plot's x axis.
+def get_lon_from_scaled_pixel_index(x):
+
+	# remove MOLA scaling factor, then convert from unscaled pixel index to Mars x coordinate
+	return np.asarray(x) / MOLA_SCALE - 180
+
+# Returns latitude on Mars given a scaled pixel's y index. Used for labeling plot's y axis.
+def get_lat_from_scaled_pixel_index(y):
+
+	# remove MOLA scaling factor, then convert from unscaled pixel index to Mars y coordinate
+	# (positive above Mars' equator, negative below it)
+	return 90 - np.asarray(y) / MOLA_SCALE
+
+# Returns the pixels along a line between 2 points (x1, y1) and (x2, y2) as a pair of index arrays (xs, ys).
+# The 2 points must be in scaled pixel index format. One pixel is returned for every step along the line's longer axis
+# (the same pixels the original loop-based version produced), so the DEM can be sampled with a single gather: mars[0][ys, xs].
+# A line whose endpoints are more than half of the map apart in x is drawn the short way across the antimeridian,
+# with xs wrapped back onto the map. width and height are the size of the map in pixels (the MOLA DEM's by default,
+# or e.g. a level of the DEM pyramid).
+def get_line_from_point_pair(point1, point2, width=MOLA_WIDTH, height=MOLA_HEIGHT):
+	x1 = int(point1[0])
+	y1 = int(point1[1])
+	x2 = int(point2[0])
+	y2 = int(point2[1])
+
+	# cross the antimeridian instead of going the long way around Mars.
+	if x2 - x1 > width // 2:
+		x2 -= width
+	elif x1 - x2 > width // 2:
+		x2 += width
+
+	dx = x2 - x1
+	dy = y2 - y1
+
+	if abs(dy) > abs(dx) or dx == 0: # step along y (this includes the vertical "no slope" case)
+		ys = np.arange(min(y1, y2), max(y1, y2) + 1)
+		xs = np.trunc(x1 + (ys - y1) * (dx / dy)).astype(np.int64) if dy else np.full(ys.shape, x1)
+	else: # step along x
+		xs = np.arange(min(x1, x2), max(x1, x2) + 1)
+		ys = np.trunc(y1 + (xs - x1) * (dy / dx)).astype(np.int64)
+
+	xs = np.mod(xs, width)
+	ys = np.clip(ys, 0, height - 1)
+
+	return remove_repeated_pixels(xs, ys)
+
+# Removes pixels that repeat the pixel right before them, so that a rasterized track visits each pixel once per pass.
+def remove_repeated_pixels(xs, ys):
+	keep = np.ones(xs.shape, dtype=bool)
+	keep[1:] = (xs[1:] != xs[:-1]) | (ys[1:] != ys[:-1])
+
+	return (xs[keep], ys[keep])
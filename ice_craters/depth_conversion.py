@@ -0,0 +1,43 @@
+# Advanced Remote Sensing Spring 2023
+# Converts the radargram pixel delay between the traced surface and a traced reflector into a depth below the surface (m),
+# for whole arrays of frames, colours and dielectric constants at once.
+
+import numpy as np
+
+SPEED_OF_LIGHT = 299792458.0 # speed of light in a vacuum (m/s), same as scipy.constants.c.
+PIXEL_DELAY_MICROSEC = 0.0375 # two-way travel time (microseconds) between two vertically adjacent radargram pixels.
+SPEED_OF_LIGHT_MICROSEC = SPEED_OF_LIGHT / 1000000 # speed of light in meters per microsecond.
+
+# Returns the radargram pixel depth of each trace at each frame, as a (number of traces [x layers] x number of frames) array.
+# Frame n of the geometry table is column n of the radargram. Frames outside of the radargram are NaN.
+#	depths_by_color:	(number of traces [x layers] x radargram width) array of pixel depths, as returned by annotations.decode_pixels
+#						(or annotations.reduce_columns).
+#	frames:				array of frame numbers (the geometry table's radargram column numbers).
+def get_frame_pixel_depths(depths_by_color, frames):
+	frames = np.asarray(frames, dtype=np.int64)
+	in_radargram = (frames >= 0) & (frames < depths_by_color.shape[-1])
+
+	frame_depths = np.full(depths_by_color.shape[:-1] + frames.shape, np.nan)
+	frame_depths[..., in_radargram] = depths_by_color[..., frames[in_radargram]]
+
+	return frame_depths
+
+# Converts reflector pixel depths to depths below the surface (m) for every dielectric constant in one broadcast.
+# Returns an array of shape (number of dielectric constants,) + reflector_pixels.shape, or reflector_pixels.shape if a single
+# dielectric constant is given. Depths are NaN wherever the reflector or the surface is not traced.
+#	reflector_pixels:		array of reflector pixel depths, e.g. (number of colours x number of frames).
+#	surface_pixels:			array of surface pixel depths that broadcasts against reflector_pixels, e.g. (number of frames).
+#	dielectric_constants:	dielectric constant(s) of the subsurface (1 for a vacuum, about 3.1 for water ice).
+def convert_pixel_depths(reflector_pixels, surface_pixels, dielectric_constants=1.0):
+	delta_p = np.asarray(reflector_pixels, dtype=np.float64) - np.asarray(surface_pixels, dtype=np.float64) # difference in radargram pixel depth between surface and reflector
+	delta_t = delta_p * (PIXEL_DELAY_MICROSEC / 2) # delay in microsec (one-way travel time)
+
+	dielectric_constants = np.asarray(dielectric_constants, dtype=np.float64)
+	wave_speeds = SPEED_OF_LIGHT_MICROSEC / np.sqrt(dielectric_constants) # speed of the radar wave in the subsurface (m / microsec)
+
+	return wave_speeds.reshape(dielectric_constants.shape + (1,) * delta_t.ndim) * delta_t
+
+# Returns dielectric constants from start to stop (inclusive) in increments of step, e.g. get_dielectric_sweep(1.0, 9.0, 0.1).
+def get_dielectric_sweep(start, stop, step):
+	n_steps = int(round((stop - start) / step))
+	return np.round(start + step * np.arange(n_steps + 1), 10)
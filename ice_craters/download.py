@@ -0,0 +1,243 @@
+# AUTHOR:		Kate McCarthy (kem6ur@virginia.edu, kemccarthy6@gmail.com)
+# CREATED: 		November 2022 (Last modified April 2023)
+# DESCRIPTION:	Downloads MOLA DEM and SHARAD radargram, cluttergram, and geom table for a given orbit.
+#				Files are streamed to disk in chunks, interrupted downloads resume where they stopped (HTTP Range requests),
+#				an orbit's products are downloaded concurrently, and files recorded in ./downloads/manifest.json are not downloaded again.
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import profiling
+
+try:
+	import fcntl # used to lock the manifest while it is updated (not available on Windows)
+except ImportError:
+	fcntl = None
+
+# requests is imported when a file is downloaded, so that importing this module stays fast.
+
+DOWNLOADS_DIR = './downloads'
+MANIFEST_FILE_NAME = DOWNLOADS_DIR + '/manifest.json'
+
+MOLA_DEM_FILE_NAME = DOWNLOADS_DIR + '/MOLA/Mars_MGS_MOLA_DEM_mosaic_global_463m.tif'
+MOLA_DEM_URL = 'https://planetarymaps.usgs.gov/mosaic/Mars_MGS_MOLA_DEM_mosaic_global_463m.tif'
+PDS_GEOSCIENCES_URL = 'https://pds-geosciences.wustl.edu'
+
+CHUNK_SIZE = 1024 * 1024 # bytes written to disk at a time.
+RETRIES = 3 # number of times an interrupted download is resumed before giving up.
+TIMEOUT = 60 # seconds to wait for the server to respond.
+
+# Records the size, ETag and SHA-256 hash of every downloaded file, so files that are already downloaded can be skipped.
+# The manifest is a JSON object keyed by local file name, saved after every change. It can be shared between download threads,
+# and between processes downloading at the same time (each update re-reads the file under a lock before writing it back).
+class Manifest:
+
+	def __init__(self, file_name=MANIFEST_FILE_NAME):
+		self.file_name = file_name
+		self.lock = threading.Lock()
+		self.entries = self.read()
+
+	def read(self):
+		if not os.path.exists(self.file_name):
+			return {}
+		with open(self.file_name) as manifest_file:
+			return json.load(manifest_file)
+
+	# Returns a copy of the entry of file_name (or None), so that callers can update it and write it back with set.
+	def get(self, file_name):
+		with self.lock:
+			entry = self.entries.get(file_name)
+			return None if entry is None else dict(entry)
+
+	def set(self, file_name, entry):
+		with self.lock:
+			os.makedirs(os.path.dirname(self.file_name) or '.', exist_ok=True)
+
+			with open(self.file_name + '.lock', 'w') as lock_file:
+				if fcntl is not None:
+					fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+				# pick up entries written by other processes since the manifest was last read.
+				self.entries = self.read()
+				self.entries[file_name] = dict(entry)
+
+				# write to a temporary file first so that the manifest is never left half written.
+				temp_file_name = self.file_name + '.' + str(os.getpid()) + '.tmp'
+				with open(temp_file_name, 'w') as manifest_file:
+					json.dump(self.entries, manifest_file, indent='\t', sort_keys=True)
+				os.replace(temp_file_name, self.file_name)
+
+	# Returns True if file_name was completely downloaded from url. The file may have been changed since
+	# (e.g. a radargram that has been annotated), so its current size and hash are not compared to the manifest.
+	def is_cached(self, file_name, url):
+		entry = self.get(file_name)
+		return entry is not None and entry.get('complete') and entry.get('url') == url and os.path.exists(file_name)
+
+	# Records a file that was downloaded before the manifest existed, so that it is not downloaded (and overwritten) again.
+	def adopt(self, file_name, url):
+		self.set(file_name, {'url': url, 'complete': True, 'etag': None, 'size': os.path.getsize(file_name), 'sha256': hash_file(file_name)})
+
+# Returns the SHA-256 hash of a file's contents.
+@profiling.profiled('hash_file')
+def hash_file(file_name):
+	sha256 = hashlib.sha256()
+	with open(file_name, 'rb') as f:
+		for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+			sha256.update(chunk)
+	return sha256.hexdigest()
+
+# Downloads url to file_name unless the manifest shows it is already downloaded. Returns True if the file was downloaded.
+# The file is streamed to file_name + '.part' and only renamed to file_name once complete. If the download is interrupted,
+# it is resumed from the end of the partial file (if the server supports Range requests and the file has not changed).
+#	url:					URL of the file to download.
+#	file_name:				local path to save the file to.
+#	manifest:				Manifest to check and record the download in.
+#	force (optional):		download the file even if the manifest shows it is already downloaded.
+def download_file(url, file_name, manifest, force=False):
+	if not force and manifest.get(file_name) is None and os.path.exists(file_name):
+		manifest.adopt(file_name, url)
+
+	if not force and manifest.is_cached(file_name, url):
+		print("already downloaded", file_name)
+		return False
+
+	import requests
+
+	os.makedirs(os.path.dirname(file_name), exist_ok=True)
+	part_file_name = file_name + '.part'
+
+	# only resume a partial file that came from the same URL.
+	entry = manifest.get(file_name)
+	if entry is None or entry.get('url') != url or force:
+		entry = {'url': url, 'complete': False}
+		if os.path.exists(part_file_name):
+			os.remove(part_file_name)
+
+	with profiling.stage('download', file=file_name):
+		for attempt in range(RETRIES + 1):
+			try:
+				stream_to_file(url, part_file_name, entry, manifest, file_name)
+				break
+			except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as error:
+				if attempt == RETRIES:
+					raise
+				print("download of", url, "interrupted (" + str(error) + "), resuming")
+
+	os.replace(part_file_name, file_name)
+
+	entry['complete'] = True
+	entry['size'] = os.path.getsize(file_name)
+	entry['sha256'] = hash_file(file_name)
+	manifest.set(file_name, entry)
+
+	print("downloaded", file_name)
+	return True
+
+# Streams url to part_file_name in chunks, continuing from the end of part_file_name if it already exists.
+def stream_to_file(url, part_file_name, entry, manifest, file_name):
+	import requests
+
+	headers = {}
+	offset = os.path.getsize(part_file_name) if os.path.exists(part_file_name) else 0
+	if offset > 0:
+		headers['Range'] = 'bytes=' + str(offset) + '-'
+		if entry.get('etag'):
+			headers['If-Range'] = entry['etag'] # the server sends the whole file again if it has changed
+
+	with requests.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+		if response.status_code == 416: # partial file is already complete (or no longer matches the file on the server)
+			os.remove(part_file_name)
+			return stream_to_file(url, part_file_name, entry, manifest, file_name)
+
+		response.raise_for_status()
+
+		if response.status_code != 206: # server sent the whole file
+			offset = 0
+
+		if response.headers.get('ETag') != entry.get('etag'):
+			entry['etag'] = response.headers.get('ETag')
+			manifest.set(file_name, entry)
+
+		with open(part_file_name, 'ab' if offset > 0 else 'wb') as part_file:
+			for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+				part_file.write(chunk)
+
+# Downloads the MOLA DEM if it is not already downloaded.
+def download_mola_dem(manifest, url=MOLA_DEM_URL, force=False):
+	return download_file(url, MOLA_DEM_FILE_NAME, manifest, force=force)
+
+# Returns the (url, local file name) of the radargram, cluttergram and geometry table of a SHARAD orbit, as a dict by product.
+#	orbit_str:					SHARAD orbit number.
+#	pds_url (optional):			base URL of the PDS Geosciences Node (can be pointed at a local server).
+def get_orbit_files(orbit_str, pds_url=PDS_GEOSCIENCES_URL):
+	orbit_str = str(orbit_str).zfill(8)
+	first_4_digits = orbit_str[:4]
+
+	files = {
+		'radargram': (
+			pds_url + "/mro/mro-m-sharad-5-radargram-v2/mrosh_2101/browse/tiff/s_" + first_4_digits + "xx/s_" + orbit_str + "_tiff.tif",
+			DOWNLOADS_DIR + "/SHARAD/images/radargrams/s_" + orbit_str + ".tif",
+		),
+		'cluttergram': (
+			pds_url + "/mro/urn-nasa-pds-mro_sharad_simulations/browse/s_" + first_4_digits + "xx/s_" + orbit_str + "/s_" + orbit_str + "_browse_combined.tif",
+			DOWNLOADS_DIR + "/SHARAD/images/cluttergrams/s_" + orbit_str + ".tif",
+		),
+		'geom': (
+			pds_url + "/mro/mro-m-sharad-5-radargram-v2/mrosh_2101/data/geom/s_" + first_4_digits + "xx/s_" + orbit_str + "_geom.tab",
+			DOWNLOADS_DIR + "/SHARAD/geom/s_" + orbit_str + "_geom.csv",
+		),
+	}
+
+	return files
+
+# Downloads the radargram, cluttergram and geometry table of a SHARAD orbit concurrently.
+# Returns a dict with the local file name of each product.
+#	orbit_str:					SHARAD orbit number.
+#	manifest:					Manifest to check and record the downloads in.
+#	pds_url (optional):			base URL of the PDS Geosciences Node (can be pointed at a local server).
+#	force (optional):			download the files even if they are already downloaded.
+def download_orbit(orbit_str, manifest, pds_url=PDS_GEOSCIENCES_URL, force=False):
+	files = get_orbit_files(orbit_str, pds_url)
+
+	with ThreadPoolExecutor(max_workers=len(files)) as executor:
+		futures = [executor.submit(download_file, url, file_name, manifest, force) for (url, file_name) in files.values()]
+		for future in futures:
+			future.result() # re-raise any download error
+
+	return {product: file_name for product, (url, file_name) in files.items()}
+
+# Command line interface (see download_data.py).
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+						prog='download_files',
+						description='Downloads SHARAD radargram, cluttergram, and geom table for a specified orbit.')
+	parser.add_argument('-o', '--orbit', required=True)
+	parser.add_argument('-f', '--force', action='store_true', help='download files again even if they are already downloaded')
+	parser.add_argument('--build-pyramid', action='store_true', help='also build the overview pyramid of the MOLA DEM (about 500 MB) used for long and preview profiles')
+	profiling.add_arguments(parser)
+	args = parser.parse_args(argv)
+
+	if args.profile:
+		profiling.enable(args.trace_memory)
+
+	manifest = Manifest()
+
+	# Download MOLA DEM if not already downloaded
+	download_mola_dem(manifest, force=args.force)
+	if args.build_pyramid:
+		from . import mola_dem
+		with profiling.stage('build_pyramid'):
+			print("built MOLA DEM pyramid in", mola_dem.build_pyramid(MOLA_DEM_FILE_NAME))
+
+	download_orbit(args.orbit, manifest, force=args.force)
+
+	# add the orbit's ground track to the spatial index (see find_orbits.py)
+	from . import track_index
+	track_index.get_index()
+
+	if args.profile:
+		profiling.report(args.profile)
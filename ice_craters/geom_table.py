@@ -0,0 +1,75 @@
+# Advanced Remote Sensing Spring 2023
+# Reads a SHARAD geometry table (s_<orbit>_geom.tab, saved as s_<orbit>_geom.csv by download_data.py) into typed NumPy columns.
+# The whole table is parsed at once, longitudes are normalized to -180..180, and the result is saved next to the table as a
+# binary .npy sidecar that later reads memory-map instead of parsing the text again.
+
+import os
+
+import numpy as np
+
+# Columns of the geometry table, in order. The table has one row per radargram column (frame).
+# Any columns after these are read as float64 and named column_<n> (starting from 1).
+GEOM_COLUMNS = [
+	('frame', np.int32), # radargram column number (starting from 1)
+	('time', 'datetime64[us]'), # UTC time of the frame
+	('lat', np.float64), # planetocentric latitude (degrees)
+	('lon', np.float64), # planetocentric longitude (degrees, -180 to 180 once read)
+	('mars_radius', np.float64),
+	('spacecraft_radius', np.float64),
+	('radial_velocity', np.float64),
+	('tangential_velocity', np.float64),
+	('solar_zenith_angle', np.float64),
+]
+
+# Returns the path of an orbit's geometry table.
+def get_geom_file_name(orbit_str):
+	return './downloads/SHARAD/geom/s_' + str(orbit_str).zfill(8) + '_geom.csv'
+
+# Returns the path of the binary sidecar of a geometry table.
+def get_sidecar_file_name(geom_file_name):
+	return os.path.splitext(geom_file_name)[0] + '.npy'
+
+# Parses a geometry table text file into a structured array with one field per column (see GEOM_COLUMNS).
+def parse_geom_table(geom_file_name):
+	with open(geom_file_name) as geom:
+		first_row = geom.readline()
+	n_columns = first_row.count(',') + 1
+
+	columns = GEOM_COLUMNS[:n_columns] + [('column_' + str(i + 1), np.float64) for i in range(len(GEOM_COLUMNS), n_columns)]
+
+	# parse every column as text except time, which is converted separately because it may be padded with spaces.
+	text_dtype = [(name, 'U32' if name == 'time' else dtype) for (name, dtype) in columns]
+	text_table = np.loadtxt(geom_file_name, delimiter=',', dtype=text_dtype, ndmin=1)
+
+	table = np.empty(len(text_table), dtype=columns)
+	for (name, dtype) in columns:
+		if name == 'time':
+			table['time'] = np.char.rstrip(np.char.strip(text_table['time']), 'Z').astype('datetime64[us]')
+		else:
+			table[name] = text_table[name]
+
+	# normalize longitude from 0..360 to -180..180
+	if 'lon' in table.dtype.names:
+		table['lon'] = np.where(table['lon'] > 180, table['lon'] - 360, table['lon'])
+
+	return table
+
+# Returns the geometry table as a structured array with one field per column (see GEOM_COLUMNS), e.g. table['lat'].
+# The first read parses the text and saves a .npy sidecar next to it. Later reads memory-map the sidecar, unless the text file is newer.
+#	geom_file_name:			path of the geometry table.
+#	use_sidecar (optional):	False to always parse the text file (and not write a sidecar).
+def read_geom_table(geom_file_name, use_sidecar=True):
+	if not use_sidecar:
+		return parse_geom_table(geom_file_name)
+
+	sidecar_file_name = get_sidecar_file_name(geom_file_name)
+	if os.path.exists(sidecar_file_name) and os.path.getmtime(sidecar_file_name) >= os.path.getmtime(geom_file_name):
+		return np.load(sidecar_file_name, mmap_mode='r')
+
+	table = parse_geom_table(geom_file_name)
+
+	temp_file_name = sidecar_file_name[:-len('.npy')] + '.' + str(os.getpid()) + '.tmp.npy'
+	np.save(temp_file_name, table)
+	os.replace(temp_file_name, sidecar_file_name)
+
+	return table
@@ -0,0 +1,166 @@
+# Advanced Remote Sensing Spring 2023
+# Combines the reflector points of many orbits (see reflector_store.py) into one map of a region, on a grid aligned with the
+# MOLA DEM's pixels (MOLA_SCALE pixels per degree, or every factor x factor block of them). Orbits are added one at a time to
+# fixed-size accumulators holding the count, sum, minimum, maximum and sum of squares of the reflector elevations in every
+# grid cell, so memory depends only on the size of the region, not on the number of orbits.
+# The ice thickness of each cell (the MOLA elevation minus the reflector's elevation) is then saved as a GeoTIFF with the
+# DEM's georeferencing.
+
+# Example: map the ice thickness above red reflectors (er = 3.1) of every processed orbit around a crater, on 4 x 4 MOLA pixel cells.
+#	python3 grid_reflectors.py --bbox -131 18 -129 20 -e 3.1 --color red --factor 4 --output-file crater_thickness.tif
+
+import argparse
+
+import numpy as np
+
+from . import annotations, mola_dem, profiling, reflector_store
+from .coordinates import MOLA_HEIGHT, MOLA_SCALE, MOLA_WIDTH
+
+# Bands of the ice thickness GeoTIFF (see write_thickness_geotiff), in order.
+THICKNESS_BANDS = ('thickness', 'min_thickness', 'max_thickness', 'std', 'count')
+
+# Running per-cell statistics of values added at (lon, lat) points, on the cells of a region of the MOLA DEM grid.
+#	bbox:		(min_lon, min_lat, max_lon, max_lat) of the region in degrees (-180 to 180), snapped outwards to whole cells.
+#	factor:		width and height of a cell in MOLA DEM pixels.
+class GridAccumulator:
+
+	def __init__(self, bbox, factor=1):
+		(min_lon, min_lat, max_lon, max_lat) = bbox
+		if min_lon >= max_lon or min_lat >= max_lat:
+			raise ValueError("bounding box must have min_lon < max_lon and min_lat < max_lat")
+
+		self.factor = factor
+		cell_scale = MOLA_SCALE / factor # cells per degree
+		self.col_start = int(np.floor((min_lon + 180) * cell_scale))
+		self.row_start = int(np.floor((90 - max_lat) * cell_scale))
+		col_stop = min(int(np.ceil((max_lon + 180) * cell_scale)), MOLA_WIDTH // factor)
+		row_stop = min(int(np.ceil((90 - min_lat) * cell_scale)), MOLA_HEIGHT // factor)
+		self.shape = (row_stop - self.row_start, col_stop - self.col_start)
+
+		n_cells = self.shape[0] * self.shape[1]
+		self.count = np.zeros(n_cells, dtype=np.int64)
+		self.total = np.zeros(n_cells)
+		self.sum_squares = np.zeros(n_cells)
+		self.minimum = np.full(n_cells, np.inf)
+		self.maximum = np.full(n_cells, -np.inf)
+
+	# Returns the flat cell index of each (lon, lat) point, or -1 outside the region.
+	def get_cells(self, lons, lats):
+		cell_scale = MOLA_SCALE / self.factor
+		cols = np.floor((np.asarray(lons, dtype=np.float64) + 180) * cell_scale).astype(np.int64) - self.col_start
+		rows = np.floor((90 - np.asarray(lats, dtype=np.float64)) * cell_scale).astype(np.int64) - self.row_start
+
+		inside = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+		return np.where(inside, rows * self.shape[1] + cols, -1)
+
+	# Adds values at (lon, lat) points to the statistics of their cells. Points outside the region and NaN values are ignored.
+	# Returns the number of points added.
+	def add(self, lons, lats, values):
+		values = np.asarray(values, dtype=np.float64)
+		cells = self.get_cells(lons, lats)
+		keep = (cells >= 0) & ~np.isnan(values)
+		(cells, values) = (cells[keep], values[keep])
+
+		n_cells = len(self.count)
+		self.count += np.bincount(cells, minlength=n_cells)
+		self.total += np.bincount(cells, weights=values, minlength=n_cells)
+		self.sum_squares += np.bincount(cells, weights=values * values, minlength=n_cells)
+		np.minimum.at(self.minimum, cells, values)
+		np.maximum.at(self.maximum, cells, values)
+
+		return len(cells)
+
+	# Returns the mean, minimum, maximum and standard deviation of each cell as (rows x cols) arrays (NaN in empty cells),
+	# and the count of each cell.
+	def get_statistics(self):
+		has_data = self.count > 0
+		count = np.maximum(self.count, 1)
+
+		mean = np.where(has_data, self.total / count, np.nan)
+		variance = np.maximum(self.sum_squares / count - np.nan_to_num(mean) ** 2, 0)
+		std = np.where(has_data, np.sqrt(variance), np.nan)
+		minimum = np.where(has_data, self.minimum, np.nan)
+		maximum = np.where(has_data, self.maximum, np.nan)
+
+		return tuple(statistic.reshape(self.shape) for statistic in (mean, minimum, maximum, std, self.count))
+
+	# Returns the MOLA elevation (m) of each cell: the DEM pixel, or the mean of the cell's factor x factor pixels.
+	def read_dem(self, path=mola_dem.MOLA_DEM_PATH):
+		dem = mola_dem.get_dem(path)
+		block = dem.read_window(self.row_start * self.factor, (self.row_start + self.shape[0]) * self.factor,
+								self.col_start * self.factor, (self.col_start + self.shape[1]) * self.factor).astype(np.float64)
+
+		return block.reshape(self.shape[0], self.factor, self.shape[1], self.factor).mean(axis=(1, 3))
+
+# Adds the stored reflector elevations of every orbit (or of the given orbits) to an accumulator, one orbit at a time.
+# Returns the number of orbits that had points in the region.
+#	accumulator:			GridAccumulator of the region.
+#	dielectric_constant:	dielectric constant the reflector depths were computed for.
+#	colors (optional):		reflector colour names to add, or None for every colour.
+#	orbits (optional):		orbit numbers to add, or None for every orbit in the reflector store.
+def add_reflector_orbits(accumulator, dielectric_constant, colors=None, orbits=None, store_dir=reflector_store.REFLECTORS_DIR):
+	orbits = reflector_store.get_stored_orbits(store_dir) if orbits is None else [str(orbit).zfill(8) for orbit in orbits]
+
+	n_orbits = 0
+	for orbit_str in orbits:
+		with profiling.stage('grid_orbit', orbit=orbit_str):
+			points = reflector_store.query(None, None, colors, [dielectric_constant], [orbit_str], store_dir)
+			if accumulator.add(points['lon'], points['lat'], points['elevation']):
+				n_orbits += 1
+
+	return n_orbits
+
+# Saves the ice thickness (MOLA elevation minus reflector elevation) of every cell of an accumulator of reflector elevations
+# as a float32 GeoTIFF, with one band per entry of THICKNESS_BANDS: the thickness down to the mean, highest and lowest
+# reflector elevation, the standard deviation of the elevations, and the number of points. Empty cells are NaN.
+# The grid is georeferenced with the DEM's coordinate system and transform, so it lines up with the DEM pixels.
+#	file_name:		path of the GeoTIFF to write.
+#	accumulator:	GridAccumulator of reflector elevations.
+#	path:			path to the MOLA DEM GeoTIFF.
+def write_thickness_geotiff(file_name, accumulator, path=mola_dem.MOLA_DEM_PATH):
+	import rasterio
+	from rasterio.transform import Affine
+
+	(mean, minimum, maximum, std, count) = accumulator.get_statistics()
+	surface = accumulator.read_dem(path)
+	bands = np.stack([surface - mean, surface - maximum, surface - minimum, std, np.where(count > 0, count, np.nan)]).astype(np.float32)
+
+	with rasterio.open(path) as dem:
+		(crs, dem_transform) = (dem.crs, dem.transform)
+	transform = dem_transform * Affine.translation(accumulator.col_start * accumulator.factor, accumulator.row_start * accumulator.factor) * Affine.scale(accumulator.factor)
+
+	with rasterio.open(file_name, 'w', driver='GTiff', height=accumulator.shape[0], width=accumulator.shape[1], count=len(THICKNESS_BANDS),
+						dtype='float32', crs=crs, transform=transform, nodata=np.nan, compress='deflate') as output:
+		output.write(bands)
+		for (band, description) in enumerate(THICKNESS_BANDS, 1):
+			output.set_band_description(band, description)
+
+	return file_name
+
+# Command line interface (see grid_reflectors.py).
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+						prog='grid_reflectors',
+						description='Maps the ice thickness above the stored reflectors of many SHARAD orbits on a grid aligned with the MOLA DEM.')
+	parser.add_argument('--bbox', type=float, nargs=4, required=True, metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'), help='region to map, in degrees (-180 to 180)')
+	parser.add_argument('-e', '--dielectric', type=float, default=3.1, help='dielectric constant the reflector depths were computed for (default: 3.1)')
+	parser.add_argument('--color', nargs='+', choices=annotations.REFLECTOR_COLOR_NAMES, help='only map reflectors traced in these colours')
+	parser.add_argument('-o', '--orbit', nargs='+', help='only map these orbits (default: every orbit in ./downloads/SHARAD/reflectors/)')
+	parser.add_argument('--factor', type=int, default=1, help='grid cell size in MOLA DEM pixels (default: 1, i.e. 1/128 degree)')
+	parser.add_argument('--output-file', default='ice_thickness.tif', help='GeoTIFF to write (default: ice_thickness.tif)')
+	profiling.add_arguments(parser)
+	args = parser.parse_args(argv)
+
+	if args.profile:
+		profiling.enable(args.trace_memory)
+
+	accumulator = GridAccumulator(args.bbox, args.factor)
+	n_orbits = add_reflector_orbits(accumulator, args.dielectric, args.color, args.orbit)
+	with profiling.stage('write_geotiff'):
+		write_thickness_geotiff(args.output_file, accumulator)
+
+	print(np.count_nonzero(accumulator.count), "of", accumulator.count.size, "cells mapped from", n_orbits, "orbits")
+	print("saved ice thickness to", args.output_file)
+
+	if args.profile:
+		profiling.report(args.profile)
@@ -0,0 +1,87 @@
+# Advanced Remote Sensing Spring 2023
+# Incremental re-processing of an annotated radargram. The decoded annotations, a hash of every radargram column and the
+# plotted reflector depths of the last run are saved in ./downloads/cache/. On the next run only the columns whose hash changed
+# (e.g. the few hundred columns touched by one corrected brush stroke) are decoded and converted to depths again.
+
+import os
+
+import numpy as np
+
+from . import annotations
+from .profile_cache import CACHE_DIR
+
+# Returns the path of the saved state of an orbit's last run.
+def get_state_file_name(orbit_str):
+	return CACHE_DIR + '/annotations_s_' + str(orbit_str).zfill(8) + '.npz'
+
+# Returns the saved state of an orbit's last run as a dict of arrays, or None if there is none.
+def load_state(orbit_str):
+	state_file_name = get_state_file_name(orbit_str)
+	if not os.path.exists(state_file_name):
+		return None
+
+	with np.load(state_file_name) as state:
+		return dict(state)
+
+# Saves the state of an orbit's run (a dict of arrays).
+def save_state(orbit_str, state):
+	state_file_name = get_state_file_name(orbit_str)
+
+	os.makedirs(CACHE_DIR, exist_ok=True)
+	temp_file_name = state_file_name[:-len('.npz')] + '.' + str(os.getpid()) + '.tmp.npz'
+	np.savez(temp_file_name, **state)
+	os.replace(temp_file_name, state_file_name)
+
+# Returns the name saved in the state for how thick traces were reduced to depths, e.g. "bottom" or "median/2 layers".
+def get_column_reduction_key(method="bottom", max_layers=None):
+	return method if max_layers is None else method + "/" + str(max_layers) + " layers"
+
+# Returns the name saved in the state for the clutter tolerance of the picked surface, "" if the surface was not picked or not checked.
+def get_clutter_tolerance_key(surface_method=None, clutter_tolerance=None):
+	return "" if surface_method is None or clutter_tolerance is None else format(clutter_tolerance, 'g')
+
+# Decodes an orbit's traced pixels (see annotation_sidecar.read_orbit_annotations), reusing the decoded columns of the last run
+# where the column has not changed. Returns (depths_by_color, changed_columns, column_hashes): the decoded depths
+# (see annotations.decode_annotations), the indices of the columns that were decoded again, and the hash of every column
+# (to save for the next run).
+#	pixels:		(color_indices, rows, columns) of every traced pixel.
+#	shape:		(height, width) of the radargram.
+#	state:		saved state of the last run (see load_state), or None to decode every column.
+#	method, max_layers (optional):	how thick traces are reduced to depths, see annotations.reduce_columns. Every column is decoded
+#									again if the last run reduced them differently.
+def decode_annotations_incremental(pixels, shape, state, method="bottom", max_layers=None):
+	column_hashes = annotations.hash_columns(*pixels, shape)
+
+	if state is None or state['column_hashes'].shape != column_hashes.shape or str(state.get('column_reduction', 'bottom')) != get_column_reduction_key(method, max_layers):
+		return (annotations.decode_pixels(*pixels, shape[1], method, max_layers), np.arange(shape[1]), column_hashes)
+
+	changed_columns = np.flatnonzero(column_hashes != state['column_hashes'])
+
+	(color_indices, rows, columns) = pixels
+	in_changed_column = np.isin(columns, changed_columns)
+
+	depths_by_color = state['depths_by_color'].copy()
+	depths_by_color[..., changed_columns] = annotations.decode_pixels(color_indices[in_changed_column], rows[in_changed_column], np.searchsorted(changed_columns, columns[in_changed_column]), len(changed_columns), method, max_layers)
+
+	return (depths_by_color, changed_columns, column_hashes)
+
+# Returns the indices of the frames whose reflector depths must be recomputed: the frames in changed_columns, or every frame
+# if the last run's plotted depths cannot be reused (no saved state, or different dielectric constants, surface method, clutter
+# tolerance, column reduction or frames).
+#	frames:					array of frame numbers (radargram column numbers) that are plotted.
+#	changed_columns:		indices of the radargram columns that changed since the last run.
+#	state:					saved state of the last run, or None.
+#	dielectric_constants:	dielectric constants the depths are computed for.
+#	surface_method:			how the surface was found where it is not traced by hand (see pipeline.process_orbit), or None.
+#	column_reduction:		how thick traces were reduced to depths (see get_column_reduction_key).
+#	clutter_tolerance:		tolerance the picked surface was checked against the cluttergram with (see surface_picker.pick_orbit_surface), or None.
+def get_frames_to_update(frames, changed_columns, state, dielectric_constants, surface_method=None, column_reduction="bottom", clutter_tolerance=None):
+	if state is None or 'plot_depths' not in state or 'frames' not in state or not np.array_equal(state['frames'], frames) or not np.array_equal(state['dielectric_constants'], dielectric_constants):
+		return np.arange(len(frames))
+
+	if str(state.get('surface_method', '')) != str(surface_method or '') or str(state.get('column_reduction', 'bottom')) != column_reduction:
+		return np.arange(len(frames))
+	if str(state.get('clutter_tolerance', '')) != get_clutter_tolerance_key(surface_method, clutter_tolerance):
+		return np.arange(len(frames))
+
+	return np.flatnonzero(np.isin(frames, changed_columns))
@@ -0,0 +1,343 @@
+# Advanced Remote Sensing Spring 2023
+# Shared access to the MOLA DEM. The global mosaic is opened once per process and read in small square tiles,
+# so a profile only pulls the tiles its ground track touches instead of the whole ~2 GB raster.
+# An overview pyramid of the DEM (the mean, minimum and maximum of every 4 x 4, 8 x 8, ... block of pixels) can be built once,
+# so that long or preview profiles, which need far fewer samples than the full resolution offers, are sampled from a coarser level.
+
+# References:
+#  MOLA DEM - https://astrogeology.usgs.gov/search/map/Mars/GlobalSurveyor/MOLA/Mars_MGS_MOLA_DEM_mosaic_global_463m
+#  Rasterio windowed reading - https://rasterio.readthedocs.io/en/stable/topics/windowed-rw.html
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from .coordinates import MOLA_SCALE, convert_map_coordinates_to_pixel_index, scale_pixel_index_for_mola
+
+# rasterio is imported when the DEM is first opened, so that importing this module stays fast.
+
+# Downloaded MOLA DEM from: https://astrogeology.usgs.gov/search/map/Mars/GlobalSurveyor/MOLA/Mars_MGS_MOLA_DEM_mosaic_global_463m
+MOLA_DEM_PATH = './downloads/MOLA/Mars_MGS_MOLA_DEM_mosaic_global_463m.tif'
+
+TILE_SIZE = 512 # width and height (pixels) of each tile read from the DEM.
+TILE_CACHE_SIZE = 256 # number of tiles kept in memory (256 int16 tiles of 512 x 512 is 128 MB).
+
+PYRAMID_FACTORS = (4, 8, 16, 32, 64) # decimation factors of the overview pyramid levels (the 4x level is 1/16 of the DEM's size).
+PYRAMID_STATS = ('mean', 'min', 'max')
+
+# Returns the path of the uncompressed, memory-mappable copy of the DEM at path (see build_memmap_cache).
+def get_memmap_cache_path(path=MOLA_DEM_PATH):
+	return os.path.splitext(path)[0] + '.npy'
+
+# Writes an uncompressed .npy copy of the DEM next to it, one block of rows at a time, unless it already exists.
+# When the copy exists, MolaDEM memory-maps it instead of decoding GeoTIFF tiles, so processes reading the DEM at the same time
+# share one read-only copy through the operating system's page cache. Returns the path of the copy.
+#	path:			path to the MOLA DEM GeoTIFF.
+#	rows_per_block:	number of DEM rows read into memory at a time.
+def build_memmap_cache(path=MOLA_DEM_PATH, rows_per_block=TILE_SIZE):
+	cache_path = get_memmap_cache_path(path)
+	if os.path.exists(cache_path):
+		return cache_path
+
+	import rasterio
+	from rasterio.windows import Window
+
+	with rasterio.open(path) as dataset:
+		partial_path = cache_path + '.part'
+		cache = np.lib.format.open_memmap(partial_path, mode='w+', dtype=dataset.dtypes[0], shape=(dataset.height, dataset.width))
+
+		for row_start in range(0, dataset.height, rows_per_block):
+			n_rows = min(rows_per_block, dataset.height - row_start)
+			cache[row_start:row_start + n_rows] = dataset.read(1, window=Window(0, row_start, dataset.width, n_rows))
+
+		cache.flush()
+		del cache
+
+	os.replace(partial_path, cache_path)
+	return cache_path
+
+# Reads the MOLA DEM in tiles and keeps the most recently used tiles in memory.
+# If an uncompressed copy of the DEM has been built with build_memmap_cache, it is memory-mapped and read directly instead.
+#	path:			path to the MOLA DEM GeoTIFF.
+#	tile_size:		width and height of each tile in pixels.
+#	cache_size:		maximum number of tiles to keep in memory.
+class MolaDEM:
+
+	def __init__(self, path=MOLA_DEM_PATH, tile_size=TILE_SIZE, cache_size=TILE_CACHE_SIZE):
+		self.path = path
+		self.tile_size = tile_size
+		self.cache_size = cache_size
+
+		self.dataset = None
+		self.memmap = None
+
+		if os.path.exists(get_memmap_cache_path(path)):
+			self.memmap = np.load(get_memmap_cache_path(path), mmap_mode='r')
+			(self.height, self.width) = self.memmap.shape
+			self.dtype = self.memmap.dtype
+		else:
+			import rasterio
+			self.dataset = rasterio.open(path)
+			self.height = self.dataset.height
+			self.width = self.dataset.width
+			self.dtype = np.dtype(self.dataset.dtypes[0])
+
+		self.n_tile_cols = -(-self.width // tile_size) # ceiling division
+
+		self.tiles = OrderedDict()
+
+	# Returns the tile in tile row tile_row and tile column tile_col, reading it from the DEM if it is not cached.
+	def read_tile(self, tile_row, tile_col):
+		key = (tile_row, tile_col)
+
+		tile = self.tiles.get(key)
+		if tile is not None:
+			self.tiles.move_to_end(key)
+			return tile
+
+		row_off = tile_row * self.tile_size
+		col_off = tile_col * self.tile_size
+		if self.memmap is not None:
+			return self.memmap[row_off:row_off + self.tile_size, col_off:col_off + self.tile_size]
+
+		from rasterio.windows import Window
+		window = Window(col_off, row_off, min(self.tile_size, self.width - col_off), min(self.tile_size, self.height - row_off))
+		tile = self.dataset.read(1, window=window)
+
+		self.tiles[key] = tile
+		if len(self.tiles) > self.cache_size:
+			self.tiles.popitem(last=False) # evict the least recently used tile
+
+		return tile
+
+	# Returns the elevation (m) at each (row, col) pixel index. rows and cols can be scalars or arrays of equal length.
+	# Pixels are grouped by tile so each tile is read (or looked up in the cache) once per call.
+	def read_pixels(self, rows, cols):
+		rows = np.asarray(rows, dtype=np.int64)
+		cols = np.asarray(cols, dtype=np.int64)
+		(rows, cols) = np.broadcast_arrays(rows, cols)
+
+		if np.any((rows < 0) | (rows >= self.height) | (cols < 0) | (cols >= self.width)):
+			raise IndexError("pixel index outside of the MOLA DEM (" + str(self.height) + " x " + str(self.width) + ")")
+
+		if self.memmap is not None:
+			return np.asarray(self.memmap[rows, cols])
+		if rows.size == 0:
+			return np.empty(rows.shape, dtype=self.dtype)
+
+		flat_rows = rows.ravel()
+		flat_cols = cols.ravel()
+		altitudes = np.empty(flat_rows.shape, dtype=self.dtype)
+
+		tile_ids = (flat_rows // self.tile_size) * self.n_tile_cols + (flat_cols // self.tile_size)
+		order = np.argsort(tile_ids, kind='stable')
+		sorted_ids = tile_ids[order]
+		group_starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+		group_ends = np.r_[group_starts[1:], len(sorted_ids)]
+
+		for start, end in zip(group_starts, group_ends):
+			members = order[start:end]
+			tile_row, tile_col = divmod(int(sorted_ids[start]), self.n_tile_cols)
+			tile = self.read_tile(tile_row, tile_col)
+			altitudes[members] = tile[flat_rows[members] - tile_row * self.tile_size, flat_cols[members] - tile_col * self.tile_size]
+
+		return altitudes.reshape(rows.shape)
+
+	# Returns the block of the DEM between rows [row_start, row_stop) and columns [col_start, col_stop), assembled from cached tiles.
+	def read_window(self, row_start, row_stop, col_start, col_stop):
+		if self.memmap is not None:
+			return np.array(self.memmap[row_start:row_stop, col_start:col_stop])
+
+		block = np.empty((row_stop - row_start, col_stop - col_start), dtype=self.dtype)
+
+		for tile_row in range(row_start // self.tile_size, (row_stop - 1) // self.tile_size + 1):
+			for tile_col in range(col_start // self.tile_size, (col_stop - 1) // self.tile_size + 1):
+				tile = self.read_tile(tile_row, tile_col)
+				tile_top = tile_row * self.tile_size
+				tile_left = tile_col * self.tile_size
+
+				top = max(row_start, tile_top)
+				bottom = min(row_stop, tile_top + tile.shape[0])
+				left = max(col_start, tile_left)
+				right = min(col_stop, tile_left + tile.shape[1])
+
+				block[top - row_start:bottom - row_start, left - col_start:right - col_start] = tile[top - tile_top:bottom - tile_top, left - tile_left:right - tile_left]
+
+		return block
+
+	# Returns the elevation (m) of the DEM at each (lon, lat) coordinate pair in one vectorized pass.
+	#	lons:		array of planetocentric longitudes (-180 to 180, or 0 to 360).
+	#	lats:		array of planetocentric latitudes.
+	#	method:		"nearest" to return the pixel containing each point, or "bilinear" to interpolate between the 4 pixel centers around it.
+	def sample(self, lons, lats, method="nearest"):
+		return sample_grid(self.read_pixels, self.height, self.width, MOLA_SCALE, lons, lats, method)
+
+	def close(self):
+		self.tiles.clear()
+		if self.dataset is not None:
+			self.dataset.close()
+
+# Returns the elevation (m) at each (lon, lat) coordinate pair of a global grid (the DEM, or a level of its pyramid).
+#	read_pixels:	function returning the grid values at arrays of (rows, cols) pixel indices.
+#	height, width:	size of the grid in pixels.
+#	scale:			pixels per degree of the grid.
+#	lons, lats, method:	see MolaDEM.sample.
+def sample_grid(read_pixels, height, width, scale, lons, lats, method="nearest"):
+	lons = np.asarray(lons, dtype=np.float64)
+	lats = np.asarray(lats, dtype=np.float64)
+	lons = np.where(lons > 180, lons - 360, lons)
+
+	if method == "nearest":
+		if scale == MOLA_SCALE:
+			(scaled_x, scaled_y) = scale_pixel_index_for_mola(*convert_map_coordinates_to_pixel_index(lons, lats))
+		else:
+			(p_x, p_y) = convert_map_coordinates_to_pixel_index(lons, lats)
+			(scaled_x, scaled_y) = (np.trunc(p_x * scale).astype(np.int64), np.trunc(p_y * scale).astype(np.int64))
+		return read_pixels(np.clip(scaled_y, 0, height - 1), np.mod(scaled_x, width))
+
+	if method != "bilinear":
+		raise ValueError("unknown sampling method '" + str(method) + "' (expected 'nearest' or 'bilinear')")
+
+	# fractional pixel position relative to pixel centers.
+	p_x = (lons + 180) * scale - 0.5
+	p_y = (90 - lats) * scale - 0.5
+	x0 = np.floor(p_x)
+	y0 = np.floor(p_y)
+	w_x = p_x - x0
+	w_y = p_y - y0
+
+	# the 4 surrounding pixels: x wraps around Mars, y stops at the poles.
+	x0 = x0.astype(np.int64)
+	y0 = y0.astype(np.int64)
+	cols = np.mod(np.stack((x0, x0 + 1, x0, x0 + 1)), width)
+	rows = np.clip(np.stack((y0, y0, y0 + 1, y0 + 1)), 0, height - 1)
+	(top_left, top_right, bottom_left, bottom_right) = read_pixels(rows, cols).astype(np.float64)
+
+	top = top_left + (top_right - top_left) * w_x
+	bottom = bottom_left + (bottom_right - bottom_left) * w_x
+
+	return top + (bottom - top) * w_y
+
+_open_dems = {}
+
+# Returns the MolaDEM for path, opening it the first time it is requested in this process.
+# Handles are keyed by process id so that forked worker processes open their own file handle.
+def get_dem(path=MOLA_DEM_PATH):
+	key = (os.getpid(), os.path.abspath(path))
+
+	dem = _open_dems.get(key)
+	if dem is None:
+		dem = MolaDEM(path)
+		_open_dems[key] = dem
+
+	return dem
+
+# Returns the path of the directory holding the DEM's overview pyramid (see build_pyramid).
+def get_pyramid_dir(path=MOLA_DEM_PATH):
+	return os.path.splitext(path)[0] + '_pyramid'
+
+# Returns the path of one statistic ("mean", "min" or "max") of one level of the DEM's pyramid.
+def get_pyramid_file_name(factor, stat="mean", path=MOLA_DEM_PATH):
+	return get_pyramid_dir(path) + '/' + str(factor) + 'x_' + stat + '.npy'
+
+# Builds the DEM's overview pyramid, unless it already exists: for every factor, the mean, minimum and maximum elevation of each
+# factor x factor block of DEM pixels, saved as .npy files that are memory-mapped when sampled. The DEM is read once, one block of
+# rows at a time, and each level is reduced from the one before it. Returns the path of the pyramid's directory.
+#	path:		path to the MOLA DEM GeoTIFF.
+#	factors:	decimation factor of each level. Each must be a multiple of the one before it, and divide the DEM's size.
+def build_pyramid(path=MOLA_DEM_PATH, factors=PYRAMID_FACTORS):
+	factors = sorted(factors)
+	pyramid_dir = get_pyramid_dir(path)
+	if all(os.path.exists(get_pyramid_file_name(factor, stat, path)) for factor in factors for stat in PYRAMID_STATS):
+		return pyramid_dir
+
+	dem = MolaDEM(path)
+	for (previous, factor) in zip([1] + factors[:-1], factors):
+		if factor % previous != 0 or dem.height % factor != 0 or dem.width % factor != 0:
+			raise ValueError("pyramid factor " + str(factor) + " must be a multiple of " + str(previous) + " and divide the DEM size (" + str(dem.height) + " x " + str(dem.width) + ")")
+
+	os.makedirs(pyramid_dir, exist_ok=True)
+	levels = {(factor, stat): np.lib.format.open_memmap(get_pyramid_file_name(factor, stat, path) + '.part', mode='w+', dtype=dem.dtype, shape=(dem.height // factor, dem.width // factor))
+			for factor in factors for stat in PYRAMID_STATS}
+
+	rows_per_block = -(-dem.tile_size // factors[-1]) * factors[-1] # a whole number of blocks of the coarsest level
+	for row_start in range(0, dem.height, rows_per_block):
+		row_stop = min(row_start + rows_per_block, dem.height)
+		block = dem.read_window(row_start, row_stop, 0, dem.width)
+		dem.tiles.clear() # every tile is read once
+
+		(mean, minimum, maximum) = (block.astype(np.float32), block, block)
+		previous = 1
+		for factor in factors:
+			k = factor // previous
+			shape = (mean.shape[0] // k, k, mean.shape[1] // k, k)
+			mean = mean.reshape(shape).mean(axis=(1, 3))
+			minimum = minimum.reshape(shape).min(axis=(1, 3))
+			maximum = maximum.reshape(shape).max(axis=(1, 3))
+
+			rows = slice(row_start // factor, row_stop // factor)
+			levels[(factor, 'mean')][rows] = np.rint(mean)
+			levels[(factor, 'min')][rows] = minimum
+			levels[(factor, 'max')][rows] = maximum
+			previous = factor
+
+	for level in levels.values():
+		level.flush()
+	levels.clear() # closes the memory maps
+	dem.close()
+
+	for factor in factors:
+		for stat in PYRAMID_STATS:
+			file_name = get_pyramid_file_name(factor, stat, path)
+			os.replace(file_name + '.part', file_name)
+
+	return pyramid_dir
+
+# Returns the factors of the pyramid levels that have been built for the DEM, in increasing order.
+def get_pyramid_factors(path=MOLA_DEM_PATH):
+	pyramid_dir = get_pyramid_dir(path)
+	if not os.path.isdir(pyramid_dir):
+		return []
+
+	factors = [int(name[:-len('x_mean.npy')]) for name in os.listdir(pyramid_dir) if name.endswith('x_mean.npy') and name[:-len('x_mean.npy')].isdigit()]
+	return sorted(factor for factor in factors if all(os.path.exists(get_pyramid_file_name(factor, stat, path)) for stat in PYRAMID_STATS))
+
+_open_levels = {}
+
+# Returns one statistic of one pyramid level as a read-only memory-mapped (height / factor x width / factor) array.
+def get_pyramid_level(factor, stat="mean", path=MOLA_DEM_PATH):
+	key = (os.getpid(), os.path.abspath(path), factor, stat)
+
+	level = _open_levels.get(key)
+	if level is None:
+		level = np.load(get_pyramid_file_name(factor, stat, path), mmap_mode='r')
+		_open_levels[key] = level
+
+	return level
+
+# Returns the coarsest pyramid factor whose pixels are no larger than resolution degrees, or 1 (the full-resolution DEM)
+# if no built level is fine enough.
+def choose_pyramid_factor(resolution, path=MOLA_DEM_PATH):
+	factors = [factor for factor in get_pyramid_factors(path) if factor / MOLA_SCALE <= resolution]
+	return max(factors, default=1)
+
+# Returns the resolution (degrees per sample) of a profile along (lons, lats) drawn with n_samples points, e.g. the plot's width in pixels.
+def get_profile_resolution(lons, lats, n_samples):
+	lons = np.unwrap(np.asarray(lons, dtype=np.float64), period=360)
+	lats = np.asarray(lats, dtype=np.float64)
+
+	return float(np.sum(np.hypot(np.diff(lons), np.diff(lats)))) / max(n_samples, 1)
+
+# Returns the MOLA elevation (m) at each (lon, lat) coordinate pair, reading only the DEM tiles the points fall in.
+# See MolaDEM.sample for lons, lats and method.
+#	resolution (optional):	degrees per sample that are needed (see get_profile_resolution). The coarsest pyramid level that is
+#							at least this fine is sampled instead of the full-resolution DEM, if the pyramid has been built.
+#	stat (optional):		"mean" (default), "min" or "max" elevation of the pyramid level's blocks.
+def sample_dem(lons, lats, method="nearest", path=MOLA_DEM_PATH, resolution=None, stat="mean"):
+	factor = 1 if resolution is None else choose_pyramid_factor(resolution, path)
+	if factor == 1:
+		return get_dem(path).sample(lons, lats, method)
+
+	level = get_pyramid_level(factor, stat, path)
+	return sample_grid(lambda rows, cols: np.asarray(level[rows, cols]), level.shape[0], level.shape[1], MOLA_SCALE / factor, lons, lats, method)
@@ -0,0 +1,280 @@
+# Kate McCarthy (kem6ur@virginia.edu)
+# Advanced Remote Sensing Spring 2023
+# Identifies surface pixels and reflector pixels drawn on a SHARAD radargram (read from the orbit's annotation file, see annotation_sidecar.py).
+# Then, calls plotting.create_plot to plot the reflectors assuming different dielectric constants on top of a MOLA elevation profile.
+
+# NOTES FOR USE:
+# Estimated surface of Mars must be traced on the radargram in yellow (B:0, G:255, R:255). 
+# Reflectors can be traced on the radargram in any of the following colors:
+# 	- red (B:0, G:0, R:255)
+#	- blue (B:255, G:0, R:0)
+# 	- green (B:0, G:255, R:0)
+#	- magenta (B:255, G:0, R:255)
+#	- cyan (B:255, G:255, R:0)
+#	- mediumslateblue (B:255, G:129, R:122)
+#	- steelblue (B:180, G:130, R:70)
+#	- moccasin (B:181, G:228, R:255)
+
+import argparse
+import os
+
+import numpy as np
+
+from . import annotation_sidecar, annotations, clutter, depth_conversion, geom_table, mola_dem, plotting, profile_cache, profiling, reflector_store, surface_picker
+from .geom_table import get_geom_file_name
+from .incremental import decode_annotations_incremental, get_clutter_tolerance_key, get_column_reduction_key, get_frames_to_update, load_state, save_state
+
+PREVIEW_WIDTH = 1200 # points across a rendered panel (12 inches at 100 dpi), used to pick the DEM pyramid level of a preview.
+
+# Returns the longitude and latitude of every radargram frame from an orbit's geometry table, as two arrays.
+def read_ground_track(orbit_str):
+	with profiling.stage('read_geom_table'):
+		table = geom_table.read_geom_table(get_geom_file_name(orbit_str))
+	return (np.array(table['lon']), np.array(table['lat']))
+
+# Returns the longitude, latitude and MOLA elevation of every radargram frame of an orbit, as three arrays.
+# The elevations are sampled from the DEM the first time and read from the profile cache after that.
+#	orbit_str:				SHARAD orbit number.
+#	method (optional):		"bilinear" (default) or "nearest" sampling of the MOLA DEM.
+#	use_cache (optional):	False to always sample the DEM (the cache is still updated).
+#	plot_width (optional):	number of points the plot can show. The DEM is then sampled on the coarsest level of its pyramid
+#							that still resolves that many points along the track (if the pyramid has been built).
+def get_track_profile(orbit_str, method="bilinear", use_cache=True, plot_width=None):
+	geom_file_name = get_geom_file_name(orbit_str)
+
+	# profiles sampled from a pyramid level are cached separately from full-resolution ones.
+	resolution = None
+	cache_method = method
+	if plot_width is not None:
+		(track_lons, track_lats) = read_ground_track(orbit_str)
+		resolution = mola_dem.get_profile_resolution(track_lons, track_lats, plot_width)
+		factor = mola_dem.choose_pyramid_factor(resolution)
+		if factor > 1:
+			cache_method = method + '_' + str(factor) + 'x'
+
+	if use_cache:
+		with profiling.stage('load_cached_profile'):
+			profile = profile_cache.load_profile(orbit_str, cache_method, geom_file_name)
+		if profile is not None:
+			return profile
+
+	(track_lons, track_lats) = read_ground_track(orbit_str)
+	with profiling.stage('sample_dem', frames=len(track_lons)):
+		altitude_profile = mola_dem.sample_dem(track_lons, track_lats, method, resolution=resolution)
+	with profiling.stage('save_cached_profile'):
+		profile_cache.save_profile(orbit_str, cache_method, geom_file_name, track_lons, track_lats, altitude_profile)
+
+	return (track_lons, track_lats, altitude_profile)
+
+# Returns one plot panel per dielectric constant (see plotting.ProfileRenderer.render): every traced reflector pixel's
+# x axis value, color, and elevation (the MOLA surface at its frame minus its depth).
+#	orbit_str:				SHARAD orbit number.
+#	dielectric_constants:	dielectric constant of each panel.
+#	plot_depths:			reflector depths (m), (dielectric constants x [layers x] reflector colors x frames), NaN where not traced.
+#	track_coords:			x axis value of each frame.
+#	altitude_profile:		MOLA elevation (m) of each frame.
+#	frame_range (optional):	(first, last) frame numbers plotted, to note in the titles, or None for the whole orbit.
+def get_reflector_panels(orbit_str, dielectric_constants, plot_depths, track_coords, altitude_profile, frame_range=None):
+	color_names = np.array(annotations.REFLECTOR_COLOR_NAMES)
+
+	panels = []
+	for dielectric_constant, depths in zip(dielectric_constants, plot_depths):
+		traced = np.nonzero(~np.isnan(depths)) # (color_indices, frame_indices), or (layers, color_indices, frame_indices)
+		(color_indices, frame_indices) = traced[-2:]
+		reflector_altitudes = altitude_profile[frame_indices] - depths[traced]
+
+		plot_title = "SHARAD orbit " + str(int(orbit_str)) + ("" if frame_range is None else " frames " + str(frame_range[0]) + "-" + str(frame_range[1])) + " reflector geometry on MOLA elevation profile (\u03B5r = " + format(dielectric_constant, 'g') + ")"
+		panels.append((plot_title, track_coords[frame_indices], reflector_altitudes, color_names[color_indices]))
+
+	return panels
+
+# Returns the suffix of the output file names of a window of frames ("_<first>-<last>"), or "" for the whole orbit.
+def get_window_suffix(frame_range):
+	if frame_range is None:
+		return ""
+	return "_" + str(frame_range[0]) + "-" + str(frame_range[1])
+
+# Returns the path a plot is saved to in output_dir (creating the directory): s_<orbit>.<format>, or s_<orbit>_<first>-<last>.<format> for a window of frames.
+def get_output_file_name(orbit_str, output_dir, output_format="png", frame_range=None):
+	os.makedirs(output_dir, exist_ok=True)
+	return os.path.join(output_dir, "s_" + str(orbit_str).zfill(8) + get_window_suffix(frame_range) + "." + output_format)
+
+# Plots the reflectors traced on the annotated radargram of a SHARAD orbit on top of a MOLA elevation profile,
+# with one panel per dielectric constant.
+#	orbit_str:						SHARAD orbit number.
+#	dielectric_constants:			dielectric constants of the subsurface to plot reflector geometry for (one panel each).
+#	sweep (optional):				(start, stop, step) of dielectric constants to save reflector depths for in ./downloads/SHARAD/depths/.
+#	output_dir (optional):			directory to save the plot to (rendered without a display), instead of showing it.
+#	output_format (optional):		"png" (default), "svg" or "pdf".
+#	other options:					see get_orbit_plot.
+# Returns the path of the saved plot, or None if it was shown.
+def process_orbit(orbit_str, dielectric_constants=(1.0, 3.1), sweep=None, output_dir=None, output_format="png", use_cache=True, incremental=False, surface_method=None, clutter_tolerance=None, preview=False, frame_range=None, store_results=True, screen_clutter=False, trace_depth="bottom", layers=None):
+	plot = get_orbit_plot(orbit_str, dielectric_constants, sweep, use_cache, incremental, surface_method, clutter_tolerance, preview, frame_range, store_results, screen_clutter, trace_depth, layers)
+
+	if output_dir is None:
+		plotting.show_reflector_profiles(*plot)
+		return None
+
+	output_file = get_output_file_name(orbit_str, output_dir, output_format, frame_range)
+	with profiling.stage('render'):
+		plotting.get_renderer().render(output_file, *plot)
+
+	return output_file
+
+# Decodes the traces of a SHARAD orbit, converts the reflector depths and samples the MOLA elevation profile: everything
+# process_orbit does before drawing the plot. Returns (track_coords, altitude_profile, x_axis_title, panels), the arguments
+# of plotting.show_reflector_profiles and of a ProfileRenderer's render after the output file.
+#	orbit_str:						SHARAD orbit number.
+#	dielectric_constants:			dielectric constants of the subsurface to plot reflector geometry for (one panel each).
+#	sweep (optional):				(start, stop, step) of dielectric constants to save reflector depths for in ./downloads/SHARAD/depths/.
+#	use_cache (optional):			False to sample the MOLA DEM even if the orbit's profile is cached.
+#	incremental (optional):			True to only decode and convert the radargram columns that changed since the last incremental run.
+#	surface_method (optional):		"threshold" or "gradient" to pick the surface automatically (see surface_picker.py) in columns where it is not traced by hand.
+#	clutter_tolerance (optional):	with surface_method, leave columns unpicked where the surface differs from the cluttergram's by more than this many pixels.
+#	preview (optional):				True to sample the MOLA elevations from the DEM pyramid level that matches the plot's width.
+#	frame_range (optional):			(first, last) frame numbers (inclusive) to plot only part of the ground track, e.g. a window found by track_index.py.
+#	store_results (optional):		False to not save the reflector points to the reflector store (see reflector_store.py).
+#	screen_clutter (optional):		True to score the traced reflectors against the cluttergram and save the scores (see clutter.py).
+#	trace_depth (optional):			depth of a trace more than one pixel thick in a column: "top", "bottom" (default), "median" or "centroid".
+#	layers (optional):				number of separate layers of each reflector colour to keep per column (e.g. two stacked reflectors
+#									traced in the same colour), each plotted as its own reflector. None to reduce them all to one depth.
+def get_orbit_plot(orbit_str, dielectric_constants=(1.0, 3.1), sweep=None, use_cache=True, incremental=False, surface_method=None, clutter_tolerance=None, preview=False, frame_range=None, store_results=True, screen_clutter=False, trace_depth="bottom", layers=None):
+	orbit_str = str(orbit_str).zfill(8)
+
+	# take in the traced pixels from the orbit's annotation sidecar (imported from the painted radargram if it has been edited since)
+	with profiling.stage('read_annotations'):
+		(pixels, shape) = annotation_sidecar.read_orbit_annotations(orbit_str)
+
+	# Identify surface and reflector pixel depths in every radargram column, for all colors in one pass.
+	# In incremental mode, columns whose pixels are unchanged since the last run are taken from the saved state instead.
+	state = None
+	with profiling.stage('decode_annotations', columns=shape[1]):
+		if incremental:
+			state = load_state(orbit_str)
+			(depths_by_color, changed_columns, column_hashes) = decode_annotations_incremental(pixels, shape, state, trace_depth, layers)
+		else:
+			depths_by_color = annotations.decode_pixels(*pixels, shape[1], trace_depth, layers)
+	if incremental:
+		print(len(changed_columns), "of", shape[1], "radargram columns changed since the last run")
+	decoded_depths_by_color = depths_by_color
+	surface_index = 0 if layers is None else (0, 0) # with layers, the surface is the top layer of the surface colour
+
+	# Pick the surface automatically where it is not traced by hand (the hand tracing takes precedence).
+	if surface_method is not None:
+		with profiling.stage('pick_surface', method=surface_method):
+			picked_surface = surface_picker.pick_orbit_surface(orbit_str, surface_method, clutter_tolerance)
+		depths_by_color = depths_by_color.copy()
+		depths_by_color[surface_index] = surface_picker.combine_surface(depths_by_color[surface_index], picked_surface)
+	color_names = annotations.REFLECTOR_COLOR_NAMES
+
+	is_traced = ~np.isnan(depths_by_color)
+	if layers is not None:
+		print(np.count_nonzero(is_traced[1:, 1:].any(axis=(0, 1))), "reflector columns with more than one layer")
+		is_traced = is_traced.any(axis=0)
+	for color_name, traced_columns in zip(annotations.COLOR_NAMES, is_traced):
+		print(color_name, "traced in", np.count_nonzero(traced_columns), "columns")
+
+	# Flag reflectors where the cluttergram predicts an echo (off-nadir surface clutter).
+	if screen_clutter:
+		with profiling.stage('screen_clutter'):
+			(clutter_pixels, clutter_scores, clutter_probabilities, clutter_lags) = clutter.screen_orbit(orbit_str)
+			clutter.save_clutter_scores(orbit_str, clutter_pixels, clutter_scores, clutter_probabilities, clutter_lags)
+		clutter.print_clutter_probabilities(orbit_str, clutter_pixels, clutter_probabilities, clutter_lags)
+
+	# ground track of the radargram and the MOLA elevation along it
+	plot_width = None
+	if preview:
+		plot_width = PREVIEW_WIDTH
+		if frame_range is not None: # the window must be resolved by the plot, not the whole track
+			n_frames = len(read_ground_track(orbit_str)[0])
+			plot_width = int(PREVIEW_WIDTH * n_frames / max(1, min(frame_range[1], n_frames) - max(frame_range[0], 1) + 1))
+	with profiling.stage('track_profile'):
+		(track_lons, track_lats, altitude_profile) = get_track_profile(orbit_str, use_cache=use_cache, plot_width=plot_width)
+	frames = np.arange(1, len(track_lons) + 1) # frame n of the geometry table is column n of the radargram
+
+	# zoom in on a window of the ground track
+	if frame_range is not None:
+		in_window = (frames >= frame_range[0]) & (frames <= frame_range[1])
+		if not in_window.any():
+			raise ValueError("orbit " + orbit_str + " has no frames " + str(frame_range[0]) + "-" + str(frame_range[1]))
+		(track_lons, track_lats, altitude_profile, frames) = (track_lons[in_window], track_lats[in_window], altitude_profile[in_window], frames[in_window])
+
+	# pixel depth of the surface and of each reflector color at every frame
+	with profiling.stage('frame_depths'):
+		frame_depths = depth_conversion.get_frame_pixel_depths(depths_by_color, frames)
+	surface_pixels = frame_depths[surface_index]
+	reflector_pixels = frame_depths[..., 1:, :] # ([layers x] reflector colors x frames)
+
+	# Save the depth of every reflector for a sweep of dielectric constants: (dielectric constants x [layers x] colors x frames), in meters.
+	if sweep:
+		sweep_dielectric_constants = depth_conversion.get_dielectric_sweep(*sweep)
+		with profiling.stage('depth_sweep', dielectric_constants=len(sweep_dielectric_constants)):
+			depth_cube = depth_conversion.convert_pixel_depths(reflector_pixels, surface_pixels, sweep_dielectric_constants)
+
+		os.makedirs('./downloads/SHARAD/depths', exist_ok=True)
+		sweep_file_name = './downloads/SHARAD/depths/s_' + orbit_str + get_window_suffix(frame_range) + '_depths.npz'
+		np.savez_compressed(sweep_file_name, dielectric_constants=sweep_dielectric_constants, color_names=color_names, frames=frames, lons=track_lons, lats=track_lats, depths=depth_cube)
+		print("saved reflector depths for", len(sweep_dielectric_constants), "dielectric constants to", sweep_file_name)
+
+	(track_coords, x_axis_title) = plotting.get_profile_axis(track_lons, track_lats)
+
+	# Plot reflector geometry for each requested dielectric constant, one panel each.
+	# In incremental mode, only the depths of frames in changed columns are converted again.
+	frames_to_update = np.arange(len(frames))
+	if incremental:
+		frames_to_update = get_frames_to_update(frames, changed_columns, state, dielectric_constants, surface_method, get_column_reduction_key(trace_depth, layers), clutter_tolerance)
+
+	with profiling.stage('depth_conversion', frames=len(frames_to_update)):
+		if len(frames_to_update) == len(frames):
+			plot_depths = depth_conversion.convert_pixel_depths(reflector_pixels, surface_pixels, dielectric_constants)
+		else:
+			plot_depths = state['plot_depths'].copy()
+			plot_depths[..., frames_to_update] = depth_conversion.convert_pixel_depths(reflector_pixels[..., frames_to_update], surface_pixels[frames_to_update], dielectric_constants)
+
+	if incremental:
+		save_state(orbit_str, {'column_hashes': column_hashes, 'depths_by_color': decoded_depths_by_color, 'dielectric_constants': np.asarray(dielectric_constants, dtype=float),
+								'surface_method': str(surface_method or ''), 'clutter_tolerance': get_clutter_tolerance_key(surface_method, clutter_tolerance),
+								'column_reduction': get_column_reduction_key(trace_depth, layers), 'frames': frames, 'plot_depths': plot_depths})
+
+	# Save every reflector point for queries across orbits (replacing the points saved for these frames by an earlier run).
+	if store_results:
+		with profiling.stage('store_reflectors'):
+			points = reflector_store.get_reflector_points(orbit_str, frames, track_lons, track_lats, altitude_profile, dielectric_constants, plot_depths)
+			reflector_store.save_points(orbit_str, points, frames if frame_range is not None else None)
+
+	with profiling.stage('reflector_panels'):
+		panels = get_reflector_panels(orbit_str, dielectric_constants, plot_depths, track_coords, altitude_profile, frame_range)
+
+	return (track_coords, altitude_profile, x_axis_title, panels)
+
+# Command line interface (see plot_refl_geom_from_annotated_rdg.py).
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+						prog='plot_refl_geom_from_annotated_rdg',
+						description='Plots the reflectors traced on an annotated SHARAD radargram on top of a MOLA elevation profile.')
+	parser.add_argument('-o', '--orbit', required=True)
+	parser.add_argument('-e', '--dielectric', type=float, nargs='+', default=[1.0, 3.1], help='dielectric constant(s) of the subsurface to plot reflector geometry for (default: 1 and 3.1)')
+	parser.add_argument('--sweep', type=float, nargs=3, metavar=('START', 'STOP', 'STEP'), help='also save reflector depths for every dielectric constant from START to STOP (inclusive) to ./downloads/SHARAD/depths/')
+	parser.add_argument('--output-dir', help='save the plot to this directory (without opening a window)')
+	parser.add_argument('--format', default='png', choices=['png', 'svg', 'pdf'], help='file format of saved plots (default: png)')
+	parser.add_argument('--no-cache', action='store_true', help='sample the MOLA DEM even if the orbit\'s elevation profile is cached')
+	parser.add_argument('--incremental', action='store_true', help='only re-process the radargram columns whose annotations changed since the last --incremental run')
+	parser.add_argument('--auto-surface', nargs='?', const='threshold', choices=['threshold', 'gradient'], help='pick the surface automatically where it is not traced in yellow: first strong return (threshold, default) or largest increase in echo (gradient)')
+	parser.add_argument('--clutter-tolerance', type=float, metavar='PIXELS', help='with --auto-surface, drop picks that differ from the cluttergram\'s surface by more than PIXELS')
+	parser.add_argument('--preview', action='store_true', help='sample MOLA elevations from a coarser level of the DEM pyramid, matched to the plot\'s width (see download_data.py --build-pyramid)')
+	parser.add_argument('--frames', type=int, nargs=2, metavar=('FIRST', 'LAST'), help='only plot frames FIRST to LAST (inclusive) of the ground track (see find_orbits.py)')
+	parser.add_argument('--no-store', action='store_true', help='do not save the reflector points to ./downloads/SHARAD/reflectors/ (see query_reflectors.py)')
+	parser.add_argument('--screen-clutter', action='store_true', help='score each traced reflector by how strongly the cluttergram predicts an echo there (see screen_clutter.py)')
+	parser.add_argument('--trace-depth', default='bottom', choices=annotations.COLUMN_REDUCTIONS, help='depth of a trace more than one pixel thick in a radargram column (default: bottom)')
+	parser.add_argument('--layers', type=int, help='keep up to this many separate layers of each reflector colour per column, instead of reducing them to one depth')
+	profiling.add_arguments(parser)
+	args = parser.parse_args(argv)
+
+	if args.profile:
+		profiling.enable(args.trace_memory)
+
+	with profiling.stage('orbit', orbit=args.orbit):
+		process_orbit(args.orbit, args.dielectric, args.sweep, args.output_dir, args.format, not args.no_cache, args.incremental, args.auto_surface, args.clutter_tolerance, args.preview, args.frames, not args.no_store, args.screen_clutter, args.trace_depth, args.layers)
+
+	if args.profile:
+		profiling.report(args.profile)
@@ -0,0 +1,269 @@
+# Kate McCarthy (kem6ur@virginia.edu)
+# Advanced Remote Sensing Spring 2023
+# Given the location and depth of reflector points, generates a plot of reflector geometry overlaid on a MOLA elevation profile.
+# Also plots the MOLA elevation profile of a straight line between two points.
+
+# References:
+#  MOLA DEM - https://astrogeology.usgs.gov/search/map/Mars/GlobalSurveyor/MOLA/Mars_MGS_MOLA_DEM_mosaic_global_463m
+#  NumPy documentation - https://numpy.org/doc/stable/index.html
+#  Rasterio example with MOLA - https://towardsdatascience.com/terraforming-mars-with-python-4c21ed75117f
+#  Martian Coordinate Systems - https://ode.rsl.wustl.edu/mars/pagehelp/Content/Frequently_Asked_Questions/Coordinate_System.htm
+
+import os
+
+import numpy as np
+
+from . import mola_dem, profiling
+from .coordinates import MOLA_HEIGHT, MOLA_SCALE, MOLA_WIDTH, convert_map_coordinates_to_pixel_index, scale_pixel_index_for_mola, get_lon_from_scaled_pixel_index, get_lat_from_scaled_pixel_index, get_line_from_point_pair
+
+# matplotlib is imported by the plotting functions, so that importing this module stays fast.
+
+# Plots the topographic profile of a straight line on Mars between two points using MOLA topography data.
+#	point1:					A planetocentric coordinate pair [x, y] representing one endpoint of a line on a map of Mars.
+#	point2:					A planetocentric coordinate pair [x, y] representing the other endpoint of a line on a map of Mars.
+#	output_file (optional):	File to save the plot to. If not given, the plot is shown in a window.
+#	plot_width (optional):	number of points the profile needs (e.g. the plot's width in pixels). If the line crosses more DEM pixels
+#							than that and the DEM pyramid has been built (see mola_dem.build_pyramid), the line is sampled on a coarser
+#							level, and the range of elevations within each of its pixels is shaded.
+def plot_line_profile(point1, point2, output_file=None, plot_width=None):
+	import matplotlib.pyplot as plt
+
+	# Convert the point coordinates to pixel indices.
+	(converted_x1, converted_y1) = convert_map_coordinates_to_pixel_index(point1[0],point1[1])
+	(converted_x2, converted_y2) = convert_map_coordinates_to_pixel_index(point2[0],point2[1])
+
+	# Scale pixel indices for MOLA DEM.
+	(scaled_x1, scaled_y1) = scale_pixel_index_for_mola(converted_x1, converted_y1)
+	(scaled_x2, scaled_y2) = scale_pixel_index_for_mola(converted_x2, converted_y2)
+
+	scaled_point1 = [scaled_x1, scaled_y1]
+	scaled_point2 = [scaled_x2, scaled_y2]
+
+	# Pick the coarsest pyramid level that still gives plot_width points along the line, and rasterize the line on that level.
+	factor = 1
+	if plot_width is not None:
+		(line_xs, line_ys) = get_line_from_point_pair(scaled_point1, scaled_point2)
+		factor = mola_dem.choose_pyramid_factor(len(line_xs) / plot_width / MOLA_SCALE)
+
+	# Get the pixels along the line between the two points.
+	(line_xs, line_ys) = get_line_from_point_pair([scaled_x1 // factor, scaled_y1 // factor], [scaled_x2 // factor, scaled_y2 // factor], MOLA_WIDTH // factor, MOLA_HEIGHT // factor)
+
+	# determine if x axis should show lat or lon.
+	lat_or_lon = "lon"
+	# handle if difference in y coordinates is greater than difference in x coordinates.
+	if abs(scaled_point1[1] - scaled_point2[1]) > abs(scaled_point1[0] - scaled_point2[0]):
+		lat_or_lon = "lat"
+
+	# Get the altitude at every pixel in the line. Indices must be in (y, x) order because arrays are stored in row-major order.
+	# Only the DEM tiles (or pyramid level pixels) along the line are read.
+	if factor == 1:
+		altitude_profile = mola_dem.get_dem().read_pixels(line_ys, line_xs) # altitude values at each point in the line.
+	else:
+		altitude_profile = mola_dem.get_pyramid_level(factor, "mean")[line_ys, line_xs]
+		altitude_min = mola_dem.get_pyramid_level(factor, "min")[line_ys, line_xs]
+		altitude_max = mola_dem.get_pyramid_level(factor, "max")[line_ys, line_xs]
+		(line_xs, line_ys) = (line_xs * factor, line_ys * factor) # back to full-resolution pixel indices for the coordinates below
+
+	# corresponding lat or lon coordinates at each point in the line, and the title for the plot's x axis.
+	if lat_or_lon == "lon":
+		# unwrap so that a line crossing the antimeridian is plotted as one continuous profile.
+		lat_or_lon_coords = np.unwrap(get_lon_from_scaled_pixel_index(line_xs), period=360)
+		x_axis_title = "Longitude"
+	else:
+		lat_or_lon_coords = get_lat_from_scaled_pixel_index(line_ys)
+		x_axis_title = "Latitude"
+
+	if factor > 1:
+		plt.fill_between(lat_or_lon_coords, altitude_min, altitude_max, color='lightgray', linewidth=0)
+	plt.plot(lat_or_lon_coords, altitude_profile)
+
+	plt.xlabel(x_axis_title)
+	plt.ylabel('Elevation (m)') 
+
+	plt.title("MOLA Elevation Profile")
+
+	if output_file is None:
+		plt.show()
+	else:
+		plt.savefig(output_file)
+		plt.close()
+
+# Returns the x axis values of a profile along a ground track, and the axis title.
+# Latitude is used if the track covers more latitude than longitude. Longitudes are unwrapped so that a track crossing the
+# antimeridian is plotted as one continuous profile.
+def get_profile_axis(track_lons, track_lats):
+	track_lons = np.unwrap(np.asarray(track_lons, dtype=np.float64), period=360)
+	track_lats = np.asarray(track_lats, dtype=np.float64)
+
+	if np.ptp(track_lats) > np.ptp(track_lons):
+		return (track_lats, "Latitude")
+
+	return (track_lons, "Longitude")
+
+# Draws a MOLA elevation profile with reflectors on a matplotlib Axes. All reflectors of one color are drawn with a single call.
+# Returns a dict of the Line2D artists drawn (None for the profile, and one per reflector color). If the dict from a previous call
+# on the same Axes is passed back in as lines, those artists are updated in place instead of drawing new ones.
+#	ax:						matplotlib Axes to draw on.
+#	track_coords:			x axis value of each point of the profile.
+#	altitude_profile:		MOLA elevation (m) of each point of the profile.
+#	x_axis_title:			"Latitude" or "Longitude".
+#	plot_title:				The title to display above the plot.
+#	reflector_coords:		x axis value of each reflector point.
+#	reflector_altitudes:	elevation (m) of each reflector point.
+#	reflector_colors:		color name of each reflector point.
+#	lines (optional):		artists returned by a previous call on ax.
+def draw_reflector_profile(ax, track_coords, altitude_profile, x_axis_title, plot_title, reflector_coords, reflector_altitudes, reflector_colors, lines=None):
+	if lines is None:
+		lines = {}
+
+	reflector_colors = np.asarray(reflector_colors)
+	colors = list(dict.fromkeys(reflector_colors.tolist())) # each color once, in the order they first appear
+
+	if None in lines:
+		lines[None].set_data(track_coords, altitude_profile)
+	else:
+		(lines[None],) = ax.plot(track_coords, altitude_profile, color='black')
+
+	for color in lines:
+		if color is not None and color not in colors:
+			lines[color].set_data([], [])
+
+	for color in colors:
+		is_color = reflector_colors == color
+		if color in lines:
+			lines[color].set_data(reflector_coords[is_color], reflector_altitudes[is_color])
+		else:
+			(lines[color],) = ax.plot(reflector_coords[is_color], reflector_altitudes[is_color], marker='.', color=color, ls='none', ms=10)
+
+	ax.relim()
+	ax.autoscale_view()
+
+	ax.set_xlabel(x_axis_title, fontdict={'fontsize': 12})
+	ax.set_ylabel('Elevation (m)', fontdict={'fontsize': 12})
+
+	ax.set_title(plot_title, fontdict={'fontsize': 18})
+
+	return lines
+
+# Renders reflector profiles to image files without a display (PNG, SVG or PDF, chosen by the output file's extension).
+# The figure is drawn directly on an Agg canvas, never through pyplot, and is reused from one render to the next.
+#	panel_width:	width of the figure in inches.
+#	panel_height:	height of each panel in inches.
+#	dpi:			resolution of raster output.
+class ProfileRenderer:
+
+	def __init__(self, panel_width=12, panel_height=5, dpi=100):
+		from matplotlib.figure import Figure
+		from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+		self.panel_width = panel_width
+		self.panel_height = panel_height
+
+		self.figure = Figure(dpi=dpi)
+		FigureCanvasAgg(self.figure)
+		self.axes = []
+		self.lines = [] # artists drawn on each of self.axes
+
+	# Returns n_panels Axes stacked vertically. The previous render's Axes (and their artists) are kept if there are as many panels.
+	def get_axes(self, n_panels):
+		if len(self.axes) != n_panels:
+			with profiling.stage('create_axes', panels=n_panels):
+				self.figure.clear()
+				self.figure.set_size_inches(self.panel_width, self.panel_height * n_panels)
+				self.axes = list(self.figure.subplots(n_panels, 1, sharex=True, squeeze=False)[:, 0])
+				self.lines = [None] * n_panels
+
+		return self.axes
+
+	# Renders one panel per element of panels (on a shared x axis) and saves the figure to output_file.
+	#	output_file:		file to save to. The format is taken from the extension (.png, .svg, .pdf).
+	#	track_coords:		x axis value of each point of the profile.
+	#	altitude_profile:	MOLA elevation (m) of each point of the profile.
+	#	x_axis_title:		"Latitude" or "Longitude".
+	#	panels:				list of (plot_title, reflector_coords, reflector_altitudes, reflector_colors), see draw_reflector_profile.
+	def render(self, output_file, track_coords, altitude_profile, x_axis_title, panels):
+		axes = self.get_axes(len(panels))
+
+		with profiling.stage('draw'):
+			for i, (ax, panel) in enumerate(zip(axes, panels)):
+				self.lines[i] = draw_reflector_profile(ax, track_coords, altitude_profile, x_axis_title, *panel, lines=self.lines[i])
+
+		with profiling.stage('savefig', file=output_file):
+			if os.path.splitext(output_file)[1].lower() == '.png':
+				self.figure.savefig(output_file, pil_kwargs={'compress_level': 1}) # fast zlib setting: PNG encoding dominates otherwise
+			else:
+				self.figure.savefig(output_file)
+
+_renderer = None
+
+# Returns this process's ProfileRenderer, creating it the first time it is needed, so a batch reuses one figure.
+def get_renderer():
+	global _renderer
+
+	if _renderer is None:
+		_renderer = ProfileRenderer()
+
+	return _renderer
+
+# Shows reflector profiles in a window (one panel per element of panels, see ProfileRenderer.render).
+def show_reflector_profiles(track_coords, altitude_profile, x_axis_title, panels):
+	import matplotlib.pyplot as plt
+
+	(figure, axes) = plt.subplots(len(panels), 1, sharex=True, squeeze=False, figsize=(12, 5 * len(panels)))
+
+	for ax, panel in zip(axes[:, 0], panels):
+		draw_reflector_profile(ax, track_coords, altitude_profile, x_axis_title, *panel)
+
+	plt.show()
+
+# Generates a plot of reflector geometry overlaid on a MOLA elevation profile sampled along a ground track.
+#	track_lons:			Array of planetocentric longitudes along the ground track (e.g. one per frame of a SHARAD geometry table).
+#	track_lats:			Array of planetocentric latitudes along the ground track.
+#	reflector_points:	A list of elements to plot, with each element in the format: [lon, lat, depth_from_surface, color]
+#	plot_title:			The title to display above the plot.
+#	method (optional):	"bilinear" (default) or "nearest" sampling of the MOLA DEM.
+#	output_file (optional):	File to save the plot to (rendered without a display). If not given, the plot is shown in a window.
+#	plot_width (optional):	number of points the profile needs (e.g. the plot's width in pixels). A long track is then sampled on the
+#							coarsest level of the DEM pyramid that still resolves that many points (see mola_dem.sample_dem).
+def create_plot(track_lons, track_lats, reflector_points, plot_title, method="bilinear", output_file=None, plot_width=None):
+
+	# Get the altitude at every point of the ground track in one pass (only the DEM tiles under the track are read).
+	resolution = None if plot_width is None else mola_dem.get_profile_resolution(track_lons, track_lats, plot_width)
+	altitude_profile = mola_dem.sample_dem(track_lons, track_lats, method, resolution=resolution)
+	(track_coords, x_axis_title) = get_profile_axis(track_lons, track_lats)
+
+	# an orbit without reflectors is plotted with the surface only.
+	(reflector_coords, reflector_altitudes, reflector_colors) = (np.empty(0), np.empty(0), np.empty(0, dtype=str))
+	if len(reflector_points) > 0:
+		reflector_lons = np.array([point[0] for point in reflector_points], dtype=np.float64)
+		reflector_lats = np.array([point[1] for point in reflector_points], dtype=np.float64)
+		reflector_depths = np.array([point[2] for point in reflector_points], dtype=np.float64)
+		reflector_colors = np.array([point[3] for point in reflector_points], dtype=str)
+
+		# elevation of every reflector: the MOLA surface under it minus its depth.
+		reflector_altitudes = mola_dem.sample_dem(reflector_lons, reflector_lats, method, resolution=resolution) - reflector_depths
+		if x_axis_title == "Latitude":
+			reflector_coords = reflector_lats
+		else:
+			reflector_coords = np.unwrap(np.r_[track_coords[:1], reflector_lons], period=360)[1:]
+
+	panels = [(plot_title, reflector_coords, reflector_altitudes, reflector_colors)]
+
+	if output_file is None:
+		show_reflector_profiles(track_coords, altitude_profile, x_axis_title, panels)
+	else:
+		get_renderer().render(output_file, track_coords, altitude_profile, x_axis_title, panels)
+
+# Plots reflector points on top of the MOLA elevation profile of a straight line on Mars between two points, as the original
+# plot_topo_profile_with_reflector.create_plot did: the profile reads the DEM pixels the line crosses.
+#	point1:					A planetocentric coordinate pair [x, y] representing one endpoint of a line on a map of Mars.
+#	point2:					A planetocentric coordinate pair [x, y] representing the other endpoint of a line on a map of Mars.
+#	reflector_points, plot_title, output_file (optional), plot_width (optional):	see create_plot.
+def create_line_plot(point1, point2, reflector_points, plot_title, output_file=None, plot_width=None):
+	scaled_point1 = scale_pixel_index_for_mola(*convert_map_coordinates_to_pixel_index(point1[0], point1[1]))
+	scaled_point2 = scale_pixel_index_for_mola(*convert_map_coordinates_to_pixel_index(point2[0], point2[1]))
+	(line_xs, line_ys) = get_line_from_point_pair(scaled_point1, scaled_point2)
+
+	# the pixels' corners map back onto the same pixels when sampled with "nearest".
+	create_plot(get_lon_from_scaled_pixel_index(line_xs), get_lat_from_scaled_pixel_index(line_ys), reflector_points, plot_title,
+				method="nearest", output_file=output_file, plot_width=plot_width)
@@ -0,0 +1,104 @@
+# Advanced Remote Sensing Spring 2023
+# On-disk cache of the MOLA elevation profile sampled along each orbit's ground track, so that re-plotting an orbit
+# (e.g. after editing its annotations or trying another dielectric constant) does not read the DEM again.
+# Profiles are saved as .npz files in ./downloads/cache/, keyed by orbit number, sampling method and a hash of the DEM file.
+# The least recently used profiles are deleted when the cache grows past MAX_CACHE_BYTES.
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from . import download, mola_dem
+
+CACHE_DIR = download.DOWNLOADS_DIR + '/cache'
+MAX_CACHE_BYTES = 512 * 1024 * 1024 # total size of cached profiles before the least recently used ones are deleted.
+
+DEM_VERSIONS_FILE_NAME = CACHE_DIR + '/dem_versions.json'
+
+# Returns the SHA-256 hash of the DEM file. The hash recorded in the download manifest is used when it matches the file's size;
+# otherwise the file is hashed once and the result is remembered until the file's size or modification time changes.
+def get_dem_version(dem_path=mola_dem.MOLA_DEM_PATH):
+	stat = os.stat(dem_path)
+
+	manifest_entry = download.Manifest().get(dem_path)
+	if manifest_entry is not None and manifest_entry.get('sha256') and manifest_entry.get('size') == stat.st_size:
+		return manifest_entry['sha256']
+
+	dem_versions = {}
+	if os.path.exists(DEM_VERSIONS_FILE_NAME):
+		with open(DEM_VERSIONS_FILE_NAME) as f:
+			dem_versions = json.load(f)
+
+	key = os.path.abspath(dem_path)
+	version = dem_versions.get(key)
+	if version is not None and version['size'] == stat.st_size and version['mtime_ns'] == stat.st_mtime_ns:
+		return version['sha256']
+
+	version = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': download.hash_file(dem_path)}
+	dem_versions[key] = version
+
+	os.makedirs(CACHE_DIR, exist_ok=True)
+	temp_file_name = DEM_VERSIONS_FILE_NAME + '.' + str(os.getpid()) + '.tmp'
+	with open(temp_file_name, 'w') as f:
+		json.dump(dem_versions, f, indent='\t')
+	os.replace(temp_file_name, DEM_VERSIONS_FILE_NAME)
+
+	return version['sha256']
+
+# Returns the path of the cached profile for an orbit, sampling method and DEM version.
+def get_cache_file_name(orbit_str, method, dem_version):
+	key = hashlib.sha256((str(orbit_str).zfill(8) + '/' + method + '/' + dem_version).encode()).hexdigest()[:16]
+	return CACHE_DIR + '/profile_s_' + str(orbit_str).zfill(8) + '_' + method + '_' + key + '.npz'
+
+# Returns the cached (lons, lats, altitudes) arrays of an orbit's profile, or None if the profile is not cached
+# or the orbit's geometry table has changed since it was cached.
+#	orbit_str:			SHARAD orbit number.
+#	method:				"nearest" or "bilinear" sampling of the MOLA DEM.
+#	geom_file_name:		path of the orbit's geometry table.
+#	dem_path:			path of the MOLA DEM.
+def load_profile(orbit_str, method, geom_file_name, dem_path=mola_dem.MOLA_DEM_PATH):
+	cache_file_name = get_cache_file_name(orbit_str, method, get_dem_version(dem_path))
+	if not os.path.exists(cache_file_name):
+		return None
+
+	geom_stat = os.stat(geom_file_name)
+	with np.load(cache_file_name) as profile:
+		if int(profile['geom_size']) != geom_stat.st_size or int(profile['geom_mtime_ns']) != geom_stat.st_mtime_ns:
+			return None
+		cached = (profile['lons'], profile['lats'], profile['altitudes'])
+
+	os.utime(cache_file_name) # mark as recently used
+	return cached
+
+# Saves an orbit's profile to the cache, then deletes the least recently used profiles if the cache is too large.
+# See load_profile for the arguments.
+def save_profile(orbit_str, method, geom_file_name, lons, lats, altitudes, dem_path=mola_dem.MOLA_DEM_PATH):
+	cache_file_name = get_cache_file_name(orbit_str, method, get_dem_version(dem_path))
+	geom_stat = os.stat(geom_file_name)
+
+	os.makedirs(CACHE_DIR, exist_ok=True)
+	temp_file_name = cache_file_name[:-len('.npz')] + '.' + str(os.getpid()) + '.tmp.npz'
+	np.savez(temp_file_name, lons=lons, lats=lats, altitudes=altitudes, geom_size=geom_stat.st_size, geom_mtime_ns=geom_stat.st_mtime_ns)
+	os.replace(temp_file_name, cache_file_name)
+
+	evict(MAX_CACHE_BYTES)
+
+# Deletes the least recently used cached profiles until the cache takes up at most max_bytes.
+def evict(max_bytes=MAX_CACHE_BYTES):
+	profiles = []
+	for entry in os.scandir(CACHE_DIR):
+		if entry.name.startswith('profile_') and entry.name.endswith('.npz') and not entry.name.endswith('.tmp.npz'):
+			stat = entry.stat()
+			profiles.append((stat.st_mtime, stat.st_size, entry.path))
+
+	total_bytes = sum(size for (mtime, size, path) in profiles)
+	for (mtime, size, path) in sorted(profiles):
+		if total_bytes <= max_bytes:
+			break
+		try:
+			os.remove(path)
+		except FileNotFoundError: # already removed by another process
+			pass
+		total_bytes -= size
@@ -0,0 +1,178 @@
+# Advanced Remote Sensing Spring 2023
+# Optional timing and memory instrumentation of the pipeline's stages, turned on with --profile on the command line.
+# Each stage (a `with stage(name):` block, or a function decorated with @profiled(name)) is recorded as an event with its
+# wall-clock duration, the process's peak resident memory when it ended, and, if memory tracing is on, the peak memory
+# allocated during it (tracemalloc). When profiling is off, stage() does nothing beyond one check.
+# Events are kept in the Chrome trace event format, so the trace file opens in a trace viewer (chrome://tracing, Perfetto).
+
+# References:
+#  Trace event format - https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+#  tracemalloc - https://docs.python.org/3/library/tracemalloc.html
+
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+	import resource # used to read the peak resident memory (not available on Windows)
+except ImportError:
+	resource = None
+
+_enabled = False
+_events = []
+_local = threading.local() # each thread's stack of running tracemalloc peaks of the stages it is inside
+
+# Turns profiling on. If trace_memory is True, allocations are traced with tracemalloc (which slows the pipeline down).
+def enable(trace_memory=False):
+	global _enabled
+
+	_enabled = True
+	if trace_memory and not tracemalloc.is_tracing():
+		tracemalloc.start()
+
+# Turns profiling (and memory tracing) off. Events recorded so far are kept.
+def disable():
+	global _enabled
+
+	_enabled = False
+	if tracemalloc.is_tracing():
+		tracemalloc.stop()
+
+def is_enabled():
+	return _enabled
+
+# Returns the events recorded so far, as a list of trace event dicts.
+def get_events():
+	return list(_events)
+
+# Adds events recorded by another process (e.g. a batch worker).
+def add_events(events):
+	_events.extend(events)
+
+# Deletes the events recorded so far.
+def clear():
+	_events.clear()
+
+# Returns the peak resident memory of this process so far, in bytes, or None if it cannot be read on this platform.
+def get_peak_rss():
+	if resource is None:
+		return None
+
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak if sys.platform == 'darwin' else peak * 1024 # kilobytes on Linux, bytes on macOS
+
+# Records the block inside it as one stage named name, if profiling is on. Keyword arguments are saved with the event
+# (e.g. stage('download', file=file_name)).
+# tracemalloc's peak is shared by the whole process, so with several threads working at once a stage's peak memory
+# includes the other threads' allocations.
+@contextlib.contextmanager
+def stage(name, **args):
+	if not _enabled:
+		yield
+		return
+
+	tracing = tracemalloc.is_tracing()
+	if tracing:
+		peaks = getattr(_local, 'peaks', None)
+		if peaks is None:
+			peaks = _local.peaks = []
+		if peaks:
+			peaks[-1] = max(peaks[-1], tracemalloc.get_traced_memory()[1]) # keep the enclosing stage's peak before resetting it
+		tracemalloc.reset_peak()
+		start_memory = tracemalloc.get_traced_memory()[0]
+		peaks.append(start_memory)
+
+	start_ts = time.time_ns() // 1000
+	start = time.perf_counter_ns()
+	try:
+		yield
+	finally:
+		duration = time.perf_counter_ns() - start
+
+		event_args = dict(args)
+		if tracing:
+			peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+			event_args['peak_memory_bytes'] = peak - start_memory
+			if peaks:
+				peaks[-1] = max(peaks[-1], peak)
+		event_args['peak_rss_bytes'] = get_peak_rss()
+
+		_events.append({
+			'name': name,
+			'ph': 'X', # complete event: start time and duration
+			'ts': start_ts, # microseconds
+			'dur': duration / 1000,
+			'pid': os.getpid(),
+			'tid': threading.get_ident(),
+			'args': event_args,
+		})
+
+# Decorator that records every call of a function as a stage named name (see stage).
+def profiled(name):
+	def decorator(function):
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			with stage(name):
+				return function(*args, **kwargs)
+		return wrapper
+	return decorator
+
+# Returns statistics of each stage over all of its events, in the order the stages first ended: a list of dicts with
+# the stage name, number of calls, total, mean and maximum duration (s), and the largest peak memory and peak RSS (bytes).
+def summarize(events):
+	stats = {}
+	for event in events:
+		stage_stats = stats.setdefault(event['name'], {'stage': event['name'], 'calls': 0, 'total_s': 0.0, 'max_s': 0.0, 'peak_memory_bytes': None, 'peak_rss_bytes': None})
+		duration = event['dur'] / 1e6
+
+		stage_stats['calls'] += 1
+		stage_stats['total_s'] += duration
+		stage_stats['max_s'] = max(stage_stats['max_s'], duration)
+		for key in ('peak_memory_bytes', 'peak_rss_bytes'):
+			value = event['args'].get(key)
+			if value is not None and (stage_stats[key] is None or value > stage_stats[key]):
+				stage_stats[key] = value
+
+	for stage_stats in stats.values():
+		stage_stats['mean_s'] = stage_stats['total_s'] / stage_stats['calls']
+
+	return list(stats.values())
+
+# Returns the summary (see summarize) as a text table.
+def format_summary(summary):
+	def megabytes(value):
+		return '-' if value is None else format(value / 2 ** 20, '.1f')
+
+	rows = [('stage', 'calls', 'total (s)', 'mean (s)', 'max (s)', 'peak mem (MB)', 'peak RSS (MB)')]
+	for stage_stats in sorted(summary, key=lambda stage_stats: -stage_stats['total_s']):
+		rows.append((stage_stats['stage'], str(stage_stats['calls']), format(stage_stats['total_s'], '.3f'), format(stage_stats['mean_s'], '.3f'),
+					format(stage_stats['max_s'], '.3f'), megabytes(stage_stats['peak_memory_bytes']), megabytes(stage_stats['peak_rss_bytes'])))
+
+	widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+	return '\n'.join(row[0].ljust(widths[0]) + '  ' + '  '.join(cell.rjust(width) for (cell, width) in zip(row[1:], widths[1:])) for row in rows)
+
+# Writes events (by default, every event recorded so far) to file_name as a trace event JSON file, with the summary of each stage.
+def write_trace(file_name, events=None):
+	if events is None:
+		events = get_events()
+
+	with open(file_name, 'w') as f:
+		json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'summary': summarize(events)}, f)
+
+# Adds the --profile and --trace-memory options to a command line parser.
+def add_arguments(parser):
+	parser.add_argument('--profile', nargs='?', const='profile.json', metavar='TRACE_FILE', help='time each stage, print a summary and save a trace event file (default: profile.json)')
+	parser.add_argument('--trace-memory', action='store_true', help='with --profile, also record the peak memory allocated in each stage (slower)')
+
+# Prints the summary of every event recorded so far and saves them to trace_file.
+def report(trace_file):
+	events = get_events()
+	print(format_summary(summarize(events)))
+
+	write_trace(trace_file, events)
+	print("saved profile trace to", trace_file)
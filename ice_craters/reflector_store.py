@@ -0,0 +1,191 @@
+# Advanced Remote Sensing Spring 2023
+# Columnar store of the reflector depths computed by the pipeline, so they can be compared across orbits without decoding
+# the radargrams again. Each orbit's reflector points are saved in ./downloads/SHARAD/reflectors/s_<orbit>_reflectors.npz as
+# one structured array (see POINT_DTYPE): one 29-byte row per traced reflector pixel column and dielectric constant, with
+# float32 coordinates and depths and the colour stored as an index into the saved colour names.
+# Re-processing an orbit replaces its points (only those of the re-processed frames, for a window of frames).
+
+# Example: list the red and cyan reflectors deeper than 50 m (at er = 3.1) in a bounding box, across every processed orbit.
+#	python3 query_reflectors.py --bbox -131 18 -129 20 --depth 50 1000 --color red cyan -e 3.1
+
+import argparse
+import glob
+import os
+
+import numpy as np
+
+try:
+	import fcntl # used to lock an orbit's store file while it is updated (not available on Windows)
+except ImportError:
+	fcntl = None
+
+from . import annotations
+from .download import DOWNLOADS_DIR
+
+REFLECTORS_DIR = DOWNLOADS_DIR + '/SHARAD/reflectors'
+
+# One reflector point: the depth of one reflector colour at one frame of an orbit, for one dielectric constant.
+POINT_DTYPE = np.dtype([
+	('orbit', np.int32),
+	('frame', np.int32), # radargram column number
+	('dielectric_constant', np.float32),
+	('color', np.uint8), # index into annotations.REFLECTOR_COLOR_NAMES
+	('lon', np.float32), # degrees, -180 to 180
+	('lat', np.float32), # degrees
+	('depth', np.float32), # depth below the surface (m)
+	('elevation', np.float32), # MOLA elevation of the surface minus the depth (m)
+])
+
+# Returns the path of an orbit's reflector points.
+def get_store_file_name(orbit_str, store_dir=REFLECTORS_DIR):
+	return store_dir + '/s_' + str(orbit_str).zfill(8) + '_reflectors.npz'
+
+# Returns the reflector points of an orbit (array of POINT_DTYPE), one per traced reflector depth, in the order of plot_depths.
+#	orbit_str:				SHARAD orbit number.
+#	frames:					frame number of each plotted frame.
+#	lons, lats:				coordinates of each plotted frame.
+#	altitude_profile:		MOLA elevation (m) of each plotted frame.
+#	dielectric_constants:	dielectric constant of each row of plot_depths.
+#	plot_depths:			reflector depths (m), (dielectric constants x [layers x] reflector colors x frames), NaN where not traced.
+#							Each layer of a colour is saved as a separate point of that colour.
+def get_reflector_points(orbit_str, frames, lons, lats, altitude_profile, dielectric_constants, plot_depths):
+	traced = np.nonzero(~np.isnan(plot_depths))
+	(dielectric_indices, color_indices, frame_indices) = (traced[0], traced[-2], traced[-1])
+
+	points = np.empty(len(frame_indices), dtype=POINT_DTYPE)
+	points['orbit'] = int(orbit_str)
+	points['frame'] = np.asarray(frames)[frame_indices]
+	points['dielectric_constant'] = np.asarray(dielectric_constants, dtype=np.float32)[dielectric_indices]
+	points['color'] = color_indices
+	points['lon'] = np.asarray(lons)[frame_indices]
+	points['lat'] = np.asarray(lats)[frame_indices]
+	points['depth'] = plot_depths[traced]
+	points['elevation'] = np.asarray(altitude_profile)[frame_indices] - plot_depths[traced]
+
+	return points
+
+# Returns an orbit's saved reflector points (array of POINT_DTYPE), or an empty array if there are none.
+def load_points(orbit_str, store_dir=REFLECTORS_DIR):
+	return load_points_file(get_store_file_name(orbit_str, store_dir))
+
+# Returns the reflector points saved in a store file, or an empty array if it does not exist.
+# Colour indices refer to annotations.REFLECTOR_COLOR_NAMES, even if the points were saved with the colours in another order.
+def load_points_file(file_name):
+	if not os.path.exists(file_name):
+		return np.empty(0, dtype=POINT_DTYPE)
+
+	with np.load(file_name) as saved:
+		points = saved['points']
+		saved_color_names = [str(name) for name in saved['color_names']]
+
+	if saved_color_names != annotations.REFLECTOR_COLOR_NAMES:
+		lookup = np.array([annotations.REFLECTOR_COLOR_NAMES.index(name) if name in annotations.REFLECTOR_COLOR_NAMES else 255 for name in saved_color_names], dtype=np.uint8)
+		points['color'] = lookup[points['color']]
+		points = points[points['color'] != 255]
+
+	return points
+
+# Saves an orbit's reflector points. Points already saved for the same orbit are replaced: all of them, or only those of the
+# given frames when a window of the orbit was processed. The store file is locked while it is read, merged and written back,
+# so that windows of the same orbit processed at the same time (e.g. by batch_process.py or survey.py) do not overwrite each other.
+#	orbit_str:				SHARAD orbit number.
+#	points:					reflector points (array of POINT_DTYPE) of the processed frames.
+#	frames (optional):		frame numbers that were processed, to only replace the points of those frames, or None to replace every point.
+# Returns the path of the orbit's store file.
+def save_points(orbit_str, points, frames=None, store_dir=REFLECTORS_DIR):
+	file_name = get_store_file_name(orbit_str, store_dir)
+	os.makedirs(store_dir, exist_ok=True)
+
+	with open(file_name + '.lock', 'w') as lock_file:
+		if fcntl is not None:
+			fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+		if frames is not None:
+			kept = load_points_file(file_name)
+			kept = kept[~np.isin(kept['frame'], frames)]
+			points = np.concatenate([kept, points.astype(POINT_DTYPE)])
+		points = points[np.lexsort((points['frame'], points['color'], points['dielectric_constant']))]
+
+		temp_file_name = file_name[:-len('.npz')] + '.' + str(os.getpid()) + '.tmp.npz'
+		np.savez(temp_file_name, points=points, color_names=np.array(annotations.REFLECTOR_COLOR_NAMES))
+		os.replace(temp_file_name, file_name)
+
+	return file_name
+
+# Returns the orbit numbers (zero-padded strings) that have saved reflector points.
+def get_stored_orbits(store_dir=REFLECTORS_DIR):
+	return sorted(os.path.basename(file_name)[len('s_'):-len('_reflectors.npz')] for file_name in glob.glob(store_dir + '/s_*_reflectors.npz'))
+
+# Returns the reflector points (array of POINT_DTYPE) of every stored orbit that match all the given filters.
+#	bbox (optional):					(min_lon, min_lat, max_lon, max_lat) in degrees. If min_lon > max_lon, the box crosses the antimeridian.
+#	depth_range (optional):				(min, max) depth below the surface (m).
+#	colors (optional):					reflector colour names, e.g. ["red", "cyan"].
+#	dielectric_constants (optional):	dielectric constants to keep.
+#	orbits (optional):					orbit numbers to search, instead of every stored orbit.
+def query(bbox=None, depth_range=None, colors=None, dielectric_constants=None, orbits=None, store_dir=REFLECTORS_DIR):
+	if colors is not None:
+		unknown = [color for color in colors if color not in annotations.REFLECTOR_COLOR_NAMES]
+		if unknown:
+			raise ValueError("unknown reflector colors: " + ", ".join(unknown))
+		color_indices = [annotations.REFLECTOR_COLOR_NAMES.index(color) for color in colors]
+
+	orbits = get_stored_orbits(store_dir) if orbits is None else [str(orbit).zfill(8) for orbit in orbits]
+
+	matches = []
+	for orbit_str in orbits:
+		points = load_points(orbit_str, store_dir)
+		keep = np.ones(len(points), dtype=bool)
+
+		if bbox is not None:
+			(min_lon, min_lat, max_lon, max_lat) = bbox
+			if min_lon <= max_lon:
+				keep &= (points['lon'] >= min_lon) & (points['lon'] <= max_lon)
+			else:
+				keep &= (points['lon'] >= min_lon) | (points['lon'] <= max_lon)
+			keep &= (points['lat'] >= min_lat) & (points['lat'] <= max_lat)
+		if depth_range is not None:
+			keep &= (points['depth'] >= depth_range[0]) & (points['depth'] <= depth_range[1])
+		if colors is not None:
+			keep &= np.isin(points['color'], color_indices)
+		if dielectric_constants is not None:
+			keep &= np.isin(points['dielectric_constant'], np.asarray(dielectric_constants, dtype=np.float32))
+
+		matches.append(points[keep])
+
+	return np.concatenate(matches) if matches else np.empty(0, dtype=POINT_DTYPE)
+
+# Saves reflector points to a CSV file, with the colour names written out.
+def write_csv(file_name, points):
+	color_names = np.array(annotations.REFLECTOR_COLOR_NAMES)
+
+	with open(file_name, 'w') as f:
+		f.write("orbit,frame,dielectric_constant,color,lon,lat,depth,elevation\n")
+		for point, color_name in zip(points, color_names[points['color']]):
+			f.write(",".join([str(point['orbit']), str(point['frame']), format(point['dielectric_constant'], 'g'), color_name,
+								format(point['lon'], '.5f'), format(point['lat'], '.5f'), format(point['depth'], '.1f'), format(point['elevation'], '.1f')]) + "\n")
+
+# Command line interface (see query_reflectors.py).
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+						prog='query_reflectors',
+						description='Finds the stored reflector points of every processed SHARAD orbit that match a region, depth range and colours.')
+	parser.add_argument('--bbox', type=float, nargs=4, metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'), help='bounding box in degrees (MIN_LON > MAX_LON crosses the antimeridian)')
+	parser.add_argument('--depth', type=float, nargs=2, metavar=('MIN', 'MAX'), help='depth below the surface in meters')
+	parser.add_argument('--color', nargs='+', choices=annotations.REFLECTOR_COLOR_NAMES, help='reflector colour(s)')
+	parser.add_argument('-e', '--dielectric', type=float, nargs='+', help='dielectric constant(s)')
+	parser.add_argument('-o', '--orbit', nargs='+', help='only search these orbits')
+	parser.add_argument('--output-file', help='save the matching points to this CSV file')
+	args = parser.parse_args(argv)
+
+	points = query(args.bbox, args.depth, args.color, args.dielectric, args.orbit)
+
+	color_names = np.array(annotations.REFLECTOR_COLOR_NAMES)
+	for orbit in np.unique(points['orbit']):
+		orbit_points = points[points['orbit'] == orbit]
+		print(str(orbit).zfill(8) + ":", len(orbit_points), "points,", ", ".join(color_names[np.unique(orbit_points['color'])]) + ",",
+				"depth", format(orbit_points['depth'].min(), '.0f'), "-", format(orbit_points['depth'].max(), '.0f'), "m")
+	print(len(points), "reflector points in", len(np.unique(points['orbit'])), "orbits")
+
+	if args.output_file:
+		write_csv(args.output_file, points)
+		print("saved to", args.output_file)
@@ -0,0 +1,126 @@
+# Advanced Remote Sensing Spring 2023
+# Automatic detection of the Mars surface on a SHARAD radargram, so it does not have to be traced in yellow by hand.
+# Every radargram column is picked at once: either the first pixel whose echo is stronger than the noise above the surface
+# ("threshold"), or the pixel with the largest increase in echo from the pixel above it ("gradient"). The picks are then
+# smoothed across columns with a running median, which also replaces isolated bad picks.
+# The picks can be checked against the cluttergram (simulated echoes of the MOLA surface): the surface is the first return on
+# the cluttergram too, so columns where the two disagree by more than a tolerance are left unpicked.
+# Where the surface is also traced by hand, the hand tracing is used (see combine_surface).
+
+import numpy as np
+
+NOISE_ROWS = 64 # number of rows at the top of the radargram (above the surface) used to estimate the noise.
+NOISE_SIGMAS = 6.0 # "threshold" picks the first pixel this many noise standard deviations above the noise median.
+SMOOTHING_COLUMNS = 15 # width (columns) of the running median the picks are smoothed with.
+MAX_JUMP = 10 # picks further than this (pixels) from the running median are replaced by the median.
+
+# Reads a radargram or cluttergram TIFF as a (height x width) uint8 array of echo strength.
+def read_echo_image(file_name):
+	import cv2
+
+	img = cv2.imread(file_name, cv2.IMREAD_GRAYSCALE)
+	if img is None:
+		raise FileNotFoundError("could not read radargram " + file_name)
+
+	return img
+
+# Returns (median, standard deviation) of the noise in the rows at the top of a radargram, above the surface.
+# The standard deviation is estimated from the median absolute deviation, and is at least 1.
+def get_noise_level(echo, noise_rows=NOISE_ROWS):
+	noise = np.asarray(echo[:noise_rows], dtype=np.float32)
+	noise_median = np.median(noise)
+	noise_sigma = 1.4826 * np.median(np.abs(noise - noise_median)) # median absolute deviation, scaled to a standard deviation
+
+	return (noise_median, max(noise_sigma, 1.0))
+
+# Returns the row of the surface in every column of a radargram (float array, NaN where no surface was found).
+#	echo:					(height x width) echo strength, see read_echo_image.
+#	method (optional):		"threshold" (default) or "gradient".
+#	noise_rows (optional):	number of rows at the top of the radargram used to estimate the noise ("threshold").
+#	noise_sigmas (optional):	threshold above the noise median, in (robust) noise standard deviations ("threshold").
+#	smoothing (optional):	width (columns) of the running median, or 1 to not smooth.
+#	max_jump (optional):	picks further than this from the running median are replaced by the median.
+def pick_surface(echo, method="threshold", noise_rows=NOISE_ROWS, noise_sigmas=NOISE_SIGMAS, smoothing=SMOOTHING_COLUMNS, max_jump=MAX_JUMP):
+	echo = np.asarray(echo)
+
+	if method == "threshold":
+		(noise_median, noise_sigma) = get_noise_level(echo, noise_rows)
+		is_strong = echo > noise_median + noise_sigmas * noise_sigma
+		is_strong[:noise_rows] = False
+
+		picks = np.argmax(is_strong, axis=0).astype(np.float64) # first strong pixel of each column
+		picks[~is_strong.any(axis=0)] = np.nan
+
+	elif method == "gradient":
+		gradient = np.diff(echo.astype(np.int16), axis=0)
+		picks = np.argmax(gradient, axis=0).astype(np.float64) + 1 # the pixel below the largest increase
+		picks[gradient.max(axis=0) <= 0] = np.nan
+
+	else:
+		raise ValueError("unknown surface picking method '" + str(method) + "' (expected 'threshold' or 'gradient')")
+
+	if smoothing > 1:
+		picks = smooth_picks(picks, smoothing, max_jump)
+
+	return picks
+
+# Replaces picks further than max_jump from the running median of width columns (and missing picks) by the running median.
+def smooth_picks(picks, width=SMOOTHING_COLUMNS, max_jump=MAX_JUMP):
+	from numpy.lib.stride_tricks import sliding_window_view
+
+	half_width = width // 2
+	padded = np.pad(picks, half_width, mode='edge')
+	windows = sliding_window_view(padded, 2 * half_width + 1)
+
+	with np.errstate(all='ignore'):
+		is_all_nan = np.isnan(windows).all(axis=1)
+		median = np.full(len(picks), np.nan)
+		median[~is_all_nan] = np.nanmedian(windows[~is_all_nan], axis=1)
+
+	is_outlier = np.isnan(picks) | (np.abs(picks - median) > max_jump)
+	return np.where(is_outlier, median, picks)
+
+# Returns the radargram surface picks with the columns that disagree with the cluttergram's surface set to NaN.
+# The cluttergram is picked the same way; if its size differs from the radargram's, its picks are scaled to radargram rows and columns.
+#	surface:		surface row of every radargram column (see pick_surface).
+#	clutter_echo:	(height x width) echo strength of the cluttergram, see read_echo_image.
+#	radargram_height:	number of rows of the radargram.
+#	tolerance:		largest difference (radargram pixels) between the two surfaces that is accepted.
+#	method:			surface picking method used on the cluttergram (see pick_surface).
+def check_against_cluttergram(surface, clutter_echo, radargram_height, tolerance, method="threshold"):
+	clutter_surface = pick_surface(clutter_echo, method)
+
+	(clutter_height, clutter_width) = clutter_echo.shape
+	if clutter_width != len(surface):
+		clutter_surface = np.interp(np.linspace(0, clutter_width - 1, len(surface)), np.arange(clutter_width), clutter_surface)
+	clutter_surface = clutter_surface * (radargram_height / clutter_height)
+
+	agrees = np.abs(surface - clutter_surface) <= tolerance
+	return np.where(agrees, surface, np.nan)
+
+# Returns the surface row of every column: the hand-traced surface where there is one, otherwise the automatic pick.
+#	traced_surface:		hand-traced surface row of every column (NaN where not traced).
+#	picked_surface:		automatically picked surface row of every column.
+def combine_surface(traced_surface, picked_surface):
+	n_columns = min(len(traced_surface), len(picked_surface))
+	surface = np.array(traced_surface, dtype=np.float64)
+	surface[:n_columns] = np.where(np.isnan(surface[:n_columns]), picked_surface[:n_columns], surface[:n_columns])
+
+	return surface
+
+# Picks the surface on an orbit's downloaded radargram (see pick_surface), optionally checked against its cluttergram.
+#	orbit_str:						SHARAD orbit number.
+#	method (optional):				"threshold" (default) or "gradient".
+#	clutter_tolerance (optional):	if given, columns where the radargram and cluttergram surfaces differ by more than this many pixels are left unpicked.
+def pick_orbit_surface(orbit_str, method="threshold", clutter_tolerance=None):
+	from .annotation_sidecar import get_radargram_file_name
+
+	orbit_str = str(orbit_str).zfill(8)
+	echo = read_echo_image(get_radargram_file_name(orbit_str))
+	surface = pick_surface(echo, method)
+
+	if clutter_tolerance is not None:
+		clutter_echo = read_echo_image('./downloads/SHARAD/images/cluttergrams/s_' + orbit_str + '.tif')
+		surface = check_against_cluttergram(surface, clutter_echo, echo.shape[0], clutter_tolerance, method)
+
+	return surface
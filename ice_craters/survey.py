@@ -0,0 +1,268 @@
+# Advanced Remote Sensing Spring 2023
+# Runs the pipeline for a survey of many SHARAD orbits as three overlapping stages, so that the network, the CPUs and the
+# plotting all stay busy:
+#	- download: orbits are downloaded by a few threads (see download.download_orbit),
+#	- process: a pool of worker processes decodes the annotations, converts depths and samples the MOLA DEM (see pipeline.get_orbit_plot),
+#	- render: a smaller pool of worker processes draws and saves the plots.
+# The stages are connected by bounded asyncio queues. When a stage falls behind, the queue in front of it fills up and the
+# stage before it waits, so downloads never run more than a few orbits ahead of processing. The survey then takes about as
+# long as its slowest stage, instead of the sum of all of them. A failure in one orbit is reported without stopping the others.
+
+# Example: plot 500 orbits with 4 download threads, 8 processing workers and 2 rendering workers.
+#	python3 survey.py --range 1300001 1300500 --download-jobs 4 --process-jobs 8 --render-jobs 2
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from . import annotations, batch, geom_table, mola_dem, pipeline, plotting, profiling, track_index
+from . import download as download_data
+
+STAGES = ('download', 'process', 'render')
+
+# Busy time and number of orbits of one stage of a survey.
+class StageStatistics:
+
+	def __init__(self, name, n_workers):
+		self.name = name
+		self.n_workers = n_workers
+		self.busy = 0.0 # seconds spent in the stage, summed over its workers
+		self.done = 0
+		self.failed = 0
+
+	# Returns the time the stage would take on its own with all of its workers busy.
+	def get_stage_time(self):
+		return self.busy / self.n_workers
+
+# Runs the processing stage of one orbit in a worker process. Returns (plot, events): the arguments of a ProfileRenderer's
+# render after the output file (see pipeline.get_orbit_plot) and the profiling events recorded (empty unless profile is True).
+def process_job(orbit_str, frame_range, plot_options, profile=False, trace_memory=False):
+	if profile:
+		profiling.clear() # worker processes are reused, so only return this orbit's events
+		profiling.enable(trace_memory)
+
+	with profiling.stage('process', orbit=orbit_str):
+		plot = pipeline.get_orbit_plot(orbit_str, frame_range=frame_range, **plot_options)
+
+	return (plot, profiling.get_events())
+
+# Renders one orbit's plot to output_file in a worker process. Returns the profiling events recorded.
+def render_job(output_file, plot, profile=False, trace_memory=False):
+	if profile:
+		profiling.clear()
+		profiling.enable(trace_memory)
+
+	with profiling.stage('render', file=output_file):
+		plotting.get_renderer().render(output_file, *plot)
+
+	return profiling.get_events()
+
+# Runs workers that take (orbit_str, frame_range, data) items from inbox, call handle on each, and put (orbit_str, frame_range, result)
+# on outbox (waiting while outbox is full). A None item ends the stage: it is passed on to the other workers and then to outbox.
+#	statistics:		StageStatistics of the stage.
+#	inbox, outbox:	asyncio queues before and after the stage (outbox is None for the last stage).
+#	handle:			coroutine function called with (orbit_str, frame_range, data), returning the result passed to the next stage.
+#	failures:		list that (job name, error) is appended to when handle raises.
+async def run_stage(statistics, inbox, outbox, handle, failures):
+	async def worker():
+		while True:
+			item = await inbox.get()
+			if item is None:
+				await inbox.put(None) # let the other workers of the stage stop too
+				return
+
+			(orbit_str, frame_range, data) = item
+			start = time.perf_counter()
+			try:
+				result = await handle(orbit_str, frame_range, data)
+			except Exception as exception:
+				statistics.failed += 1
+				failures.append((orbit_str + pipeline.get_window_suffix(frame_range), statistics.name + ": " + str(exception) + "\n" + traceback.format_exc()))
+				continue
+			finally:
+				statistics.busy += time.perf_counter() - start
+
+			statistics.done += 1
+			if outbox is not None:
+				await outbox.put((orbit_str, frame_range, result))
+
+	await asyncio.gather(*[worker() for _ in range(statistics.n_workers)])
+	if outbox is not None:
+		await outbox.put(None)
+
+# Runs a survey of SHARAD orbits (see the top of this file). Returns (statistics, failures, wall_time): the StageStatistics of
+# each stage, a list of (job name, error) for every orbit that failed, and the survey's total time in seconds.
+#	jobs:						list of (orbit_str, frame_range) to plot, frame_range None for the whole orbit.
+#	plot_options:				keyword arguments of pipeline.get_orbit_plot (other than frame_range), e.g. {'dielectric_constants': (1.0, 3.1)}.
+#	output_dir:					directory to save the plots to.
+#	output_format (optional):	"png" (default), "svg" or "pdf".
+#	download (optional):		False to only use orbits that are already downloaded.
+#	pds_url (optional):			base URL of the PDS Geosciences Node.
+#	download_jobs, process_jobs, render_jobs (optional):	number of concurrent downloads, processing workers and rendering workers.
+#	queue_size (optional):		number of orbits that can wait between two stages (default: twice the number of processing workers).
+#	profile, trace_memory (optional):	record the workers' profiling events (see profiling.py).
+async def run_survey(jobs, plot_options, output_dir, output_format="png", download=True, pds_url=download_data.PDS_GEOSCIENCES_URL,
+					download_jobs=4, process_jobs=None, render_jobs=2, queue_size=None, profile=False, trace_memory=False):
+	process_jobs = process_jobs or os.cpu_count()
+	queue_size = queue_size or 2 * process_jobs
+	loop = asyncio.get_running_loop()
+
+	statistics = {name: StageStatistics(name, n_workers) for (name, n_workers) in zip(STAGES, (download_jobs, process_jobs, render_jobs))}
+	failures = []
+	manifest = download_data.Manifest()
+
+	(to_download, to_process, to_render) = (asyncio.Queue(maxsize=queue_size), asyncio.Queue(maxsize=queue_size), asyncio.Queue(maxsize=queue_size))
+
+	# worker processes are started while downloads are running, so they are spawned rather than forked: a forked worker would
+	# inherit the open manifest lock file of a download thread and hold its lock forever (see download.Manifest).
+	context = multiprocessing.get_context('spawn')
+	with ThreadPoolExecutor(max_workers=download_jobs) as download_pool, ProcessPoolExecutor(process_jobs, context) as process_pool, ProcessPoolExecutor(render_jobs, context) as render_pool:
+
+		async def download_orbit(orbit_str, frame_range, data):
+			if download:
+				await loop.run_in_executor(download_pool, download_data.download_orbit, orbit_str, manifest, pds_url)
+
+		async def process_orbit(orbit_str, frame_range, data):
+			(plot, events) = await loop.run_in_executor(process_pool, process_job, orbit_str, frame_range, plot_options, profile, trace_memory)
+			profiling.add_events(events)
+			return plot
+
+		async def render_orbit(orbit_str, frame_range, plot):
+			output_file = pipeline.get_output_file_name(orbit_str, output_dir, output_format, frame_range)
+			profiling.add_events(await loop.run_in_executor(render_pool, render_job, output_file, plot, profile, trace_memory))
+			print("orbit", orbit_str + pipeline.get_window_suffix(frame_range), "done")
+
+		async def feed():
+			for (orbit_str, frame_range) in jobs:
+				await to_download.put((orbit_str, frame_range, None))
+			await to_download.put(None)
+
+		start = time.perf_counter()
+		await asyncio.gather(
+			feed(),
+			run_stage(statistics['download'], to_download, to_process, download_orbit, failures),
+			run_stage(statistics['process'], to_process, to_render, process_orbit, failures),
+			run_stage(statistics['render'], to_render, None, render_orbit, failures),
+		)
+		wall_time = time.perf_counter() - start
+
+	return (statistics, failures, wall_time)
+
+# Downloads the geometry tables of orbits (but not their radargrams or cluttergrams), download_jobs at a time, and adds them to
+# the track index, so that the orbits crossing a region can be found before the survey starts. Returns the orbits whose
+# geometry table could not be downloaded.
+def download_geom_tables(orbits, pds_url=download_data.PDS_GEOSCIENCES_URL, download_jobs=4):
+	manifest = download_data.Manifest()
+
+	def download_geom_table(orbit_str):
+		(url, file_name) = download_data.get_orbit_files(orbit_str, pds_url)['geom']
+		try:
+			download_data.download_file(url, file_name, manifest)
+			return None
+		except Exception as exception:
+			print("could not download the geometry table of orbit", orbit_str + ":", exception)
+			return orbit_str
+
+	with ThreadPoolExecutor(max_workers=download_jobs) as executor:
+		failed = [orbit_str for orbit_str in executor.map(download_geom_table, orbits) if orbit_str is not None]
+	track_index.get_index()
+
+	return failed
+
+# Prints each stage's time on its own (with all of its workers busy) next to the survey's total time.
+def print_survey_statistics(statistics, wall_time):
+	print("stage      workers  orbits  failed  busy (s)  stage time (s)")
+	for stage in statistics.values():
+		print(stage.name.ljust(10), str(stage.n_workers).rjust(7), str(stage.done).rjust(7), str(stage.failed).rjust(7), format(stage.busy, '9.2f'), format(stage.get_stage_time(), '15.2f'))
+
+	slowest = max(statistics.values(), key=StageStatistics.get_stage_time)
+	print("survey took", format(wall_time, '.2f'), "s: slowest stage", slowest.name, format(slowest.get_stage_time(), '.2f'), "s, all stages one after another",
+			format(sum(stage.get_stage_time() for stage in statistics.values()), '.2f'), "s")
+
+# Command line interface (see survey.py).
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+						prog='survey',
+						description='Downloads, processes and plots many SHARAD orbits with the three stages running at the same time.')
+	parser.add_argument('-o', '--orbit', nargs='+', default=[], help='orbit number(s) to process')
+	parser.add_argument('--range', nargs=2, metavar=('FIRST', 'LAST'), help='process every orbit number from FIRST to LAST (inclusive)')
+	parser.add_argument('--orbit-file', help='file with one orbit number per line')
+	parser.add_argument('--bbox', type=float, nargs=4, metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'), help='only plot the frames inside this bounding box, of the given orbits or else of every downloaded orbit')
+	parser.add_argument('--point', type=float, nargs=2, metavar=('LON', 'LAT'), help='only plot the frames within --radius km of this point, of the given orbits or else of every downloaded orbit')
+	parser.add_argument('--radius', type=float, default=10.0, help='radius around --point in km (default: 10)')
+	parser.add_argument('--no-download', action='store_true', help='only process orbits that are already downloaded')
+	parser.add_argument('--pds-url', default=download_data.PDS_GEOSCIENCES_URL, help='base URL of the PDS Geosciences Node')
+	parser.add_argument('--memmap-dem', action='store_true', help='build an uncompressed copy of the MOLA DEM (about 2 GB) that all workers memory-map')
+	parser.add_argument('--download-jobs', type=int, default=4, help='number of orbits downloaded at the same time (default: 4)')
+	parser.add_argument('--process-jobs', type=int, default=os.cpu_count(), help='number of processing worker processes (default: number of CPUs)')
+	parser.add_argument('--render-jobs', type=int, default=2, help='number of rendering worker processes (default: 2)')
+	parser.add_argument('--queue-size', type=int, help='number of orbits that can wait between two stages (default: twice --process-jobs)')
+	parser.add_argument('-e', '--dielectric', type=float, nargs='+', default=[1.0, 3.1], help='dielectric constant(s) of the subsurface to plot reflector geometry for (default: 1 and 3.1)')
+	parser.add_argument('--sweep', type=float, nargs=3, metavar=('START', 'STOP', 'STEP'), help='also save reflector depths for every dielectric constant from START to STOP (inclusive)')
+	parser.add_argument('--output-dir', default='./plots', help='directory to save plots to (default: ./plots)')
+	parser.add_argument('--format', default='png', choices=['png', 'svg', 'pdf'], help='file format of saved plots (default: png)')
+	parser.add_argument('--auto-surface', nargs='?', const='threshold', choices=['threshold', 'gradient'], help='pick the surface automatically where it is not traced in yellow (default method: threshold)')
+	parser.add_argument('--clutter-tolerance', type=float, metavar='PIXELS', help='with --auto-surface, drop picks that differ from the cluttergram\'s surface by more than PIXELS')
+	parser.add_argument('--no-store', action='store_true', help='do not save the reflector points to ./downloads/SHARAD/reflectors/ (see query_reflectors.py)')
+	parser.add_argument('--trace-depth', default='bottom', choices=annotations.COLUMN_REDUCTIONS, help='depth of a trace more than one pixel thick in a radargram column (default: bottom)')
+	parser.add_argument('--layers', type=int, help='keep up to this many separate layers of each reflector colour per column, instead of reducing them to one depth')
+	profiling.add_arguments(parser)
+	args = parser.parse_args(argv)
+
+	orbits = batch.collect_orbits(args.orbit, args.range, args.orbit_file)
+	if args.bbox is not None and args.point is not None:
+		parser.error("give either --bbox or --point, not both")
+	if not orbits and args.bbox is None and args.point is None:
+		parser.error("no orbits given (use -o, --range, --orbit-file, --bbox or --point)")
+
+	if args.profile:
+		profiling.enable(args.trace_memory)
+
+	# The DEM is shared by every orbit, so it is downloaded (and optionally uncompressed) once before the survey starts.
+	if not args.no_download:
+		download_data.download_mola_dem(download_data.Manifest())
+	if args.memmap_dem:
+		mola_dem.build_memmap_cache()
+
+	# The region is looked up in the geometry tables, so those of the given orbits are downloaded first (the rest of each orbit
+	# is downloaded by the survey, only if it crosses the region). Orbits whose geometry table is missing cannot be looked up.
+	jobs = [(orbit_str, None) for orbit_str in orbits]
+	if args.bbox is not None or args.point is not None:
+		if not args.no_download:
+			download_geom_tables(orbits, args.pds_url, args.download_jobs)
+		missing = [orbit_str for orbit_str in orbits if not os.path.exists(geom_table.get_geom_file_name(orbit_str))]
+		if missing:
+			print("warning:", len(missing), "of", len(orbits), "orbits have no geometry table and are skipped:", " ".join(missing))
+
+		jobs = batch.collect_region_jobs(args.bbox, args.point, args.radius, orbits)
+		print(len(jobs), "frame windows in", len(set(orbit_str for (orbit_str, frame_range) in jobs)), "orbits cross the region")
+
+	plot_options = {
+		'dielectric_constants': args.dielectric,
+		'sweep': args.sweep,
+		'surface_method': args.auto_surface,
+		'clutter_tolerance': args.clutter_tolerance,
+		'store_results': not args.no_store,
+		'trace_depth': args.trace_depth,
+		'layers': args.layers,
+	}
+	(statistics, failures, wall_time) = asyncio.run(run_survey(jobs, plot_options, args.output_dir, args.format, not args.no_download, args.pds_url,
+																args.download_jobs, args.process_jobs, args.render_jobs, args.queue_size, bool(args.profile), args.trace_memory))
+
+	# index the ground tracks of the orbits that were just downloaded
+	if not args.no_download:
+		track_index.get_index()
+
+	print_survey_statistics(statistics, wall_time)
+	print(len(jobs) - len(failures), "of", len(jobs), "orbits processed")
+	if args.profile:
+		profiling.report(args.profile)
+	if failures:
+		for (job_name, error) in failures:
+			print("orbit", job_name, "FAILED:", error)
+		print("failed orbits:", " ".join(job_name for (job_name, error) in failures))
+		raise SystemExit(1)
@@ -0,0 +1,255 @@
+# Advanced Remote Sensing Spring 2023
+# Spatial index of the SHARAD ground tracks whose geometry tables have been downloaded, to find the orbits (and the frames of
+# each orbit) that pass over a region of Mars. Mars is divided into a grid of CELL_SIZE degree cells, and the index stores,
+# for every cell, each run of consecutive frames of an orbit that falls in it. It is saved in ./downloads/SHARAD/track_index.npz
+# and updated from the geometry tables that were added or changed since the last update.
+# Queries look up the cells that overlap the region, then check the candidate frames' exact coordinates.
+
+# Example: find the orbits that pass within 20 km of a crater at 130.3 W, 18.6 N, or over a bounding box.
+#	python3 find_orbits.py --point -130.3 18.6 --radius 20
+#	python3 find_orbits.py --bbox -131 18 -129 20
+
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from . import geom_table
+from .download import DOWNLOADS_DIR
+
+INDEX_FILE_NAME = DOWNLOADS_DIR + '/SHARAD/track_index.npz'
+GEOM_DIR = DOWNLOADS_DIR + '/SHARAD/geom'
+CELL_SIZE = 1.0 # width and height of the grid cells in degrees.
+MARS_RADIUS_KM = 3389.5 # mean radius of Mars.
+
+# One run of consecutive frames of an orbit inside one grid cell.
+RUN_DTYPE = [('cell', np.int32), ('orbit', np.int32), ('first_frame', np.int32), ('last_frame', np.int32)]
+
+# One geometry table in the index, and the size and modification time it had when it was indexed.
+SOURCE_DTYPE = [('orbit', np.int32), ('size', np.int64), ('mtime_ns', np.int64)]
+
+# Returns the number of grid columns (cells around one line of latitude).
+def get_n_cell_columns(cell_size=CELL_SIZE):
+	return int(round(360 / cell_size))
+
+# Returns the grid cell of each (lon, lat) point: row (from the south pole) x number of columns + column (from 180 W).
+def get_cells(lons, lats, cell_size=CELL_SIZE):
+	lons = np.mod(np.asarray(lons, dtype=np.float64) + 180, 360)
+	lats = np.asarray(lats, dtype=np.float64)
+
+	n_columns = get_n_cell_columns(cell_size)
+	columns = np.minimum((lons // cell_size).astype(np.int64), n_columns - 1)
+	rows = np.clip(((lats + 90) // cell_size).astype(np.int64), 0, int(round(180 / cell_size)) - 1)
+
+	return (rows * n_columns + columns).astype(np.int32)
+
+# Returns the runs of consecutive frames of one orbit in the same cell, as an array of RUN_DTYPE.
+#	orbit:		orbit number.
+#	frames:		frame number of each row of the geometry table.
+#	lons, lats:	coordinates of each frame.
+def get_track_runs(orbit, frames, lons, lats, cell_size=CELL_SIZE):
+	cells = get_cells(lons, lats, cell_size)
+	if len(cells) == 0:
+		return np.empty(0, dtype=RUN_DTYPE)
+
+	starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+	ends = np.r_[starts[1:], len(cells)] - 1
+
+	runs = np.empty(len(starts), dtype=RUN_DTYPE)
+	runs['cell'] = cells[starts]
+	runs['orbit'] = orbit
+	runs['first_frame'] = frames[starts]
+	runs['last_frame'] = frames[ends]
+
+	return runs
+
+# Spatial index of ground tracks. runs are sorted by cell, so a cell's runs are found by binary search.
+#	runs:		array of RUN_DTYPE.
+#	sources:	array of SOURCE_DTYPE, one per indexed geometry table.
+#	cell_size:	size of the grid cells in degrees.
+class TrackIndex:
+
+	def __init__(self, runs=None, sources=None, cell_size=CELL_SIZE):
+		self.runs = np.empty(0, dtype=RUN_DTYPE) if runs is None else runs
+		self.sources = np.empty(0, dtype=SOURCE_DTYPE) if sources is None else sources
+		self.cell_size = cell_size
+
+	# Returns the saved index, or an empty index if there is none (or it was saved with another cell size).
+	@classmethod
+	def load(cls, file_name=INDEX_FILE_NAME, cell_size=CELL_SIZE):
+		if not os.path.exists(file_name):
+			return cls(cell_size=cell_size)
+
+		with np.load(file_name) as saved:
+			if float(saved['cell_size']) != cell_size:
+				return cls(cell_size=cell_size)
+			return cls(saved['runs'], saved['sources'], cell_size)
+
+	def save(self, file_name=INDEX_FILE_NAME):
+		os.makedirs(os.path.dirname(file_name), exist_ok=True)
+		temp_file_name = file_name[:-len('.npz')] + '.' + str(os.getpid()) + '.tmp.npz'
+		np.savez(temp_file_name, runs=self.runs, sources=self.sources, cell_size=self.cell_size)
+		os.replace(temp_file_name, file_name)
+
+	# Indexes the geometry tables that are new or have changed since they were indexed, and removes the orbits whose tables
+	# have been deleted. Returns the number of orbits (re)indexed.
+	#	geom_dir:	directory of the geometry tables (s_<orbit>_geom.csv).
+	def update(self, geom_dir=GEOM_DIR):
+		found = {}
+		for file_name in glob.glob(geom_dir + '/s_*_geom.csv'):
+			orbit_str = os.path.basename(file_name)[len('s_'):-len('_geom.csv')]
+			if orbit_str.isdigit():
+				found[int(orbit_str)] = (file_name, os.stat(file_name))
+
+		indexed = {int(source['orbit']): (int(source['size']), int(source['mtime_ns'])) for source in self.sources}
+		changed = [orbit for (orbit, (file_name, stat)) in found.items() if indexed.get(orbit) != (stat.st_size, stat.st_mtime_ns)]
+		removed = [orbit for orbit in indexed if orbit not in found]
+		if not changed and not removed:
+			return 0
+
+		new_runs = []
+		for orbit in changed:
+			table = geom_table.read_geom_table(found[orbit][0])
+			new_runs.append(get_track_runs(orbit, np.asarray(table['frame']), table['lon'], table['lat'], self.cell_size))
+
+		kept = ~np.isin(self.runs['orbit'], changed + removed)
+		runs = np.concatenate([self.runs[kept]] + new_runs)
+		self.runs = runs[np.lexsort((runs['first_frame'], runs['orbit'], runs['cell']))]
+
+		self.sources = np.array(sorted((orbit, stat.st_size, stat.st_mtime_ns) for (orbit, (file_name, stat)) in found.items()), dtype=SOURCE_DTYPE)
+
+		return len(changed)
+
+	# Returns the runs (array of RUN_DTYPE) in the given cells.
+	def get_runs_in_cells(self, cells):
+		cells = np.unique(cells)
+		starts = np.searchsorted(self.runs['cell'], cells, side='left')
+		stops = np.searchsorted(self.runs['cell'], cells, side='right')
+
+		indices = np.concatenate([np.arange(start, stop) for (start, stop) in zip(starts, stops)]) if len(cells) else np.empty(0, dtype=np.int64)
+		return self.runs[indices.astype(np.int64)]
+
+	# Returns the cells that overlap a bounding box. If min_lon > max_lon, the box crosses the antimeridian.
+	def get_bbox_cells(self, min_lon, min_lat, max_lon, max_lat):
+		n_columns = get_n_cell_columns(self.cell_size)
+		first_column = int(np.mod(min_lon + 180, 360) // self.cell_size)
+		last_column = int(np.mod(max_lon + 180, 360) // self.cell_size)
+		if max_lon - min_lon >= 360:
+			(first_column, last_column) = (0, n_columns - 1)
+
+		if first_column <= last_column and min_lon <= max_lon:
+			columns = np.arange(first_column, last_column + 1)
+		else:
+			columns = np.r_[np.arange(first_column, n_columns), np.arange(0, last_column + 1)]
+		columns = np.minimum(columns, n_columns - 1)
+
+		rows = np.arange(int((max(min_lat, -90) + 90) // self.cell_size), int((min(max_lat, 90 - 1e-9) + 90) // self.cell_size) + 1)
+
+		return (rows[:, None] * n_columns + columns[None, :]).ravel()
+
+	# Returns the frames of the candidate runs whose coordinates satisfy is_inside, as a list of (orbit_str, first_frame, last_frame)
+	# windows of consecutive frames, sorted by orbit and frame.
+	#	candidates:		runs (array of RUN_DTYPE) to check.
+	#	is_inside:		function returning, for arrays of lons and lats, which points are in the region.
+	#	geom_dir:		directory of the geometry tables.
+	def refine(self, candidates, is_inside, geom_dir=GEOM_DIR):
+		windows = []
+		for orbit in np.unique(candidates['orbit']):
+			orbit_str = str(int(orbit)).zfill(8)
+			table = geom_table.read_geom_table(os.path.join(geom_dir, 's_' + orbit_str + '_geom.csv'))
+			frames = np.asarray(table['frame'])
+
+			# candidate rows of the table: every frame of the orbit's runs in the candidate cells.
+			orbit_runs = candidates[candidates['orbit'] == orbit]
+			in_run = np.zeros(len(frames), dtype=bool)
+			for run in orbit_runs:
+				in_run |= (frames >= run['first_frame']) & (frames <= run['last_frame'])
+			rows = np.flatnonzero(in_run)
+
+			inside = rows[is_inside(np.asarray(table['lon'])[rows], np.asarray(table['lat'])[rows])]
+			if len(inside) == 0:
+				continue
+
+			# split the matching rows into windows of consecutive frames.
+			breaks = np.flatnonzero(np.diff(inside) != 1) + 1
+			for window in np.split(inside, breaks):
+				windows.append((orbit_str, int(frames[window[0]]), int(frames[window[-1]])))
+
+		return windows
+
+	# Returns the frames of every indexed orbit that fall inside a bounding box (degrees), as (orbit_str, first_frame, last_frame)
+	# windows. If min_lon > max_lon, the box crosses the antimeridian.
+	def query_bbox(self, min_lon, min_lat, max_lon, max_lat, geom_dir=GEOM_DIR):
+		candidates = self.get_runs_in_cells(self.get_bbox_cells(min_lon, min_lat, max_lon, max_lat))
+
+		def is_inside(lons, lats):
+			lons = np.mod(lons + 180, 360) - 180
+			if min_lon <= max_lon:
+				in_lon = (lons >= min_lon) & (lons <= max_lon)
+			else:
+				in_lon = (lons >= min_lon) | (lons <= max_lon)
+			return in_lon & (lats >= min_lat) & (lats <= max_lat)
+
+		return self.refine(candidates, is_inside, geom_dir)
+
+	# Returns the frames of every indexed orbit within radius_km of a point (great-circle distance on a sphere of MARS_RADIUS_KM),
+	# as (orbit_str, first_frame, last_frame) windows.
+	def query_radius(self, lon, lat, radius_km, geom_dir=GEOM_DIR):
+		radius_deg = np.degrees(radius_km / MARS_RADIUS_KM)
+		min_lat = lat - radius_deg
+		max_lat = lat + radius_deg
+		if min_lat <= -90 or max_lat >= 90: # the circle contains a pole: every longitude
+			(min_lon, max_lon) = (-180, 180)
+		else:
+			lon_radius = np.degrees(np.arcsin(min(1.0, np.sin(np.radians(radius_deg)) / np.cos(np.radians(lat)))))
+			(min_lon, max_lon) = (lon - lon_radius, lon + lon_radius)
+			if max_lon - min_lon >= 360:
+				(min_lon, max_lon) = (-180, 180)
+			else:
+				(min_lon, max_lon) = (np.mod(min_lon + 180, 360) - 180, np.mod(max_lon + 180, 360) - 180)
+
+		candidates = self.get_runs_in_cells(self.get_bbox_cells(min_lon, max(min_lat, -90), max_lon, min(max_lat, 90)))
+
+		def is_inside(lons, lats):
+			return get_distance_km(lon, lat, lons, lats) <= radius_km
+
+		return self.refine(candidates, is_inside, geom_dir)
+
+# Returns the great-circle distance (km) between (lon1, lat1) and each (lon2, lat2) on a sphere of MARS_RADIUS_KM (haversine formula).
+def get_distance_km(lon1, lat1, lon2, lat2):
+	(lon1, lat1, lon2, lat2) = (np.radians(lon1), np.radians(lat1), np.radians(lon2), np.radians(lat2))
+	a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+
+	return 2 * MARS_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+# Returns the saved track index, after updating it with any new or changed geometry tables (and saving it if anything changed).
+def get_index(file_name=INDEX_FILE_NAME, geom_dir=GEOM_DIR):
+	index = TrackIndex.load(file_name)
+	if index.update(geom_dir):
+		index.save(file_name)
+
+	return index
+
+# Command line interface (see find_orbits.py).
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+						prog='find_orbits',
+						description='Finds the downloaded SHARAD orbits (and frames) whose ground track crosses a region of Mars.')
+	parser.add_argument('--bbox', type=float, nargs=4, metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'), help='bounding box in degrees (MIN_LON > MAX_LON crosses the antimeridian)')
+	parser.add_argument('--point', type=float, nargs=2, metavar=('LON', 'LAT'), help='center of a circle, with --radius')
+	parser.add_argument('--radius', type=float, default=10.0, help='radius of the circle around --point in km (default: 10)')
+	args = parser.parse_args(argv)
+
+	if (args.bbox is None) == (args.point is None):
+		parser.error("give either --bbox or --point")
+
+	index = get_index()
+	if args.bbox is not None:
+		windows = index.query_bbox(*args.bbox)
+	else:
+		windows = index.query_radius(args.point[0], args.point[1], args.radius)
+
+	for (orbit_str, first_frame, last_frame) in windows:
+		print(orbit_str, first_frame, last_frame)
+	print(len(windows), "frame windows in", len(set(orbit_str for (orbit_str, first_frame, last_frame) in windows)), "orbits")
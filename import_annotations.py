@@ -0,0 +1,11 @@
+# Advanced Remote Sensing Spring 2023
+# Imports the traces painted on SHARAD radargrams into sparse annotation files. See ice_craters/annotation_sidecar.py.
+
+# Example: make a colour copy of orbit 1308401's radargram to paint on, then import the painted traces.
+#	python3 import_annotations.py -o 1308401 --paint-copy
+#	python3 import_annotations.py -o 1308401
+
+from ice_craters.annotation_sidecar import main
+
+if __name__ == '__main__':
+	main()
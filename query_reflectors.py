@@ -0,0 +1,10 @@
+# Advanced Remote Sensing Spring 2023
+# Finds the stored reflector points of every processed SHARAD orbit that match a region, depth range and colours. See ice_craters/reflector_store.py.
+
+# Example: list the red and cyan reflectors deeper than 50 m (at er = 3.1) in a bounding box, and save them to a CSV file.
+#	python3 query_reflectors.py --bbox -131 18 -129 20 --depth 50 1000 --color red cyan -e 3.1 --output-file reflectors.csv
+
+from ice_craters.reflector_store import main
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,10 @@
+# Advanced Remote Sensing Spring 2023
+# Scores the reflectors traced on SHARAD radargrams by how strongly their cluttergrams predict an echo there. See ice_craters/clutter.py.
+
+# Example: screen the reflectors traced on orbits 1308401 and 1308501.
+#	python3 screen_clutter.py -o 1308401 1308501
+
+from ice_craters.clutter import main
+
+if __name__ == '__main__':
+	main()
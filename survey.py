@@ -0,0 +1,10 @@
+# Advanced Remote Sensing Spring 2023
+# Downloads, processes and plots many SHARAD orbits with the three stages running at the same time. See ice_craters/survey.py.
+
+# Example: plot 500 orbits with 4 download threads, 8 processing workers and 2 rendering workers.
+#	python3 survey.py --range 1300001 1300500 --download-jobs 4 --process-jobs 8 --render-jobs 2
+
+from ice_craters.survey import main
+
+if __name__ == '__main__':
+	main()
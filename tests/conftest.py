@@ -0,0 +1,23 @@
+# Shared fixtures of the tests: a synthetic MOLA DEM and ./downloads/ tree generated with the benchmark's generators
+# (see ice_craters/benchmark.py), so the tests need neither the real MOLA mosaic nor any PDS products.
+# Run the tests from the repository's root directory with: python3 -m pytest
+
+import os
+
+import pytest
+
+from ice_craters import benchmark, mola_dem
+
+# Returns a directory holding a synthetic MOLA DEM in ./downloads/MOLA/, generated once per test session.
+@pytest.fixture(scope='session')
+def synthetic_dir(tmp_path_factory):
+	work_dir = tmp_path_factory.mktemp('synthetic')
+	benchmark.write_synthetic_dem(os.path.join(work_dir, mola_dem.MOLA_DEM_PATH))
+	return work_dir
+
+# Runs a test inside the synthetic directory, since the pipeline reads and writes everything relative to ./downloads/.
+# Tests that write synthetic orbits give each of them its own orbit number.
+@pytest.fixture
+def synthetic_tree(synthetic_dir, monkeypatch):
+	monkeypatch.chdir(synthetic_dir)
+	return synthetic_dir
@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pytest
+
+from ice_craters import annotations, benchmark
+
+# Returns the traced pixels and width of a synthetic painted radargram (see benchmark.write_synthetic_radargram), which has
+# traces up to 3 pixels thick.
+@pytest.fixture(scope='module')
+def traced_pixels(tmp_path_factory):
+	work_dir = tmp_path_factory.mktemp('radargram')
+	(radargram, painted, cluttergram) = (os.path.join(work_dir, name) for name in ('radargram.tif', 'painted.tif', 'cluttergram.tif'))
+	benchmark.write_synthetic_radargram(radargram, painted, cluttergram, 1500, n_rows=400, n_reflectors=8, seed=3)
+
+	img = annotations.read_annotated_radargram(painted)
+	return (annotations.get_traced_pixels(img), img.shape[1], img)
+
+# Returns the pixel depth of each colour in each column reduced one column at a time, like the original decoder did for "bottom".
+def get_reference_depths(pixels, width, reduce):
+	(color_indices, rows, columns) = pixels
+	depths = np.full((len(annotations.ANNOTATION_COLORS), width), np.nan)
+	for color_index in np.unique(color_indices):
+		for column in np.unique(columns[color_indices == color_index]):
+			depths[color_index, column] = reduce(rows[(color_indices == color_index) & (columns == column)])
+	return depths
+
+# The default decoding uses the deepest traced pixel of each colour in each column.
+def test_decode_annotations_uses_deepest_pixel(traced_pixels):
+	(pixels, width, img) = traced_pixels
+	expected = get_reference_depths(pixels, width, np.max)
+
+	assert np.array_equal(annotations.decode_annotations(img), expected, equal_nan=True)
+	assert np.array_equal(annotations.reduce_columns(*pixels, width), expected, equal_nan=True)
+
+# Every reduction of reduce_columns matches reducing each column on its own.
+@pytest.mark.parametrize('method, reduce', [("top", np.min), ("bottom", np.max), ("median", np.median), ("centroid", np.mean)])
+def test_reduce_columns_matches_reference(traced_pixels, method, reduce):
+	(pixels, width, img) = traced_pixels
+
+	assert np.allclose(annotations.reduce_columns(*pixels, width, method), get_reference_depths(pixels, width, reduce), equal_nan=True)
+
+# Pixels of one colour more than layer_gap rows apart in a column are separate layers, from the top down; one layer is the default.
+def test_reduce_columns_layers(traced_pixels):
+	(pixels, width, img) = traced_pixels
+	color_indices = np.array([1, 1, 1, 1, 1, 2], dtype=np.uint8)
+	rows = np.array([10, 11, 30, 31, 32, 50])
+	columns = np.array([0, 0, 0, 0, 0, 1])
+
+	layered = annotations.reduce_columns(color_indices, rows, columns, 2, "bottom", max_layers=2)
+	assert layered.shape == (2, len(annotations.ANNOTATION_COLORS), 2)
+	assert (layered[0, 1, 0], layered[1, 1, 0], layered[0, 2, 1]) == (11, 32, 50)
+	assert np.isnan(layered[1, 2, 1])
+
+	single = annotations.reduce_columns(color_indices, rows, columns, 2, "bottom", max_layers=1)
+	assert np.array_equal(single[0, 1:3], [[11, np.nan], [np.nan, 50]], equal_nan=True)
+
+	# the synthetic traces are thick but never split (for this seed), so their top layer is the whole trace.
+	assert np.array_equal(annotations.reduce_columns(*pixels, width, "bottom", max_layers=1)[0], annotations.reduce_columns(*pixels, width), equal_nan=True)
+
+# Traced pixels saved to an annotation sidecar decode to the same depths as the painted radargram they came from.
+def test_sidecar_round_trip(traced_pixels, tmp_path):
+	from ice_craters import annotation_sidecar
+
+	(pixels, width, img) = traced_pixels
+	file_name = str(tmp_path / 'annotations.npz')
+	annotation_sidecar.save_annotations(file_name, pixels, img.shape[:2])
+	(loaded_pixels, shape) = annotation_sidecar.load_annotations(file_name)
+
+	assert shape == img.shape[:2]
+	assert len(loaded_pixels[0]) == len(pixels[0])
+	assert np.array_equal(annotations.decode_pixels(*loaded_pixels, shape[1]), annotations.decode_annotations(img), equal_nan=True)
+
+# A column with several layers of more than one reflector colour is counted once.
+def test_orbit_counts_layered_columns_once(synthetic_tree, capsys):
+	import cv2
+	from ice_craters import annotation_sidecar, pipeline
+
+	orbit_str = '92000021'
+	benchmark.write_synthetic_orbit(orbit_str, 200, n_rows=300, n_reflectors=2, seed=21)
+
+	# only the surface, and two layers of red and of cyan in columns 10-19.
+	colors = {name: upper for (name, lower, upper) in annotations.ANNOTATION_COLORS}
+	img = np.full((300, 200, 3), 128, dtype=np.uint8)
+	img[20] = colors[annotations.SURFACE_COLOR]
+	for (color, rows) in (('red', (50, 150)), ('cyan', (60, 160))):
+		img[rows, 10:20] = colors[color]
+	cv2.imwrite(annotation_sidecar.get_paint_copy_file_name(orbit_str), img)
+
+	pipeline.get_orbit_plot(orbit_str, use_cache=False, store_results=False, layers=2)
+	assert "10 reflector columns with more than one layer" in capsys.readouterr().out
+
+# Writes the synthetic radargram as an orbit's downloaded radargram, without a paint copy: single-channel, or in colour with its
+# traces painted in place. Returns its path.
+def write_radargram(orbit_str, traced_pixels, painted_in_place):
+	import cv2
+	from ice_craters import annotation_sidecar
+
+	(pixels, width, img) = traced_pixels
+	file_name = annotation_sidecar.get_radargram_file_name(orbit_str)
+	os.makedirs(os.path.dirname(file_name), exist_ok=True)
+	cv2.imwrite(file_name, img if painted_in_place else img[:, :, 0])
+
+	return file_name
+
+# An untouched radargram is not decoded for traces: without a sidecar the orbit has no annotations.
+def test_untouched_radargram_is_not_imported(traced_pixels, tmp_path, monkeypatch):
+	from ice_craters import annotation_sidecar
+
+	monkeypatch.chdir(tmp_path)
+	write_radargram('00000001', traced_pixels, painted_in_place=False)
+
+	assert annotation_sidecar.get_newer_painted_image('00000001') is None
+	with pytest.raises(FileNotFoundError, match="no annotations"):
+		annotation_sidecar.read_orbit_annotations('00000001')
+
+# A radargram downloaded again after its traces were imported does not replace the sidecar.
+def test_redownloaded_radargram_keeps_sidecar(traced_pixels, tmp_path, monkeypatch):
+	from ice_craters import annotation_sidecar
+
+	monkeypatch.chdir(tmp_path)
+	(pixels, width, img) = traced_pixels
+	annotation_sidecar.save_annotations(annotation_sidecar.get_annotation_file_name('00000002'), pixels, img.shape[:2])
+	file_name = write_radargram('00000002', traced_pixels, painted_in_place=False)
+	os.utime(file_name, (os.path.getmtime(file_name) + 10,) * 2)
+
+	(loaded_pixels, shape) = annotation_sidecar.read_orbit_annotations('00000002')
+	assert len(loaded_pixels[0]) == len(pixels[0])
+
+# A radargram painted in place (before paint copies existed) is still imported.
+def test_radargram_painted_in_place_is_imported(traced_pixels, tmp_path, monkeypatch):
+	from ice_craters import annotation_sidecar
+
+	monkeypatch.chdir(tmp_path)
+	file_name = write_radargram('00000003', traced_pixels, painted_in_place=True)
+
+	assert annotation_sidecar.get_newer_painted_image('00000003') == file_name
+	(loaded_pixels, shape) = annotation_sidecar.read_orbit_annotations('00000003')
+	assert len(loaded_pixels[0]) == len(traced_pixels[0][0])
+	assert os.path.exists(annotation_sidecar.get_annotation_file_name('00000003'))
@@ -0,0 +1,25 @@
+import numpy as np
+
+from ice_craters import clutter
+
+# Returns an echo image of noise with a bright line whose row changes slowly across the columns.
+def get_echo(height, width, line_rows, seed=0):
+	echo = np.random.default_rng(seed).uniform(0, 20, (height, width)).astype(np.float32)
+	echo[line_rows, np.arange(width)] = 255
+	return echo
+
+# The co-registration finds a constant delay between the radargram and the cluttergram, and the aligned cluttergram scores
+# the radargram's surface (predicted by the cluttergram) as clutter but a reflector it does not predict as clean.
+def test_column_lags_and_scores():
+	(height, width, delay) = (300, 2000, 7)
+	surface = (100 + 20 * np.sin(np.arange(width) / 150.0)).astype(np.int64)
+	radargram = get_echo(height, width, surface + delay, seed=1)
+	cluttergram = get_echo(height, width, surface, seed=2)
+
+	lags = clutter.get_column_lags(clutter.get_echo_strength(radargram), clutter.get_echo_strength(cluttergram))
+	assert np.all(lags == delay)
+
+	aligned = clutter.align_cluttergram(clutter.get_echo_strength(cluttergram), lags)
+	columns = np.arange(width)
+	assert np.all(clutter.score_pixels(aligned, surface + delay, columns) == 1)
+	assert clutter.score_pixels(aligned, surface + delay + 60, columns).mean() < 0.3 # only noise in the cluttergram there
@@ -0,0 +1,87 @@
+import math
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from ice_craters.coordinates import MOLA_WIDTH, get_line_from_point_pair
+
+# The loop-based line rasterizer the vectorized one replaced, as a list of [x, y] pixels.
+def get_reference_line(point1, point2):
+	(x1, y1) = point1
+	(x2, y2) = point2
+
+	points_on_line = []
+	if x2 - x1 == 0: # vertical line
+		for y in range(min(y1, y2), max(y1, y2) + 1):
+			if [x1, y] not in points_on_line:
+				points_on_line.append([x1, y])
+		return points_on_line
+
+	m = (y2 - y1) / (x2 - x1)
+	b = y1 - m * x1
+	if abs(y1 - y2) > abs(x1 - x2):
+		for y in range(min(y1, y2), max(y1, y2) + 1):
+			x = int((y - b) / m)
+			if [x, y] not in points_on_line:
+				points_on_line.append([x, y])
+	else:
+		for x in range(min(x1, x2), max(x1, x2) + 1):
+			y = int(m * x + b)
+			if [x, y] not in points_on_line:
+				points_on_line.append([x, y])
+
+	return points_on_line
+
+# The loop-based rasterizer's line computed with exact fractions, i.e. without the float rounding that sometimes truncated an
+# exact pixel coordinate (e.g. 6985.9999 for an endpoint at 6986) to the pixel before it.
+def get_exact_line(point1, point2):
+	(x1, y1) = point1
+	(x2, y2) = point2
+
+	points_on_line = []
+	if abs(y2 - y1) > abs(x2 - x1) or x2 == x1:
+		for y in range(min(y1, y2), max(y1, y2) + 1):
+			x = math.trunc(x1 + Fraction((y - y1) * (x2 - x1), y2 - y1)) if y2 != y1 else x1
+			if [x, y] not in points_on_line:
+				points_on_line.append([x, y])
+	else:
+		for x in range(min(x1, x2), max(x1, x2) + 1):
+			y = math.trunc(y1 + Fraction((x - x1) * (y2 - y1), x2 - x1))
+			if [x, y] not in points_on_line:
+				points_on_line.append([x, y])
+
+	return points_on_line
+
+# Returns pairs of random endpoints less than half of the map apart in x (so the line does not cross the antimeridian).
+def get_random_point_pairs(n, max_length, seed=0):
+	rng = np.random.default_rng(seed)
+	pairs = []
+	for _ in range(n):
+		(x1, y1) = (int(rng.integers(0, MOLA_WIDTH // 2)), int(rng.integers(0, 20000)))
+		(x2, y2) = (x1 + int(rng.integers(-max_length, max_length)), y1 + int(rng.integers(-max_length, max_length)))
+		pairs.append(((x1, y1), (max(x2, 0), max(y2, 0))))
+	return pairs
+
+POINT_PAIRS = get_random_point_pairs(300, 400) + [((100, 50), (100, 80)), ((100, 80), (100, 50)), ((10, 10), (60, 10)), ((10, 10), (40, 40)), ((5, 5), (5, 5))]
+
+# The vectorized rasterizer returns the loop-based one's pixels, in the same order, with both endpoints on the line.
+@pytest.mark.parametrize('point1, point2', POINT_PAIRS)
+def test_line_matches_reference(point1, point2):
+	(xs, ys) = get_line_from_point_pair(point1, point2)
+	pixels = np.column_stack([xs, ys]).tolist()
+
+	assert pixels == get_exact_line(point1, point2)
+	assert list(point1) in pixels and list(point2) in pixels
+
+	# where it differs from the float loop, the loop lost an exact coordinate to rounding (one pixel short on the minor axis).
+	reference = get_reference_line(point1, point2)
+	assert len(pixels) == len(reference)
+	assert all(abs(a - b) <= 1 for (pixel, reference_pixel) in zip(pixels, reference) for (a, b) in zip(pixel, reference_pixel))
+
+# A line whose endpoints are on either side of the antimeridian is drawn the short way across it.
+def test_line_crosses_antimeridian():
+	(xs, ys) = get_line_from_point_pair((MOLA_WIDTH - 3, 100), (2, 105))
+
+	assert xs.tolist() == [MOLA_WIDTH - 3, MOLA_WIDTH - 2, MOLA_WIDTH - 1, 0, 1, 2]
+	assert ys[0] == 100 and ys[-1] == 105 and np.all(np.diff(ys) >= 0)
@@ -0,0 +1,147 @@
+import hashlib
+import http.server
+import os
+import re
+import threading
+
+import pytest
+
+from ice_craters import download
+
+# Serves the files in its files dict like the PDS does: with an ETag, and Range requests (with If-Range) answered with 206.
+# The first request for a path in drop_after only sends that many bytes of the body before closing the connection.
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+	files = {}
+	drop_after = {}
+	requests = []
+
+	def do_GET(self):
+		self.requests.append((self.path, self.headers.get('Range'), self.headers.get('If-Range')))
+		if self.path not in self.files:
+			self.send_error(404)
+			return
+
+		data = self.files[self.path]
+		etag = '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+		start = 0
+		range_header = self.headers.get('Range')
+		if range_header and self.headers.get('If-Range', etag) == etag:
+			start = int(re.match(r'bytes=(\d+)-', range_header).group(1))
+			if start >= len(data):
+				self.send_response(416)
+				self.end_headers()
+				return
+			self.send_response(206)
+			self.send_header('Content-Range', 'bytes ' + str(start) + '-' + str(len(data) - 1) + '/' + str(len(data)))
+		else:
+			self.send_response(200)
+
+		body = data[start:]
+		self.send_header('ETag', etag)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+
+		drop_after = self.drop_after.pop(self.path, None)
+		if drop_after is not None:
+			self.wfile.write(body[:drop_after])
+			self.wfile.flush()
+			self.connection.shutdown(2)
+			return
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+# Starts a RangeHandler server for a test. Returns (base url, handler class) with empty files, drop_after and requests.
+@pytest.fixture
+def server():
+	handler = type('Handler', (RangeHandler,), {'files': {}, 'drop_after': {}, 'requests': []})
+	httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+	threading.Thread(target=httpd.serve_forever, daemon=True).start()
+	yield ('http://127.0.0.1:' + str(httpd.server_address[1]), handler)
+	httpd.shutdown()
+	httpd.server_close()
+
+# Returns size bytes of test data.
+def get_data(size, seed=0):
+	return bytes((i * 7 + seed) % 251 for i in range(size))
+
+# An interrupted download is resumed with a Range request from the end of the partial file, and recorded as complete.
+def test_download_resumes_after_dropped_connection(server, tmp_path):
+	(url, handler) = server
+	data = get_data(3 * download.CHUNK_SIZE + 123)
+	handler.files['/radargram.tif'] = data
+	handler.drop_after['/radargram.tif'] = download.CHUNK_SIZE + 1000
+	file_name = str(tmp_path / 'downloads' / 'radargram.tif')
+	manifest = download.Manifest(str(tmp_path / 'manifest.json'))
+
+	assert download.download_file(url + '/radargram.tif', file_name, manifest)
+
+	with open(file_name, 'rb') as f:
+		assert f.read() == data
+	assert not os.path.exists(file_name + '.part')
+
+	assert len(handler.requests) == 2
+	(path, range_header, if_range) = handler.requests[1]
+	assert range_header == 'bytes=' + str(download.CHUNK_SIZE) + '-' # only whole chunks of the first response were written
+	assert if_range is not None
+
+	entry = download.Manifest(str(tmp_path / 'manifest.json')).get(file_name)
+	assert entry['complete'] and entry['url'] == url + '/radargram.tif'
+	assert entry['size'] == len(data)
+	assert entry['sha256'] == hashlib.sha256(data).hexdigest()
+	assert entry['etag'] == if_range
+
+# A partial file of a file that has changed on the server since is replaced by the new file, not appended to.
+def test_download_restarts_when_file_changed(server, tmp_path):
+	(url, handler) = server
+	handler.files['/geom.tab'] = get_data(5000, seed=1)
+	file_name = str(tmp_path / 'geom.csv')
+	manifest = download.Manifest(str(tmp_path / 'manifest.json'))
+	manifest.set(file_name, {'url': url + '/geom.tab', 'complete': False, 'etag': '"old"'})
+	with open(file_name + '.part', 'wb') as f:
+		f.write(get_data(2000))
+
+	assert download.download_file(url + '/geom.tab', file_name, manifest)
+
+	with open(file_name, 'rb') as f:
+		assert f.read() == handler.files['/geom.tab']
+	assert handler.requests[0][1:] == ('bytes=2000-', '"old"')
+
+# A file recorded as complete in the manifest is not downloaded again.
+def test_download_skips_downloaded_file(server, tmp_path):
+	(url, handler) = server
+	handler.files['/geom.tab'] = get_data(5000)
+	file_name = str(tmp_path / 'geom.csv')
+	manifest = download.Manifest(str(tmp_path / 'manifest.json'))
+
+	assert download.download_file(url + '/geom.tab', file_name, manifest)
+	assert not download.download_file(url + '/geom.tab', file_name, download.Manifest(str(tmp_path / 'manifest.json')))
+	assert len(handler.requests) == 1
+
+# A file that was downloaded before the manifest existed is recorded in it as it is, without downloading it.
+def test_download_adopts_existing_file(server, tmp_path):
+	(url, handler) = server
+	handler.files['/geom.tab'] = get_data(5000)
+	file_name = str(tmp_path / 'geom.csv')
+	with open(file_name, 'wb') as f:
+		f.write(b'annotated copy')
+	manifest = download.Manifest(str(tmp_path / 'manifest.json'))
+
+	assert not download.download_file(url + '/geom.tab', file_name, manifest)
+	assert handler.requests == []
+
+	entry = manifest.get(file_name)
+	assert entry['complete'] and entry['size'] == len(b'annotated copy')
+	assert entry['sha256'] == hashlib.sha256(b'annotated copy').hexdigest()
+	with open(file_name, 'rb') as f:
+		assert f.read() == b'annotated copy'
+
+# Entries returned by the manifest are copies: changing one does not change the manifest until it is written back with set.
+def test_manifest_get_returns_copy(tmp_path):
+	manifest = download.Manifest(str(tmp_path / 'manifest.json'))
+	manifest.set('a.tif', {'url': 'http://example/a.tif', 'complete': False})
+
+	entry = manifest.get('a.tif')
+	entry['complete'] = True
+	assert not manifest.get('a.tif')['complete']
@@ -0,0 +1,39 @@
+import numpy as np
+
+from ice_craters import gridding
+from ice_craters.coordinates import MOLA_SCALE
+
+# The statistics of each cell, accumulated over several orbits, match computing them from all of the cell's values at once.
+def test_grid_accumulator_matches_direct_statistics():
+	bbox = (-131.0, 18.0, -129.0, 20.0)
+	accumulator = gridding.GridAccumulator(bbox, factor=4)
+	rng = np.random.default_rng(0)
+
+	all_lons, all_lats, all_values = [], [], []
+	for _ in range(5): # one batch of points per orbit, some of them outside the region or NaN
+		lons = rng.uniform(-131.5, -128.5, 5000)
+		lats = rng.uniform(17.5, 20.5, 5000)
+		values = rng.normal(-2000, 300, 5000)
+		values[::97] = np.nan
+		accumulator.add(lons, lats, values)
+		(all_lons, all_lats, all_values) = (all_lons + [lons], all_lats + [lats], all_values + [values])
+	(lons, lats, values) = (np.concatenate(all_lons), np.concatenate(all_lats), np.concatenate(all_values))
+
+	(mean, minimum, maximum, std, count) = accumulator.get_statistics()
+	cell_size = 4 / MOLA_SCALE
+	assert mean.shape == (round(2 / cell_size), round(2 / cell_size))
+
+	cols = np.floor((lons - bbox[0]) / cell_size).astype(np.int64)
+	rows = np.floor((bbox[3] - lats) / cell_size).astype(np.int64)
+	inside = (cols >= 0) & (cols < mean.shape[1]) & (rows >= 0) & (rows < mean.shape[0]) & ~np.isnan(values)
+	assert count.sum() == np.count_nonzero(inside)
+
+	for (row, col) in [(0, 0), (10, 20), (mean.shape[0] - 1, mean.shape[1] - 1), (30, 7)]:
+		cell_values = values[inside & (rows == row) & (cols == col)]
+		assert count[row, col] == len(cell_values)
+		if len(cell_values):
+			assert np.isclose(mean[row, col], cell_values.mean())
+			assert np.isclose(std[row, col], cell_values.std(), atol=1e-6)
+			assert (minimum[row, col], maximum[row, col]) == (cell_values.min(), cell_values.max())
+		else:
+			assert np.isnan(mean[row, col])
@@ -0,0 +1,88 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from ice_craters import annotation_sidecar, annotations, benchmark, pipeline
+
+N_FRAMES = 1500
+
+# Repaints part of an orbit's painted radargram, like a corrected brush stroke: the surface is erased over 100 columns and
+# a red reflector is drawn over 300 others. Returns the indices of the repainted columns.
+def repaint(orbit_str):
+	import cv2
+
+	file_name = annotation_sidecar.get_paint_copy_file_name(orbit_str)
+	img = cv2.imread(file_name, cv2.IMREAD_COLOR)
+	colors = {name: upper for (name, lower, upper) in annotations.ANNOTATION_COLORS}
+
+	surface_columns = np.arange(100, 200)
+	is_surface = np.all(img[:, surface_columns] == colors[annotations.SURFACE_COLOR], axis=2)
+	img[:, surface_columns] = np.where(is_surface[..., None], 128, img[:, surface_columns])
+
+	reflector_columns = np.arange(900, 1200)
+	img[300 + (reflector_columns % 5), reflector_columns] = colors['red']
+	cv2.imwrite(file_name, img)
+
+	# make sure the painted image is newer than the annotation sidecar, even on file systems with coarse timestamps.
+	future = time.time() + 10
+	os.utime(file_name, (future, future))
+
+	return np.r_[surface_columns, reflector_columns]
+
+# Re-processing only the changed columns of an edited radargram gives the same plot as processing every column again,
+# for hand-traced and automatically picked surfaces, and for every way of reducing thick traces.
+@pytest.mark.parametrize('orbit, options', [
+	(92000001, {}),
+	(92000002, {'surface_method': "threshold"}),
+	(92000003, {'trace_depth': "centroid"}),
+	(92000004, {'trace_depth': "top", 'layers': 2}),
+])
+def test_incremental_matches_full(synthetic_tree, capsys, orbit, options):
+	orbit_str = str(orbit).zfill(8)
+	benchmark.write_synthetic_orbit(orbit_str, N_FRAMES, n_rows=400, n_reflectors=6, seed=orbit)
+
+	pipeline.get_orbit_plot(orbit_str, incremental=True, store_results=False, **options)
+	changed_columns = repaint(orbit_str)
+	capsys.readouterr()
+
+	incremental_plot = pipeline.get_orbit_plot(orbit_str, incremental=True, store_results=False, **options)
+	n_decoded = int(capsys.readouterr().out.split(" of ")[0])
+	full_plot = pipeline.get_orbit_plot(orbit_str, incremental=False, store_results=False, **options)
+
+	assert 0 < n_decoded <= len(changed_columns)
+	assert np.array_equal(incremental_plot[0], full_plot[0]) and np.array_equal(incremental_plot[1], full_plot[1])
+	for (incremental_panel, full_panel) in zip(incremental_plot[3], full_plot[3], strict=True):
+		assert incremental_panel[0] == full_panel[0]
+		for (incremental_values, full_values) in zip(incremental_panel[1:], full_panel[1:]):
+			assert np.array_equal(incremental_values, full_values)
+
+# Re-running with another clutter tolerance re-checks every column's picked surface, even if no traces changed.
+def test_incremental_clutter_tolerance_change(synthetic_tree):
+	import cv2
+
+	orbit_str = '92000011'
+	benchmark.write_synthetic_orbit(orbit_str, N_FRAMES, n_rows=400, n_reflectors=6, seed=11)
+
+	# the surface is left to the picker in columns 0-599, and the cluttergram's surface is 5 rows lower in columns 0-299.
+	paint_file_name = annotation_sidecar.get_paint_copy_file_name(orbit_str)
+	img = cv2.imread(paint_file_name, cv2.IMREAD_COLOR)
+	surface_color = {name: upper for (name, lower, upper) in annotations.ANNOTATION_COLORS}[annotations.SURFACE_COLOR]
+	is_surface = np.all(img[:, :600] == surface_color, axis=2)
+	img[:, :600] = np.where(is_surface[..., None], 128, img[:, :600])
+	cv2.imwrite(paint_file_name, img)
+
+	cluttergram_file_name = './downloads/SHARAD/images/cluttergrams/s_' + orbit_str + '.tif'
+	cluttergram = cv2.imread(cluttergram_file_name, cv2.IMREAD_GRAYSCALE)
+	cluttergram[:, :300] = np.roll(cluttergram[:, :300], 5, axis=0)
+	cv2.imwrite(cluttergram_file_name, cluttergram)
+
+	options = {'surface_method': "threshold", 'store_results': False}
+	pipeline.get_orbit_plot(orbit_str, incremental=True, clutter_tolerance=10, **options)
+	incremental_plot = pipeline.get_orbit_plot(orbit_str, incremental=True, clutter_tolerance=2, **options)
+	full_plot = pipeline.get_orbit_plot(orbit_str, incremental=False, clutter_tolerance=2, **options)
+
+	for (incremental_panel, full_panel) in zip(incremental_plot[3], full_plot[3], strict=True):
+		for (incremental_values, full_values) in zip(incremental_panel[1:], full_panel[1:]):
+			assert np.array_equal(incremental_values, full_values)
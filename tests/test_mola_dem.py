@@ -0,0 +1,47 @@
+import numpy as np
+
+from ice_craters import mola_dem
+from ice_craters.coordinates import MOLA_SCALE
+
+# Sampling no points (an empty window or region) returns an empty array instead of failing.
+def test_read_pixels_without_pixels(synthetic_tree):
+	dem = mola_dem.MolaDEM()
+
+	assert dem.read_pixels([], []).shape == (0,)
+	assert dem.read_pixels(np.empty((0, 3)), np.empty((0, 3))).shape == (0, 3)
+	assert dem.sample(np.empty(0), np.empty(0), "bilinear").shape == (0,)
+
+# Pixels read through the tile cache match the same pixels of a window of the DEM.
+def test_read_pixels_matches_window(synthetic_tree):
+	dem = mola_dem.MolaDEM()
+	rng = np.random.default_rng(0)
+	rows = rng.integers(9000, 10000, 1000)
+	cols = rng.integers(6000, 8000, 1000)
+
+	window = dem.read_window(9000, 10000, 6000, 8000)
+	assert np.array_equal(dem.read_pixels(rows, cols), window[rows - 9000, cols - 6000])
+
+# Writes a small random int16 GeoTIFF DEM to test the pyramid on (the pyramid of a MOLA-sized DEM takes a minute to build).
+def write_small_dem(path, height=512, width=1024, seed=0):
+	import rasterio
+	from rasterio.transform import from_origin
+
+	elevations = np.random.default_rng(seed).integers(-8000, 20000, (height, width)).astype(np.int16)
+	with rasterio.open(path, 'w', driver='GTiff', height=height, width=width, count=1, dtype='int16', tiled=True, blockxsize=256, blockysize=256,
+						transform=from_origin(-180, 90, 1 / MOLA_SCALE, 1 / MOLA_SCALE)) as dataset:
+		dataset.write(elevations, 1)
+
+	return elevations
+
+# Every pyramid level holds the mean (rounded), minimum and maximum of its blocks of DEM pixels, as reducing each block directly does.
+def test_pyramid_levels_match_block_reduce(tmp_path):
+	path = str(tmp_path / 'dem.tif')
+	elevations = write_small_dem(path)
+	mola_dem.build_pyramid(path, factors=(4, 16, 64))
+
+	assert mola_dem.get_pyramid_factors(path) == [4, 16, 64]
+	for factor in (4, 16, 64):
+		blocks = elevations.reshape(elevations.shape[0] // factor, factor, elevations.shape[1] // factor, factor)
+		assert np.array_equal(mola_dem.get_pyramid_level(factor, "min", path), blocks.min(axis=(1, 3)))
+		assert np.array_equal(mola_dem.get_pyramid_level(factor, "max", path), blocks.max(axis=(1, 3)))
+		assert np.abs(mola_dem.get_pyramid_level(factor, "mean", path) - blocks.mean(axis=(1, 3))).max() <= 0.5
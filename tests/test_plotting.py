@@ -0,0 +1,38 @@
+import numpy as np
+
+from ice_craters import plotting
+
+# A ground track crossing the synthetic terrain (see benchmark.DEM_EXTENT).
+TRACK_LONS = np.linspace(-131.0, -129.0, 200)
+TRACK_LATS = np.linspace(15.0, 25.0, 200)
+
+# An orbit without reflectors is plotted with the surface only.
+def test_create_plot_without_reflectors(synthetic_tree, tmp_path):
+	output_file = str(tmp_path / 'no_reflectors.png')
+	plotting.create_plot(TRACK_LONS, TRACK_LATS, [], "no reflectors", output_file=output_file)
+
+	with open(output_file, 'rb') as f:
+		assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+
+# Reflector points are plotted at the MOLA elevation under them minus their depth.
+def test_create_plot_with_reflectors(synthetic_tree, tmp_path):
+	output_file = str(tmp_path / 'reflectors.png')
+	reflector_points = [(-130.0, 20.0, 100.0, 'red'), (-129.5, 22.5, 250.0, 'cyan')]
+	plotting.create_plot(TRACK_LONS, TRACK_LATS, reflector_points, "reflectors", output_file=output_file)
+
+	assert (tmp_path / 'reflectors.png').stat().st_size > 0
+
+# The compatibility create_plot takes the line's two endpoints and samples the DEM pixels the line crosses.
+def test_line_plot_samples_line_pixels(synthetic_tree, tmp_path, monkeypatch):
+	import plot_topo_profile_with_reflector
+	from ice_craters import mola_dem
+	from ice_craters.coordinates import get_line_from_point_pair
+
+	calls = []
+	monkeypatch.setattr(plotting, 'create_plot', lambda *args, **kwargs: calls.append((args, kwargs)))
+	plot_topo_profile_with_reflector.create_plot([-131.0, 15.0], [-129.0, 25.0], [], "line")
+
+	((track_lons, track_lats, reflector_points, plot_title), kwargs) = calls[0]
+	(line_xs, line_ys) = get_line_from_point_pair([49 * 128, 75 * 128], [51 * 128, 65 * 128])
+	assert len(track_lons) == len(line_xs)
+	assert np.array_equal(mola_dem.sample_dem(track_lons, track_lats, kwargs['method']), mola_dem.get_dem().read_pixels(line_ys, line_xs))
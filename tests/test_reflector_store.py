@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ice_craters import reflector_store
+
+# Returns reflector points of an orbit at the given frames, one red point (colour 0) per frame at er = 3.1.
+def get_points(orbit, frames):
+	points = np.zeros(len(frames), dtype=reflector_store.POINT_DTYPE)
+	points['orbit'] = orbit
+	points['frame'] = frames
+	points['dielectric_constant'] = 3.1
+	points['depth'] = frames
+	return points
+
+# Saving a window of frames only replaces the points of those frames.
+def test_save_window_replaces_its_frames(tmp_path):
+	store_dir = str(tmp_path)
+	reflector_store.save_points('1', get_points(1, np.arange(1, 101)), store_dir=store_dir)
+	reflector_store.save_points('1', get_points(1, np.arange(41, 61))[:10], np.arange(41, 61), store_dir=store_dir)
+
+	frames = reflector_store.load_points('1', store_dir)['frame']
+	assert frames.tolist() == list(range(1, 51)) + list(range(61, 101))
+
+# Windows of the same orbit saved at the same time all end up in the store.
+def test_concurrent_window_saves(tmp_path):
+	store_dir = str(tmp_path)
+	windows = [np.arange(start, start + 50) for start in range(1, 2001, 50)]
+
+	with ThreadPoolExecutor(max_workers=8) as executor:
+		list(executor.map(lambda frames: reflector_store.save_points('2', get_points(2, frames), frames, store_dir), windows))
+
+	assert reflector_store.load_points('2', store_dir)['frame'].tolist() == list(range(1, 2001))
@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+import pytest
+
+from ice_craters import benchmark, pipeline, survey
+
+# Serves synthetic orbits from a local stand-in for the PDS (see benchmark.write_synthetic_pds_orbits) for a test.
+# Returns (orbits, base url of the server).
+@pytest.fixture
+def pds_orbits(synthetic_tree, request):
+	first_orbit = request.param
+	orbits = [str(first_orbit + i).zfill(8) for i in range(3)]
+	pds_dir = os.path.join(synthetic_tree, 'pds')
+	benchmark.write_synthetic_pds_orbits(orbits, pds_dir, 1000, n_rows=300, n_reflectors=3)
+
+	(server, pds_url) = benchmark.start_file_server(pds_dir)
+	yield (orbits, pds_url)
+	server.shutdown()
+	server.server_close()
+
+# Every orbit of a survey is downloaded, processed and plotted; an orbit that is not on the PDS fails without stopping the others.
+@pytest.mark.parametrize('pds_orbits', [93000001], indirect=True)
+def test_run_survey(pds_orbits, tmp_path):
+	(orbits, pds_url) = pds_orbits
+	jobs = [(orbit_str, None) for orbit_str in orbits + ['93009999']]
+
+	(statistics, failures, wall_time) = asyncio.run(survey.run_survey(jobs, {'dielectric_constants': (3.1,)}, str(tmp_path), pds_url=pds_url,
+																	download_jobs=2, process_jobs=2, render_jobs=1, queue_size=1))
+
+	assert [job_name for (job_name, error) in failures] == ['93009999']
+	assert (statistics['download'].done, statistics['download'].failed) == (3, 1)
+	assert (statistics['process'].done, statistics['render'].done) == (3, 3)
+	assert sorted(os.listdir(tmp_path)) == ['s_' + orbit_str + '.png' for orbit_str in orbits]
+	assert wall_time > 0
+
+# A survey of a region downloads the geometry tables of the given orbits first, and plots the windows that cross the region.
+@pytest.mark.parametrize('pds_orbits', [93000011], indirect=True)
+def test_survey_region_downloads_geometry_first(pds_orbits, tmp_path, capsys):
+	(orbits, pds_url) = pds_orbits
+
+	survey.main(['-o'] + orbits + ['93009999', '--bbox', '-131', '18', '-129', '20', '--pds-url', pds_url, '-e', '3.1',
+				'--process-jobs', '2', '--render-jobs', '1', '--output-dir', str(tmp_path)])
+
+	output = capsys.readouterr().out
+	assert "1 of 4 orbits have no geometry table and are skipped: 93009999" in output
+	assert "3 frame windows in 3 orbits cross the region" in output
+
+	plots = sorted(os.listdir(tmp_path))
+	assert len(plots) == 3
+	for (plot, orbit_str) in zip(plots, orbits):
+		assert plot.startswith('s_' + orbit_str + '_') # a window of frames, e.g. s_<orbit>_<first>-<last>.png